@@ -1,5 +1,6 @@
 import time
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
 
 class PerformanceMiddleware(MiddlewareMixin):
     def process_request(self, request):
@@ -11,3 +12,10 @@ class PerformanceMiddleware(MiddlewareMixin):
             if duration > 1.0:  # Log slow requests
                 print(f"Slow request: {request.path} took {duration:.2f}s")
         return response
+
+
+class PrincipalMiddleware(MiddlewareMixin):
+    """Attach a lazy request.principal (roles, statuses, facility ids of request.user)"""
+    def process_request(self, request):
+        from accounts.principal import get_principal
+        request.principal = SimpleLazyObject(lambda: get_principal(request.user))
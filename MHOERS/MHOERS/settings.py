@@ -56,6 +56,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'MHOERS.middleware.PrincipalMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'MHOERS.middleware.PerformanceMiddleware',
@@ -73,14 +74,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-                'notifications.context_processors.unread_notifications',
-                'notifications.context_processors.message_notification',
-                'accounts.context_processors.pending_users_count',
-                'accounts.context_processors.user_approval_status',
-                'accounts.context_processors.active_referrals_count',
-                'accounts.context_processors.followups_count',
-                'accounts.context_processors.user_facility',
-                'chat.context_processors.chat_context',
+                # Badge counters, dropdown notifications, approval status and facility
+                'notifications.context_processors.navbar',
             ],
         },
     },
@@ -177,6 +172,11 @@ CACHES = {
 #         }
 # }
 
+# Worker processes for per-barangay forecast training (None = all cores)
+ML_TRAINING_WORKERS = None
+# Same, when training is started from a web request (1 = no process pool in the web worker)
+ML_WEB_TRAINING_WORKERS = 1
+
 
 
 # IPROG SMS API token configuration
@@ -0,0 +1,168 @@
+"""
+Request-scoped view of the current user's roles, registration statuses and facilities.
+
+PrincipalMiddleware attaches a lazy ``request.principal``; the first access resolves
+it in two queries (profile statuses + shared facilities) and caches it per user
+until a profile, facility or facility membership changes (see accounts.signals).
+The cache is per process, so the signals only clear it in the process that
+handled the write; other workers pick the change up within the timeout.
+"""
+from django.core.cache import cache
+
+PRINCIPAL_CACHE_TIMEOUT = 60 * 5
+PRINCIPAL_CACHE_KEY = 'principal_v1_{user_id}'
+
+# Registration profile per role: reverse one-to-one accessor on User
+ROLE_PROFILES = {
+    'bhw': 'bhwregistration',
+    'doctor': 'doctors',
+    'nurse': 'nurses',
+    'midwife': 'midwives',
+}
+
+
+class Principal:
+    """Roles, statuses and facility ids of one user (plain data, safe to cache)"""
+
+    def __init__(self, user_id=None, is_staff=False, is_superuser=False, statuses=None,
+                 bhw_facility=None, shared_facilities=None):
+        self.user_id = user_id
+        self.is_staff = is_staff
+        self.is_superuser = is_superuser
+        # {'bhw': 'ACTIVE', 'doctor': 'PENDING_APPROVAL', ...} for the profiles the user has
+        self.statuses = statuses or {}
+        # (facility_id, name) of the BHW registration facility, if any
+        self.bhw_facility = bhw_facility
+        # [(facility_id, name), ...] from Facility.users, ordered by facility_id
+        self.shared_facilities = shared_facilities or []
+
+    @property
+    def is_authenticated(self):
+        return self.user_id is not None
+
+    @property
+    def is_admin(self):
+        return self.is_staff or self.is_superuser
+
+    def has_role(self, role):
+        return role in self.statuses
+
+    def is_active_role(self, role):
+        return self.statuses.get(role) == 'ACTIVE'
+
+    @property
+    def is_doctor(self):
+        """Active doctor (same rule as the old Doctors.objects.get(...).status == 'ACTIVE' checks)"""
+        return self.is_active_role('doctor')
+
+    @property
+    def is_bhw(self):
+        return self.has_role('bhw')
+
+    @property
+    def has_profile(self):
+        return bool(self.statuses)
+
+    def approval_state(self, roles=tuple(ROLE_PROFILES)):
+        """
+        (is_approved, is_pending) over the given role profiles: any PENDING_APPROVAL
+        profile makes the user pending, any PENDING/REJECTED one unapproved.
+        Users without a profile count as approved.
+        """
+        if not self.is_authenticated:
+            return False, False
+        is_approved, is_pending = True, False
+        for role in roles:
+            status = self.statuses.get(role)
+            if status == 'PENDING_APPROVAL':
+                is_approved, is_pending = False, True
+            elif status == 'REJECTED':
+                is_approved = False
+        return is_approved, is_pending
+
+    @property
+    def bhw_facility_id(self):
+        return self.bhw_facility[0] if self.bhw_facility else None
+
+    @property
+    def shared_facility_ids(self):
+        return [facility_id for facility_id, _ in self.shared_facilities]
+
+    @property
+    def facility_ids(self):
+        """BHW registration facility plus shared facilities, without duplicates"""
+        ids = [self.bhw_facility_id] if self.bhw_facility_id else []
+        ids += [facility_id for facility_id in self.shared_facility_ids if facility_id not in ids]
+        return ids
+
+    @property
+    def facility_name(self):
+        """Display facility: the BHW registration facility, else the first shared facility"""
+        if self.bhw_facility:
+            return self.bhw_facility[1]
+        if self.shared_facilities:
+            return self.shared_facilities[0][1]
+        return None
+
+
+ANONYMOUS_PRINCIPAL = Principal()
+
+
+def _build_principal(user):
+    from django.contrib.auth.models import User
+    from facilities.models import Facility
+
+    fields = [f'{accessor}__status' for accessor in ROLE_PROFILES.values()]
+    fields += ['bhwregistration__facility_id', 'bhwregistration__facility__name']
+    row = User.objects.filter(pk=user.pk).values(*fields).first() or {}
+
+    statuses = {
+        role: row[f'{accessor}__status']
+        for role, accessor in ROLE_PROFILES.items()
+        if row.get(f'{accessor}__status') is not None
+    }
+    bhw_facility = None
+    if row.get('bhwregistration__facility_id'):
+        bhw_facility = (row['bhwregistration__facility_id'], row['bhwregistration__facility__name'])
+
+    shared_facilities = list(
+        Facility.objects.filter(users=user).order_by('facility_id').values_list('facility_id', 'name')
+    )
+
+    return Principal(
+        user_id=user.pk,
+        is_staff=user.is_staff,
+        is_superuser=user.is_superuser,
+        statuses=statuses,
+        bhw_facility=bhw_facility,
+        shared_facilities=shared_facilities,
+    )
+
+
+def get_principal(user):
+    """Cached Principal for a user (ANONYMOUS_PRINCIPAL if not authenticated)"""
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS_PRINCIPAL
+
+    key = PRINCIPAL_CACHE_KEY.format(user_id=user.pk)
+    principal = cache.get(key)
+    if principal is None:
+        principal = _build_principal(user)
+        cache.set(key, principal, PRINCIPAL_CACHE_TIMEOUT)
+    # is_staff/is_superuser can change without a profile save; trust the request's user
+    principal.is_staff = user.is_staff
+    principal.is_superuser = user.is_superuser
+    return principal
+
+
+def invalidate_principal(user_id):
+    if user_id:
+        cache.delete(PRINCIPAL_CACHE_KEY.format(user_id=user_id))
+
+
+def get_request_principal(request):
+    """request.principal when the middleware is installed, otherwise resolved on the spot"""
+    principal = getattr(request, 'principal', None)
+    if principal is None:
+        principal = get_principal(getattr(request, 'user', None))
+    return principal
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.db import transaction
 
 from accounts.models import BHWRegistration, Doctors, Nurses, Midwives
+from accounts.principal import invalidate_principal
+from facilities.models import Facility
 from referrals.utils import send_sms_iprog
 
 
@@ -88,3 +90,58 @@ def _midwife_post_save(sender, instance: Midwives, created: bool, **kwargs):
             transaction.on_commit(lambda: _send_approval_sms_async(phone, instance.first_name or "", instance.last_name or ""))
 
 
+@receiver(post_save, sender=BHWRegistration)
+@receiver(post_save, sender=Doctors)
+@receiver(post_save, sender=Nurses)
+@receiver(post_save, sender=Midwives)
+@receiver(post_delete, sender=BHWRegistration)
+@receiver(post_delete, sender=Doctors)
+@receiver(post_delete, sender=Nurses)
+@receiver(post_delete, sender=Midwives)
+def _profile_changed(sender, instance, **kwargs):
+    """Role/status/facility of the user changed: drop the cached request.principal."""
+    invalidate_principal(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Facility.users.through)
+def _facility_users_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear", "pre_clear"):
+        return
+    if reverse:
+        # user.shared_facilities.add(...): instance is the User
+        invalidate_principal(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            invalidate_principal(user_id)
+    elif action == "pre_clear":
+        # facility.users.clear(): pk_set is empty, so collect the members first
+        for user_id in instance.users.values_list("pk", flat=True):
+            invalidate_principal(user_id)
+
+
+def _facility_user_ids(facility):
+    """Users whose principal caches this facility: BHWs registered to it and its shared users"""
+    user_ids = set(BHWRegistration.objects.filter(facility=facility).values_list("user_id", flat=True))
+    user_ids.update(facility.users.values_list("pk", flat=True))
+    return user_ids
+
+
+@receiver(post_save, sender=Facility)
+def _facility_saved(sender, instance, created, **kwargs):
+    """Principals cache facility names"""
+    if created:
+        return
+    for user_id in _facility_user_ids(instance):
+        invalidate_principal(user_id)
+
+
+@receiver(pre_delete, sender=Facility)
+def _remember_facility_users(sender, instance, **kwargs):
+    # The memberships and BHW links are gone by post_delete
+    instance._principal_user_ids = _facility_user_ids(instance)
+
+
+@receiver(post_delete, sender=Facility)
+def _facility_deleted(sender, instance, **kwargs):
+    for user_id in getattr(instance, "_principal_user_ids", ()):
+        invalidate_principal(user_id)
@@ -1,3 +1,65 @@
 from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
 
-# Create your tests here.
+from accounts.models import BHWRegistration, Doctors
+from accounts.principal import get_principal
+from facilities.models import Facility
+
+
+class PrincipalTestCase(TestCase):
+    """Tests for the cached request.principal (accounts.principal)"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='principal', password='testpass123')
+        self.facility = Facility.objects.create(name='Principal Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        self.other_facility = Facility.objects.create(name='Other Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        self.bhw = BHWRegistration.objects.create(
+            user=self.user, facility=self.facility, first_name='Ana', last_name='Cruz',
+            barangay='Poblacion', status='PENDING_APPROVAL'
+        )
+        self.other_facility.users.add(self.user)
+
+    def test_resolved_in_two_queries_then_cached(self):
+        with self.assertNumQueries(2):
+            principal = get_principal(self.user)
+        self.assertTrue(principal.is_bhw)
+        self.assertFalse(principal.is_doctor)
+        self.assertEqual(principal.approval_state(), (False, True))
+        self.assertEqual(principal.facility_ids, [self.facility.pk, self.other_facility.pk])
+        self.assertEqual(principal.facility_name, 'Principal Facility')
+
+        with self.assertNumQueries(0):
+            get_principal(self.user)
+
+    def test_invalidated_on_profile_and_facility_changes(self):
+        get_principal(self.user)
+
+        self.bhw.status = 'ACTIVE'
+        self.bhw.save()
+        self.assertEqual(get_principal(self.user).approval_state(), (True, False))
+
+        Doctors.objects.create(
+            user=self.user, first_name='Ana', last_name='Cruz', specialization='General',
+            email='ana@example.com', phone='09123456789', status='ACTIVE'
+        )
+        self.assertTrue(get_principal(self.user).is_doctor)
+
+        self.user.shared_facilities.remove(self.other_facility)
+        self.assertEqual(get_principal(self.user).facility_ids, [self.facility.pk])
+
+    def test_invalidated_on_facility_rename_and_delete(self):
+        self.assertEqual(get_principal(self.user).facility_name, 'Principal Facility')
+
+        self.facility.name = 'Renamed Facility'
+        self.facility.save()
+        self.assertEqual(get_principal(self.user).facility_name, 'Renamed Facility')
+
+        self.facility.delete()
+        principal = get_principal(self.user)
+        self.assertEqual(principal.facility_ids, [self.other_facility.pk])
+        self.assertEqual(principal.facility_name, 'Other Facility')
+
+        self.other_facility.delete()
+        self.assertEqual(get_principal(self.user).facility_ids, [])
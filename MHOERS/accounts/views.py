@@ -57,60 +57,10 @@ def profile(request):
     - If user is staff/admin, show all activities across all facilities
     """
     # Check if user is approved - if not, redirect to pending dashboard
-    is_approved = True
-    is_pending = False
-    
-    # Check BHW status
-    try:
-        bhw_profile = BHWRegistration.objects.get(user=request.user)
-        if bhw_profile.status == 'PENDING_APPROVAL':
-            is_approved = False
-            is_pending = True
-        elif bhw_profile.status == 'REJECTED':
-            is_approved = False
-    except BHWRegistration.DoesNotExist:
-        pass
-    
-    # Check Doctor status
-    try:
-        doctor_profile = Doctors.objects.get(user=request.user)
-        if doctor_profile.status == 'PENDING_APPROVAL':
-            is_approved = False
-            is_pending = True
-        elif doctor_profile.status == 'REJECTED':
-            is_approved = False
-    except Doctors.DoesNotExist:
-        pass
-    
-    # Check Nurse status
-    try:
-        nurse_profile = Nurses.objects.get(user=request.user)
-        if nurse_profile.status == 'PENDING_APPROVAL':
-            is_approved = False
-            is_pending = True
-        elif nurse_profile.status == 'REJECTED':
-            is_approved = False
-    except Nurses.DoesNotExist:
-        pass
-    
-    # Check Midwife status
-    try:
-        midwife_profile = Midwives.objects.get(user=request.user)
-        if midwife_profile.status == 'PENDING_APPROVAL':
-            is_approved = False
-            is_pending = True
-        elif midwife_profile.status == 'REJECTED':
-            is_approved = False
-    except Midwives.DoesNotExist:
-        pass
-    
-    # If user has a profile and is not approved, redirect to pending dashboard
-    has_profile = any([
-        BHWRegistration.objects.filter(user=request.user).exists(),
-        Doctors.objects.filter(user=request.user).exists(),
-        Nurses.objects.filter(user=request.user).exists(),
-        Midwives.objects.filter(user=request.user).exists()
-    ])
+    # (BHW, Doctor, Nurse and Midwife statuses, resolved once per request)
+    principal = request.principal
+    is_approved, is_pending = principal.approval_state()
+    has_profile = principal.has_profile
     
     if has_profile and not is_approved:
         return redirect('pending_dashboard')
@@ -122,13 +72,7 @@ def profile(request):
     facility = facilities.first() if facilities.exists() else None
 
     # Check if user is a doctor
-    is_doctor = False
-    try:
-        doctor_profile = Doctors.objects.get(user=request.user)
-        if doctor_profile.status == 'ACTIVE':
-            is_doctor = True
-    except Doctors.DoesNotExist:
-        pass
+    is_doctor = request.principal.is_doctor
     
     # If user is staff/admin, get referrals from ALL facilities
     # Otherwise, get referrals only from their assigned facilities
@@ -2426,6 +2370,7 @@ def doctor_transactions_report(request):
     """Doctor transactions report showing referrals handled by the doctor with date filters"""
     from accounts.models import Doctors
     from referrals.models import Referral
+    from analytics.rollups import referral_rollup
     from django.utils import timezone
     from datetime import datetime, date, timedelta
     from django.db.models import Q, Count, Sum
@@ -2458,6 +2403,7 @@ def doctor_transactions_report(request):
     
     # Apply date filters
     today = timezone.now().date()
+    date_filters = {}
     date_filter_applied = False
     
     # Primary filtering: Use date_from and date_to if provided (new simplified filter)
@@ -2467,7 +2413,7 @@ def doctor_transactions_report(request):
                 # Both dates provided - filter by range
                 start_date = datetime.strptime(date_from, '%Y-%m-%d').date()
                 end_date = datetime.strptime(date_to, '%Y-%m-%d').date()
-                referrals_qs = referrals_qs.filter(
+                date_filters.update(
                     created_at__date__gte=start_date,
                     created_at__date__lte=end_date
                 )
@@ -2475,14 +2421,14 @@ def doctor_transactions_report(request):
             elif date_from:
                 # Only start date provided - filter from that date onwards
                 start_date = datetime.strptime(date_from, '%Y-%m-%d').date()
-                referrals_qs = referrals_qs.filter(
+                date_filters.update(
                     created_at__date__gte=start_date
                 )
                 date_filter_applied = True
             elif date_to:
                 # Only end date provided - filter up to that date
                 end_date = datetime.strptime(date_to, '%Y-%m-%d').date()
-                referrals_qs = referrals_qs.filter(
+                date_filters.update(
                     created_at__date__lte=end_date
                 )
                 date_filter_applied = True
@@ -2492,7 +2438,7 @@ def doctor_transactions_report(request):
     elif filter_type == 'day' and date_from:
         try:
             filter_date = datetime.strptime(date_from, '%Y-%m-%d').date()
-            referrals_qs = referrals_qs.filter(
+            date_filters.update(
                 created_at__date=filter_date
             )
             date_filter_applied = True
@@ -2502,7 +2448,7 @@ def doctor_transactions_report(request):
         try:
             start_date = datetime.strptime(week_start, '%Y-%m-%d').date()
             end_date = datetime.strptime(week_end, '%Y-%m-%d').date()
-            referrals_qs = referrals_qs.filter(
+            date_filters.update(
                 created_at__date__gte=start_date,
                 created_at__date__lte=end_date
             )
@@ -2513,7 +2459,7 @@ def doctor_transactions_report(request):
         try:
             year_int = int(year)
             month_int = int(month)
-            referrals_qs = referrals_qs.filter(
+            date_filters.update(
                 created_at__year=year_int,
                 created_at__month=month_int
             )
@@ -2523,7 +2469,7 @@ def doctor_transactions_report(request):
     elif filter_type == 'year' and year:
         try:
             year_int = int(year)
-            referrals_qs = referrals_qs.filter(
+            date_filters.update(
                 created_at__year=year_int
             )
             date_filter_applied = True
@@ -2533,7 +2479,7 @@ def doctor_transactions_report(request):
         try:
             start_date = datetime.strptime(date_from, '%Y-%m-%d').date()
             end_date = datetime.strptime(date_to, '%Y-%m-%d').date()
-            referrals_qs = referrals_qs.filter(
+            date_filters.update(
                 created_at__date__gte=start_date,
                 created_at__date__lte=end_date
             )
@@ -2541,8 +2487,13 @@ def doctor_transactions_report(request):
         except ValueError:
             pass
     
+    referrals_qs = referrals_qs.filter(**date_filters)
+    
     # Get statistics (all are completed since we filter by status='completed')
-    total_referrals = referrals_qs.count()
+    # The total comes from the daily referral rollup; only the listed rows are loaded
+    total_referrals = referral_rollup(
+        examined_by=request.user, status='completed', **date_filters
+    ).aggregate(total=Sum('count'))['total'] or 0
     pending_count = 0  # Not applicable since we only show completed
     in_progress_count = 0  # Not applicable since we only show completed
     completed_count = total_referrals  # All referrals shown are completed
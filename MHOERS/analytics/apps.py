@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class AnalyticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analytics'
+
+    def ready(self):
+        # Import signal handlers (same pattern as patients app)
+        try:
+            from . import signals  # noqa: F401
+        except Exception:
+            # Avoid import-time crashes if migrations are running
+            pass
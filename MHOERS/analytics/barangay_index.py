@@ -0,0 +1,120 @@
+"""
+Barangay -> facility match index for the heatmap endpoints.
+
+Built with one Facility query (plus the facilities.Barangay names and the trained
+forecast's barangays as keys) and kept in the Django cache for
+BARANGAY_FACILITY_INDEX_CACHE_TIMEOUT seconds, so matching a barangay to its
+facilities is a dict lookup instead of a scan over every Facility. A Facility or
+Barangay save/delete drops it at once (see analytics.signals) in the writing
+process; the timeout bounds how long other workers of a per-process cache
+(LocMemCache) serve the old matches.
+"""
+import hashlib
+
+import numpy as np
+from django.core.cache import cache
+
+BARANGAY_FACILITY_INDEX_CACHE_KEY = 'barangay_facility_index_v1'
+BARANGAY_FACILITY_INDEX_CACHE_TIMEOUT = 60 * 5
+
+
+def normalize_barangay(name):
+    """Match key of a barangay or facility name: 'Santa Cruz ' -> 'SANTA CRUZ'"""
+    if name is None:
+        return ''
+    return str(name).strip().upper()
+
+
+def _matches(barangay_key, facility_name, facility_barangay):
+    # Barangay name appears in the facility name, or the facility's barangay is it
+    return bool(barangay_key) and (barangay_key in facility_name or facility_barangay == barangay_key)
+
+
+class BarangayFacilityIndex:
+    """Cached barangay -> matching facilities (with coordinates) lookups"""
+
+    @classmethod
+    def _known_barangays(cls):
+        from facilities.models import Barangay
+        from .model_registry import ModelRegistry
+        from .peak_training import BARANGAY_PEAK_METADATA_ARTIFACT
+
+        names = list(Barangay.objects.values_list('name', flat=True))
+        if ModelRegistry.exists(BARANGAY_PEAK_METADATA_ARTIFACT):
+            try:
+                names += list(ModelRegistry.get(BARANGAY_PEAK_METADATA_ARTIFACT).get('barangays', []))
+            except Exception:
+                pass
+        return names
+
+    @classmethod
+    def build(cls):
+        from facilities.models import Facility
+
+        rows = list(Facility.objects.order_by('pk').values_list('name', 'barangay', 'latitude', 'longitude'))
+        names = [name for name, _, _, _ in rows]
+        name_keys = [normalize_barangay(name) for name in names]
+        barangay_keys = [normalize_barangay(barangay) for _, barangay, _, _ in rows]
+
+        keys = set(barangay_keys) | {normalize_barangay(name) for name in cls._known_barangays()}
+        keys.discard('')
+        matches = {
+            key: tuple(
+                i for i, (name_key, barangay_key) in enumerate(zip(name_keys, barangay_keys))
+                if _matches(key, name_key, barangay_key)
+            )
+            for key in keys
+        }
+        return {
+            # Content-derived, so a rebuild after expiry keeps the heatmap cache keys
+            'version': hashlib.sha1(repr((rows, sorted(matches.items()))).encode()).hexdigest()[:12],
+            'names': names,
+            'name_keys': name_keys,
+            'barangay_keys': barangay_keys,
+            'latitudes': np.array([lat for _, _, lat, _ in rows], dtype=float),
+            'longitudes': np.array([lng for _, _, _, lng in rows], dtype=float),
+            'coordinates': [
+                {'lat': float(lat), 'lng': float(lng), 'facility_name': name}
+                for name, _, lat, lng in rows
+            ],
+            'matches': matches,
+        }
+
+    @classmethod
+    def get(cls):
+        index = cache.get(BARANGAY_FACILITY_INDEX_CACHE_KEY)
+        if index is None:
+            index = cls.build()
+            cache.set(BARANGAY_FACILITY_INDEX_CACHE_KEY, index, BARANGAY_FACILITY_INDEX_CACHE_TIMEOUT)
+        return index
+
+    @classmethod
+    def invalidate(cls):
+        cache.delete(BARANGAY_FACILITY_INDEX_CACHE_KEY)
+
+    @classmethod
+    def facility_positions(cls, barangay, index=None):
+        """Positions (into the index's facility arrays) of the facilities matching a barangay"""
+        index = index if index is not None else cls.get()
+        key = normalize_barangay(barangay)
+        positions = index['matches'].get(key)
+        if positions is None:
+            # Not a known barangay (e.g. a model trained after the index was built)
+            positions = tuple(
+                i for i, (name_key, barangay_key) in enumerate(zip(index['name_keys'], index['barangay_keys']))
+                if _matches(key, name_key, barangay_key)
+            )
+        return positions
+
+    @classmethod
+    def coordinates(cls, barangay, index=None):
+        """[{'lat', 'lng', 'facility_name'}, ...] for the facilities matching a barangay"""
+        index = index if index is not None else cls.get()
+        return [index['coordinates'][i] for i in cls.facility_positions(barangay, index)]
+
+    @classmethod
+    def coordinate_arrays(cls, barangay, index=None):
+        """(latitudes, longitudes) arrays for the facilities matching a barangay"""
+        index = index if index is not None else cls.get()
+        positions = list(cls.facility_positions(barangay, index))
+        return index['latitudes'][positions], index['longitudes'][positions]
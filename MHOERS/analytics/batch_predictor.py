@@ -1,8 +1,11 @@
+import hashlib
 import pandas as pd
 import numpy as np
 from django.core.cache import cache
 from .model_manager import MLModelManager
-from .ml_utils import build_disease_feature_frame, format_icd_prediction
+from .ml_utils import build_disease_feature_matrix, format_icd_prediction
+from .disease_features import DiseaseFeatureLayout
+from .time_features import referrals_to_time_frame
 
 def normalize_disease_prediction(prediction):
     """Normalize disease predictions, converting 'N' to 'Unspecified'"""
@@ -19,6 +22,14 @@ class BatchPredictor:
     @classmethod
     def predict_diseases_batch(cls, referrals):
         """Predict diseases for multiple referrals at once with confidence threshold"""
+        return {
+            referral_id: code
+            for referral_id, (code, _) in cls.score_diseases_batch(referrals).items()
+        }
+    
+    @classmethod
+    def score_diseases_batch(cls, referrals):
+        """Predict diseases with confidence threshold, returning {referral_id: (code, max_confidence)}"""
         try:
             models = MLModelManager.get_models()
             disease_model = models.get('disease_model')
@@ -26,12 +37,11 @@ class BatchPredictor:
             if disease_model is None or metadata is None:
                 return {}
 
-            feature_df = build_disease_feature_frame(referrals, metadata)
-            if feature_df.empty:
+            feature_matrix = build_disease_feature_matrix(referrals, metadata)
+            if feature_matrix is None or feature_matrix.shape[0] == 0:
                 return {}
 
-            predictions = disease_model.predict(feature_df)
-            prediction_probas = disease_model.predict_proba(feature_df)
+            predictions, prediction_probas = DiseaseFeatureLayout.predict(disease_model, feature_matrix)
             allowed_codes = metadata.get('allowed_icd', [])
             
             # Confidence threshold: if model is less than 30% confident, return "Unspecified"
@@ -41,11 +51,11 @@ class BatchPredictor:
             for i, code in enumerate(predictions):
                 # Convert to string and normalize "N" predictions to "Unspecified"
                 code_str = normalize_disease_prediction(code)
-                max_confidence = max(prediction_probas[i])
+                max_confidence = float(max(prediction_probas[i]))
                 
                 # If already normalized to "Unspecified", skip other checks
                 if code_str == "Unspecified":
-                    formatted.append(code_str)
+                    formatted.append((code_str, max_confidence))
                 # Special handling for T14.1 - require BOTH high confidence AND wound keywords
                 elif code_str == 'T14.1':
                     complaint_text = (referrals[i].chief_complaint or referrals[i].symptoms or '').lower()
@@ -56,16 +66,16 @@ class BatchPredictor:
                     # If confidence is below 50% OR no wound keywords, return "Unspecified"
                     # This ensures T14.1 is only returned when we're confident AND it's actually wound-related
                     if max_confidence < 0.5 or not has_wound_keyword:
-                        formatted.append("Unspecified")
+                        formatted.append(("Unspecified", max_confidence))
                     else:
-                        formatted.append(code_str)
+                        formatted.append((code_str, max_confidence))
                 # Check confidence for this prediction
                 elif max_confidence < CONFIDENCE_THRESHOLD:
-                    formatted.append("Unspecified")
+                    formatted.append(("Unspecified", max_confidence))
                 elif allowed_codes and code_str not in allowed_codes:
-                    formatted.append("Unspecified")
+                    formatted.append(("Unspecified", max_confidence))
                 else:
-                    formatted.append(code_str)
+                    formatted.append((code_str, max_confidence))
 
             return dict(zip([r.referral_id for r in referrals], formatted))
             
@@ -75,92 +85,97 @@ class BatchPredictor:
     
     @classmethod
     def predict_times_batch(cls, referrals):
-        """Predict completion times for multiple referrals at once"""
+        """
+        Predict completion times (minutes) for multiple referrals at once.
+        Uses the same sparse feature pipeline as predict_time_to_cater_advanced,
+        so a page of referrals is one CSR transform + one predict call.
+        """
         try:
             models = MLModelManager.get_models()
             time_model = models.get('time_model')
-            time_vectorizer = models.get('time_vectorizer')
+            time_pipeline = models.get('time_pipeline')
 
-            if time_model is None or time_vectorizer is None:
+            if time_model is None or time_pipeline is None:
                 return {}
             
-            # Prepare data for all referrals
-            numeric_data = []
-            text_data = []
-            valid_referrals = []
-            
-            for r in referrals:
-                try:
-                    # Handle missing values with defaults
-                    numeric_data.append({
-                        'weight': float(r.weight) if r.weight else 70.0,  # Default 70 kg
-                        'height': float(r.height) if r.height else 170.0,  # Default 170 cm
-                        'bp_systolic': r.bp_systolic if r.bp_systolic else 120,
-                        'bp_diastolic': r.bp_diastolic if r.bp_diastolic else 80,
-                        'pulse_rate': r.pulse_rate if r.pulse_rate else 72,
-                        'respiratory_rate': r.respiratory_rate if r.respiratory_rate else 18,
-                        'temperature': float(r.temperature) if r.temperature else 37.0,
-                        'oxygen_saturation': r.oxygen_saturation if r.oxygen_saturation else 98
-                    })
-                    text_data.append(r.symptoms or r.chief_complaint or '')
-                    valid_referrals.append(r)
-                except (ValueError, TypeError, AttributeError) as e:
-                    # Log error but continue with other referrals
-                    print(f"Error processing referral {r.referral_id} for time prediction: {e}")
-                    continue
-            
-            if not valid_referrals:
+            referrals = list(referrals)
+            if not referrals:
                 return {}
             
-            # Create DataFrame
-            X_numeric = pd.DataFrame(numeric_data)
-            X_text = time_vectorizer.transform(text_data).toarray()
-            X_combined = pd.concat([X_numeric.reset_index(drop=True), pd.DataFrame(X_text)], axis=1)
-            X_combined.columns = X_combined.columns.astype(str)
-            
             # Predict all times at once (model outputs hours)
-            time_predictions = time_model.predict(X_combined)
-            
-            # Create results dictionary
-            results = {}
-            for i, r in enumerate(valid_referrals):
-                hours = float(time_predictions[i])
-                minutes = round(hours * 60, 0)
-                results[r.referral_id] = minutes
+            time_predictions = time_pipeline.predict_hours(time_model, referrals_to_time_frame(referrals))
             
-            return results
+            return {
+                r.referral_id: round(float(hours) * 60, 0)
+                for r, hours in zip(referrals, time_predictions)
+            }
             
         except Exception as e:
             print(f"Error in batch time prediction: {e}")
             return {}
     
+    # Per-referral entries are content-addressed, so they only go stale via the key
+    PREDICTION_CACHE_TIMEOUT = 86400  # 24 hours
+    
+    @staticmethod
+    def feature_fingerprint(referral):
+        """Hash of every referral/patient field the disease and time models read"""
+        patient = getattr(referral, 'patient', None)
+        values = (
+            getattr(patient, 'age', None),
+            getattr(patient, 'sex', None),
+            referral.symptoms,
+            referral.chief_complaint,
+            referral.initial_diagnosis,
+            referral.final_diagnosis,
+            referral.weight,
+            referral.height,
+            referral.bp_systolic,
+            referral.bp_diastolic,
+            referral.pulse_rate,
+            referral.respiratory_rate,
+            referral.temperature,
+            referral.oxygen_saturation,
+        )
+        return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()[:16]
+    
+    @classmethod
+    def prediction_cache_key(cls, referral, model_version):
+        return f"prediction_{model_version}_{referral.referral_id}_{cls.feature_fingerprint(referral)}"
+    
     @classmethod
     def predict_all_batch(cls, referrals):
-        """Predict both disease and time for all referrals"""
-        cache_key = f"predictions_batch_{len(referrals)}"
-        cached_predictions = cache.get(cache_key)
-        
-        # If cached, normalize any "N" values before returning
-        if cached_predictions:
-            normalized_cache = {}
-            for ref_id, (disease, time_pred) in cached_predictions.items():
-                normalized_disease = normalize_disease_prediction(disease)
-                normalized_cache[ref_id] = (normalized_disease, time_pred)
-            return normalized_cache
+        """
+        Predict both disease and time for all referrals.
+        Results are cached per referral under (referral_id, feature hash, model version),
+        so only referrals that are new or changed since the last call hit the models.
+        """
+        referrals = list(referrals)
+        model_version = MLModelManager.get_version()
+        cache_keys = {r.referral_id: cls.prediction_cache_key(r, model_version) for r in referrals}
+        cached_predictions = cache.get_many(list(cache_keys.values()))
         
-        disease_predictions = cls.predict_diseases_batch(referrals)
-        time_predictions = cls.predict_times_batch(referrals)
+        misses = [r for r in referrals if cache_keys[r.referral_id] not in cached_predictions]
+        if misses:
+            disease_predictions = cls.predict_diseases_batch(misses)
+            time_predictions = cls.predict_times_batch(misses)
+            
+            fresh_predictions = {}
+            for r in misses:
+                disease = disease_predictions.get(r.referral_id, "No prediction")
+                time_pred = time_predictions.get(r.referral_id, "N/A")
+                cached_predictions[cache_keys[r.referral_id]] = (disease, time_pred)
+                # Don't pin failures for a day; they are retried on the next call
+                if r.referral_id in disease_predictions and r.referral_id in time_predictions:
+                    fresh_predictions[cache_keys[r.referral_id]] = (disease, time_pred)
+            
+            if fresh_predictions:
+                cache.set_many(fresh_predictions, cls.PREDICTION_CACHE_TIMEOUT)
         
         # Combine predictions and normalize any "N" values
         combined_predictions = {}
         for r in referrals:
-            disease = disease_predictions.get(r.referral_id, "No prediction")
-            # Additional normalization check in case "N" slipped through
-            disease = normalize_disease_prediction(disease)
-            time_pred = time_predictions.get(r.referral_id, "N/A")
-            combined_predictions[r.referral_id] = (disease, time_pred)
-        
-        # Cache for 5 minutes
-        cache.set(cache_key, combined_predictions, 300)
+            disease, time_pred = cached_predictions[cache_keys[r.referral_id]]
+            combined_predictions[r.referral_id] = (normalize_disease_prediction(disease), time_pred)
         
         return combined_predictions
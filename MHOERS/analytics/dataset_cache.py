@@ -0,0 +1,135 @@
+import glob
+import hashlib
+import os
+import pickle
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .model_registry import ModelRegistry
+
+# Bump when the on-disk encoding (or a cached builder's output) changes
+DATASET_CACHE_VERSION = 2
+DATASET_CACHE_DIR = 'dataset_cache'
+
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def source_fingerprint(paths):
+    """
+    Content hash of the given source files. Each file is hashed once per
+    (mtime, size); a changed CSV gets a new fingerprint and so a new cache entry.
+    """
+    digest = hashlib.sha1(f'v{DATASET_CACHE_VERSION}'.encode('utf-8'))
+    for path in paths:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        entry = _fingerprints.get(path)
+        if entry is None or entry[0] != signature:
+            with open(path, 'rb') as f:
+                file_hash = hashlib.sha1(f.read()).hexdigest()
+            with _fingerprints_lock:
+                _fingerprints[path] = entry = (signature, file_hash)
+        digest.update(entry[1].encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def encode_frame(df):
+    """
+    Columnar form of a DataFrame: numeric/bool/datetime columns as plain arrays,
+    object columns as int32 codes + unique values, so loading skips CSV parsing
+    and type inference.
+    """
+    columns = []
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_datetime64_any_dtype(series) and series.dt.tz is None:
+            columns.append((name, 'datetime', series.to_numpy(dtype='datetime64[ns]').view('int64'), None))
+        elif pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            columns.append((name, 'array', series.to_numpy(), None))
+        elif series.dtype == object:
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            columns.append((name, 'codes', codes.astype(np.int32), list(uniques)))
+        else:
+            columns.append((name, 'pickle', series, None))
+    index = None if isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1 else df.index.to_numpy()
+    return {'version': DATASET_CACHE_VERSION, 'index': index, 'columns': columns}
+
+
+def decode_frame(encoded):
+    """
+    DataFrame from encode_frame output. The frame takes over the encoded arrays
+    without copying them, so pass a freshly loaded artifact (not a shared one).
+    """
+    data = {}
+    for name, kind, values, uniques in encoded['columns']:
+        if kind == 'datetime':
+            data[name] = values.view('datetime64[ns]')
+        elif kind == 'codes':
+            uniques = np.array(list(uniques) + [np.nan], dtype=object)
+            # code -1 (missing) picks the trailing NaN
+            data[name] = uniques[values]
+        else:
+            data[name] = values
+    columns = [column[0] for column in encoded['columns']]
+    return pd.DataFrame(data, columns=columns, index=encoded['index'], copy=False)
+
+
+def _dump(encoded, path):
+    """
+    Write an encoded frame atomically (temp file + rename). Plain pickle rather than
+    joblib: joblib's pure-Python unpickler made loading slower than re-reading the CSV.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(encoded, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _load(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def cached_frame(name, sources, builder):
+    """
+    Frame produced by ``builder()`` from the ``sources`` files, cached under
+    ml_models/dataset_cache/ keyed by the sources' content hash.
+
+    Each call loads the artifact into a new, writable frame (nothing is kept
+    resident between calls), entries for older versions of the sources are removed
+    when a new one is written, and any cache error falls back to calling the builder.
+    """
+    try:
+        artifact = os.path.join(DATASET_CACHE_DIR, f'{name}_{source_fingerprint(sources)}.pkl')
+    except OSError:
+        return builder()
+
+    if ModelRegistry.exists(artifact):
+        try:
+            return decode_frame(_load(ModelRegistry.get_path(artifact)))
+        except Exception as e:
+            print(f"Dataset cache {artifact} unreadable, rebuilding: {e}")
+
+    df = builder()
+    try:
+        _dump(encode_frame(df), ModelRegistry.get_path(artifact))
+        current = re.compile(rf'{re.escape(name)}_[0-9a-f]{{16}}\.pkl')
+        for stale in glob.glob(ModelRegistry.get_path(os.path.join(DATASET_CACHE_DIR, f'{name}_*.pkl'))):
+            if current.fullmatch(os.path.basename(stale)) and os.path.basename(stale) != os.path.basename(artifact):
+                os.remove(stale)
+    except Exception as e:
+        print(f"Could not write dataset cache {artifact}: {e}")
+    return df
+
+
+def read_csv_cached(path, encoding='latin1'):
+    """pd.read_csv(path, encoding=...) through the columnar cache"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    slug = ''.join(ch if ch.isalnum() else '_' for ch in stem)
+    return cached_frame(f'csv_{slug}_{encoding}', [path], lambda: pd.read_csv(path, encoding=encoding))
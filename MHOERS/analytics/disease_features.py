@@ -0,0 +1,136 @@
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+
+class DiseaseFeatureLayout:
+    """
+    Column layout of the ICD-10 classifier (AGE, SEX_* dummies, SYM_* complaint
+    tokens), resolved once from the saved disease_vectorizer metadata.
+
+    transform() maps each row's age, sex and tokens straight to column indices and
+    assembles one CSR matrix, with the same values the old get_dummies /
+    MultiLabelBinarizer / reindex pipeline produced. Training builds its matrix
+    through the same layout.
+    """
+
+    def __init__(self, metadata):
+        from .ml_utils import COMPLAINT_TRANSLATIONS, COMPLAINT_STOPWORDS, NO_COMPLAINT_TOKEN
+
+        mlb = metadata.get('mlb')
+        mlb_classes = list(metadata.get('mlb_classes', getattr(mlb, 'classes_', [])))
+        symptom_columns = metadata.get('symptom_columns')
+        if not (symptom_columns and len(symptom_columns) == len(mlb_classes)):
+            symptom_columns = [f"SYM_{cls}" for cls in mlb_classes]
+        sex_columns = list(metadata.get('sex_columns', []))
+
+        self.translations = metadata.get('translations') or COMPLAINT_TRANSLATIONS
+        self.stopwords = metadata.get('stopwords') or COMPLAINT_STOPWORDS
+        self.fallback_token = metadata.get('fallback_token', NO_COMPLAINT_TOKEN)
+        self.default_age = metadata.get('default_age', 30.0)
+        self.feature_columns = list(metadata.get('feature_columns') or (['AGE'] + sex_columns + symptom_columns))
+
+        column_index = {}
+        for i, column in enumerate(self.feature_columns):
+            column_index.setdefault(column, i)
+        self.age_index = column_index.get('AGE')
+        # Only dummies the training kept (sex_columns) survive, as before
+        self.sex_index = {
+            column[len('SEX_'):]: column_index[column]
+            for column in (sex_columns or [c for c in self.feature_columns if c.startswith('SEX_')])
+            if column in column_index
+        }
+        # Tokens the binarizer knows, even if the final layout dropped their column
+        self.known_tokens = frozenset(mlb_classes)
+        self.token_index = {
+            token: column_index[column]
+            for token, column in zip(mlb_classes, symptom_columns)
+            if column in column_index
+        }
+
+    @property
+    def n_features(self):
+        return len(self.feature_columns)
+
+    def tokens(self, text):
+        """Complaint tokens restricted to the binarizer's classes (fallback token if none)"""
+        from .ml_utils import get_text_normalizer
+
+        tokens = get_text_normalizer(self.translations, self.stopwords).tokenize(text)
+        return [t for t in tokens if t in self.known_tokens] or [self.fallback_token]
+
+    def transform(self, ages, sexes, token_lists):
+        """CSR matrix (float64) with one row per (age, normalized sex, tokens) triple"""
+        rows, cols = [], []
+        n_rows = len(token_lists)
+        ages = pd.to_numeric(pd.Series(list(ages), dtype=object), errors='coerce').fillna(self.default_age).fillna(0)
+
+        for i, (sex, tokens) in enumerate(zip(sexes, token_lists)):
+            sex_column = self.sex_index.get(sex)
+            if sex_column is not None:
+                rows.append(i)
+                cols.append(sex_column)
+            token_columns = {self.token_index[t] for t in tokens if t in self.token_index}
+            rows.extend([i] * len(token_columns))
+            cols.extend(token_columns)
+
+        data = np.ones(len(rows))
+        if self.age_index is not None and n_rows:
+            rows.extend(range(n_rows))
+            cols.extend([self.age_index] * n_rows)
+            data = np.concatenate([data, ages.to_numpy(dtype=float)])
+
+        matrix = scipy.sparse.csr_matrix(
+            (data, (rows, cols)), shape=(n_rows, self.n_features), dtype=float
+        )
+        matrix.eliminate_zeros()
+        return matrix
+
+    def transform_referrals(self, referrals):
+        from .ml_utils import normalize_sex
+
+        ages, sexes, token_lists = [], [], []
+        for referral in referrals:
+            patient = getattr(referral, 'patient', None)
+            ages.append(getattr(patient, 'age', None))
+            sexes.append(normalize_sex(getattr(patient, 'sex', None)))
+            token_lists.append(self.tokens(referral.symptoms or referral.chief_complaint or ''))
+        return self.transform(ages, sexes, token_lists)
+
+    @staticmethod
+    def predict(model, matrix):
+        """
+        (predicted classes, class probabilities) from a single predict_proba call;
+        the class is the argmax, exactly what model.predict returns.
+        """
+        with warnings.catch_warnings():
+            # Classifiers trained on the old DataFrame carry feature names; the
+            # columns are in the same order, only unnamed
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            probabilities = model.predict_proba(matrix)
+        return model.classes_.take(np.argmax(probabilities, axis=1)), probabilities
+
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+
+def get_disease_feature_layout(metadata):
+    """
+    Layout for a metadata dict, computed once per loaded artifact (ModelRegistry hands
+    out the same object until the file changes on disk).
+    """
+    key = id(metadata)
+    entry = _layouts.get(key)
+    if entry is not None and entry[0] is metadata:
+        return entry[1]
+    layout = DiseaseFeatureLayout(metadata)
+    with _layouts_lock:
+        if len(_layouts) > 8:
+            _layouts.clear()
+        # Keep a reference to metadata so its id can't be reused while cached
+        _layouts[key] = (metadata, layout)
+    return layout
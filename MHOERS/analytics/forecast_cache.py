@@ -0,0 +1,61 @@
+"""
+Forecast cache keys derived from the trained artifacts.
+
+Every cached forecast (the monthly disease forecast, the barangay predictions and
+the views built on them) is keyed by forecast_version(), a fingerprint of the
+model files on disk. ModelRegistry.save() replaces a file atomically, so a
+retrain changes the version and every reader switches to the new keys at once;
+warm_forecast_caches() fills them right after training so nobody pays for the
+recomputation.
+"""
+import hashlib
+
+from django.core.cache import cache
+
+from .model_registry import ModelRegistry
+from .peak_training import (
+    BARANGAY_PEAK_MODELS_ARTIFACT, BARANGAY_PEAK_METADATA_ARTIFACT, BARANGAY_FORECAST_ARTIFACT,
+)
+
+DISEASE_FORECAST_ARTIFACTS = [
+    'disease_forecast_best_model.pkl',
+    'disease_forecast_best_scaler.pkl',
+    'disease_forecast_best_encoder.pkl',
+    'disease_forecast_best_metadata.pkl',
+]
+BARANGAY_PEAK_ARTIFACTS = [
+    BARANGAY_PEAK_MODELS_ARTIFACT,
+    BARANGAY_PEAK_METADATA_ARTIFACT,
+    BARANGAY_FORECAST_ARTIFACT,
+]
+FORECAST_ARTIFACTS = DISEASE_FORECAST_ARTIFACTS + BARANGAY_PEAK_ARTIFACTS
+
+# Keys change on retrain, so entries never go stale; the timeout only bounds
+# how long superseded versions linger in the cache
+FORECAST_CACHE_TIMEOUT = 30 * 86400
+
+
+def forecast_version():
+    """Fingerprint of the forecast artifacts on disk; changes whenever one is retrained"""
+    return ModelRegistry.get_version(FORECAST_ARTIFACTS)
+
+
+def forecast_cache_key(*parts):
+    """Cache key for a forecast result, scoped to the current forecast_version()"""
+    digest = hashlib.md5('_'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'forecast_{forecast_version()}_{digest}'
+
+
+def warm_forecast_caches(use_db=False):
+    """
+    Compute and cache the forecasts for the current artifact version, so the first
+    request after a retrain is served from cache. Returns {name: result}.
+    """
+    from .ml_utils import predict_disease_forecast_2025_monthly, predict_barangay_disease_peak_2025
+
+    warmed = {}
+    if all(ModelRegistry.exists(name) for name in DISEASE_FORECAST_ARTIFACTS):
+        warmed['disease_forecast'] = predict_disease_forecast_2025_monthly()
+    if ModelRegistry.exists(BARANGAY_PEAK_MODELS_ARTIFACT):
+        warmed['barangay_peaks'] = predict_barangay_disease_peak_2025(use_db=use_db)
+    return warmed
@@ -0,0 +1,81 @@
+"""
+Write-time illness normalization for Medical_History.
+
+A medical history's free-text illness_name is resolved once, when it is saved
+(see analytics.signals), into a link to the matching Disease and the label the
+reports show. Reports then group on Medical_History.disease / illness_label
+instead of re-normalizing every row per request. Rows written before these
+columns existed are backfilled by patients migration 0005; rows whose Disease
+is added, renamed or deleted later are re-resolved by the Disease signal (and
+can be re-resolved in bulk with the normalize_medical_histories command).
+"""
+from .severity_index import SeverityIndex
+
+# Free-text illness names recorded under a broader disease
+ILLNESS_ALIASES = {
+    'cat bite': 'possible rabies',
+    'dog bite': 'possible rabies',
+    'lbm': 'gastrointestinal issue',
+}
+
+
+def illness_key(name):
+    """Disease lookup key of an illness name: ' Dog Bite ' -> 'possible rabies'"""
+    key = (name or '').strip().lower()
+    return ILLNESS_ALIASES.get(key, key)
+
+
+def resolve_illness(name, index=None):
+    """
+    (disease_id, label) for an illness name: the matching Disease and its name,
+    or (None, the title-cased illness name / 'Unspecified') if none matches
+    """
+    entry = SeverityIndex.lookup_name(illness_key(name), index)
+    if entry:
+        return entry['id'], entry['name']
+    return None, (name or '').strip().title() or 'Unspecified'
+
+
+def normalize_history(history, index=None):
+    """Set a Medical_History's disease and illness_label from its illness_name"""
+    history.disease_id, history.illness_label = resolve_illness(history.illness_name, index)
+    return history
+
+
+def illness_names_for(disease_names):
+    """Lower-cased illness names that resolve to any of the given disease names"""
+    keys = {str(name).strip().lower() for name in disease_names if name}
+    return keys | {alias for alias, target in ILLNESS_ALIASES.items() if target in keys}
+
+
+def normalize_medical_histories(disease_names=None):
+    """
+    Backfill disease / illness_label for stored medical histories: each distinct
+    illness_name is resolved once and its stale rows fixed with one UPDATE, then
+    the touched days of the morbidity rollup are recomputed. ``disease_names``
+    limits this to the illnesses resolving to those disease names. Returns the
+    number of rows updated.
+    """
+    from django.db.models.functions import Lower, Trim
+    from patients.models import Medical_History
+    from .rollups import _in_chunks, refresh_morbidity_days
+
+    histories = Medical_History.objects.all()
+    if disease_names is not None:
+        histories = histories.annotate(illness_key=Lower(Trim('illness_name'))).filter(
+            illness_key__in=illness_names_for(disease_names)
+        )
+
+    # Built fresh rather than from the cache, which may predate a Disease write
+    index = SeverityIndex.build()
+    updated = 0
+    touched_days = set()
+    for name in histories.values_list('illness_name', flat=True).distinct().order_by():
+        disease_id, label = resolve_illness(name, index)
+        stale = Medical_History.objects.filter(illness_name=name).exclude(disease_id=disease_id, illness_label=label)
+        touched_days.update(stale.values_list('diagnosed_date', flat=True).distinct().order_by())
+        updated += stale.update(disease_id=disease_id, illness_label=label)
+
+    for chunk in _in_chunks(touched_days):
+        refresh_morbidity_days(chunk)
+    return updated
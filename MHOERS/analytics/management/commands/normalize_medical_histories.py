@@ -0,0 +1,18 @@
+"""
+Django Management Command: Normalize Medical History Illnesses
+Re-resolves Medical_History.disease / illness_label (see analytics.illness) for
+every stored row. Existing rows are backfilled by patients migration 0005, new
+and edited records are normalized when saved, and Disease writes re-resolve
+the matching rows, so this is only needed after bulk changes.
+"""
+from django.core.management.base import BaseCommand
+from analytics.illness import normalize_medical_histories
+
+
+class Command(BaseCommand):
+    help = 'Backfill the normalized disease link and label of medical histories'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('\n🩺 Normalizing medical history illnesses...\n'))
+        updated = normalize_medical_histories()
+        self.stdout.write(self.style.SUCCESS(f'✅ Updated {updated} medical histories'))
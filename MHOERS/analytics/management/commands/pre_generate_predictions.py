@@ -1,7 +1,9 @@
 """
 Django Management Command: Pre-generate Disease Forecast Predictions
 Pre-generates and caches 2025 monthly predictions for instant page loads.
-This should be run after pre-training models to warm up the cache.
+This should be run after pre-training models to warm up the cache. Cache keys
+carry the model version, so the predictions are cached for the models on disk
+and a retrain never serves stale ones.
 """
 from django.core.management.base import BaseCommand
 from analytics.ml_utils import (
@@ -9,6 +11,7 @@ from analytics.ml_utils import (
     predict_barangay_disease_peak_2025,
     get_ml_models_path
 )
+from analytics.forecast_cache import forecast_version
 import os
 
 
@@ -39,6 +42,7 @@ class Command(BaseCommand):
         
         models_dir = get_ml_models_path()
         self.stdout.write(self.style.SUCCESS(f'\n📦 Models directory: {models_dir}\n'))
+        self.stdout.write(f'   Forecast model version: {forecast_version()}\n')
         
         # Check if models exist
         main_model_path = os.path.join(models_dir, 'disease_forecast_best_model.pkl')
@@ -69,7 +73,7 @@ class Command(BaseCommand):
                         self.stdout.write(f'   Diseases: {len(result)}')
                         total_months = sum(len(months) for months in result.values())
                         self.stdout.write(f'   Total predictions: {total_months}')
-                        self.stdout.write('   Cache duration: 24 hours\n')
+                        self.stdout.write('   Cached until the models are retrained\n')
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f'❌ Error generating predictions: {e}'))
         
@@ -95,6 +99,6 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS('\n✨ Pre-generation complete!'))
         self.stdout.write('💡 Tip: Page loads will now be instant (<1 second)!\n')
-        self.stdout.write('📝 Note: Predictions are cached for 24 hours. Re-run this command to refresh.\n')
+        self.stdout.write('📝 Note: Predictions are cached per model version. Re-run this command after retraining.\n')
 
 
@@ -43,6 +43,12 @@ class Command(BaseCommand):
             default=None,
             help='Path to 2024 CSV file (default: auto-detect)',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Worker processes for the barangay models (default: ML_TRAINING_WORKERS or all cores)',
+        )
 
     def handle(self, *args, **options):
         use_db = options['use_db']
@@ -50,6 +56,7 @@ class Command(BaseCommand):
         barangay_only = options['barangay_model_only']
         csv_2023 = options['csv_2023']
         csv_2024 = options['csv_2024']
+        workers = options['workers']
         
         models_dir = get_ml_models_path()
         self.stdout.write(self.style.SUCCESS(f'\n📦 Models will be saved to: {models_dir}\n'))
@@ -97,7 +104,8 @@ class Command(BaseCommand):
                 result = train_barangay_disease_peak_model(
                     csv_2023_path=csv_2023,
                     csv_2024_path=csv_2024,
-                    use_db=use_db
+                    use_db=use_db,
+                    n_workers=workers
                 )
                 
                 if "error" in result:
@@ -107,6 +115,8 @@ class Command(BaseCommand):
                     stats = result.get('training_stats', {})
                     self.stdout.write(f'   Barangays: {stats.get("total_barangays", 0)}')
                     self.stdout.write(f'   Models trained: {stats.get("models_trained", 0)}')
+                    self.stdout.write(f'   Training time: {stats.get("training_seconds", 0)}s '
+                                      f'on {stats.get("workers", 1)} worker(s)')
                     self.stdout.write(f'   Saved to: {result["models_saved_to"]}\n')
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f'❌ Error training barangay model: {e}'))
@@ -131,25 +141,17 @@ class Command(BaseCommand):
         # Pre-generate predictions to warm up cache
         self.stdout.write(self.style.SUCCESS('\n🔮 Pre-generating predictions to warm up cache...\n'))
         try:
-            from analytics.ml_utils import predict_disease_forecast_2025_monthly, predict_barangay_disease_peak_2025
-            
-            # Pre-generate main predictions
-            if not barangay_only and main_exists:
-                self.stdout.write('   Generating main disease predictions...')
-                main_result = predict_disease_forecast_2025_monthly()
-                if "error" not in main_result:
-                    self.stdout.write(self.style.SUCCESS('   ✅ Main predictions cached'))
-                else:
-                    self.stdout.write(self.style.WARNING(f'   ⚠️  {main_result.get("error", "Unknown error")}'))
+            from analytics.forecast_cache import forecast_version, warm_forecast_caches
             
-            # Pre-generate barangay predictions
-            if not main_only and barangay_exists:
-                self.stdout.write('   Generating barangay predictions...')
-                barangay_result = predict_barangay_disease_peak_2025(use_db=use_db)
-                if "error" not in barangay_result:
-                    self.stdout.write(self.style.SUCCESS('   ✅ Barangay predictions cached'))
+            # Retraining changed the model version, so these fill the new cache keys
+            self.stdout.write(f'   Forecast model version: {forecast_version()}')
+            warmed = warm_forecast_caches(use_db=use_db)
+            labels = {'disease_forecast': 'Main', 'barangay_peaks': 'Barangay'}
+            for name, result in warmed.items():
+                if "error" not in result:
+                    self.stdout.write(self.style.SUCCESS(f'   ✅ {labels[name]} predictions cached'))
                 else:
-                    self.stdout.write(self.style.WARNING(f'   ⚠️  {barangay_result.get("error", "Unknown error")}'))
+                    self.stdout.write(self.style.WARNING(f'   ⚠️  {result.get("error", "Unknown error")}'))
         except Exception as e:
             self.stdout.write(self.style.WARNING(f'   ⚠️  Could not pre-generate predictions: {e}'))
             self.stdout.write('   You can run "python manage.py pre_generate_predictions" separately')
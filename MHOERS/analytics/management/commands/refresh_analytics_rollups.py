@@ -0,0 +1,33 @@
+"""
+Django Management Command: Refresh Analytics Rollups
+Brings the daily referral/morbidity rollups up to date from their high-water
+marks (referral created_at/completed_at, last medical history id). Use --rebuild
+to recompute everything, e.g. after deploying the rollups or importing data.
+Schedule it (cron) as a safety net next to the signal-driven refresh.
+"""
+from django.core.management.base import BaseCommand
+from analytics.rollups import rebuild_rollups, refresh_rollups_incremental
+
+
+class Command(BaseCommand):
+    help = 'Refresh (or rebuild with --rebuild) the daily referral and morbidity rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute every day from scratch instead of catching up from the last run',
+        )
+
+    def handle(self, *args, **options):
+        if not options['rebuild']:
+            refreshed = refresh_rollups_incremental()
+            if refreshed is not None:
+                self.stdout.write(self.style.SUCCESS(f'✅ Refreshed {refreshed} day(s) since the last run'))
+                return
+            self.stdout.write(self.style.WARNING('⚠️  No previous run found, rebuilding all rollups...'))
+
+        referral_rows, morbidity_rows = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Rebuilt rollups: {referral_rows} referral rows, {morbidity_rows} morbidity rows'
+        ))
@@ -0,0 +1,53 @@
+"""
+Django Management Command: Refresh Stored Referral Predictions
+Backfills ReferralPrediction rows for existing referrals and recomputes the ones
+whose features or models changed. Run after retraining the disease/time models.
+"""
+from django.core.management.base import BaseCommand
+from referrals.models import Referral
+from analytics.prediction_store import refresh_referral_predictions
+
+
+class Command(BaseCommand):
+    help = 'Backfill/recompute stored disease and time predictions for referrals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Recompute every prediction, even if features and model version are unchanged',
+        )
+        parser.add_argument(
+            '--status',
+            type=str,
+            help='Only refresh referrals with this status (e.g. pending)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of referrals scored per batch (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        force = options['force']
+        batch_size = max(1, options['batch_size'])
+
+        referrals = Referral.objects.select_related('patient').order_by('referral_id')
+        if options['status']:
+            referrals = referrals.filter(status=options['status'])
+
+        total = referrals.count()
+        self.stdout.write(self.style.SUCCESS(f'\n🔮 Refreshing predictions for {total} referrals...\n'))
+
+        written = 0
+        batch = []
+        for referral in referrals.iterator(chunk_size=batch_size):
+            batch.append(referral)
+            if len(batch) >= batch_size:
+                written += refresh_referral_predictions(batch, force=force)
+                batch = []
+        if batch:
+            written += refresh_referral_predictions(batch, force=force)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Stored {written} predictions ({total - written} already up to date)'))
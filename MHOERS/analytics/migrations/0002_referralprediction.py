@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 00:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('referrals', '0002_alter_referral_family_planning_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralPrediction',
+            fields=[
+                ('referral', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='prediction', serialize=False, to='referrals.referral')),
+                ('icd_code', models.CharField(max_length=20)),
+                ('confidence', models.FloatField(blank=True, null=True)),
+                ('predicted_minutes', models.FloatField(blank=True, null=True)),
+                ('feature_hash', models.CharField(max_length=16)),
+                ('model_version', models.CharField(db_index=True, max_length=12)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-17 01:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailymorbidityrollup',
+            name='disease',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='analytics.disease'),
+        ),
+        migrations.AddField(
+            model_name='dailymorbidityrollup',
+            name='illness_label',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,83 @@
+from django.db import migrations
+from django.db.models import Count, Max
+from django.db.models.functions import Lower, Trim, TruncDate
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    """
+    Fill the daily rollups from the existing referrals / medical histories (the
+    same grouping as analytics.rollups.rebuild_rollups) and record the watermark,
+    so the reports read complete counts as soon as the tables exist
+    """
+    db = schema_editor.connection.alias
+    Referral = apps.get_model('referrals', 'Referral')
+    Medical_History = apps.get_model('patients', 'Medical_History')
+    DailyReferralRollup = apps.get_model('analytics', 'DailyReferralRollup')
+    DailyMorbidityRollup = apps.get_model('analytics', 'DailyMorbidityRollup')
+    RollupWatermark = apps.get_model('analytics', 'RollupWatermark')
+
+    referral_groups = (
+        Referral.objects.using(db).filter(created_at__isnull=False)
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'patient__facility_id', 'status', 'user_id', 'examined_by_id')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    DailyReferralRollup.objects.using(db).all().delete()
+    DailyReferralRollup.objects.using(db).bulk_create(
+        (
+            DailyReferralRollup(
+                day=group['day'], facility_id=group['patient__facility_id'], status=group['status'],
+                user_id=group['user_id'], examined_by_id=group['examined_by_id'], count=group['count'],
+            )
+            for group in referral_groups
+        ),
+        batch_size=1000,
+    )
+
+    morbidity_groups = (
+        Medical_History.objects.using(db).filter(diagnosed_date__isnull=False)
+        .annotate(illness=Lower(Trim('illness_name')))
+        .values('diagnosed_date', 'patient_id__facility_id', 'illness', 'disease_id', 'illness_label',
+                'user_id', 'referral__status', 'referral__examined_by_id')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    DailyMorbidityRollup.objects.using(db).all().delete()
+    DailyMorbidityRollup.objects.using(db).bulk_create(
+        (
+            DailyMorbidityRollup(
+                day=group['diagnosed_date'], facility_id=group['patient_id__facility_id'],
+                illness=group['illness'] or '', disease_id=group['disease_id'],
+                illness_label=group['illness_label'], user_id=group['user_id'],
+                referral_status=group['referral__status'] or '',
+                examined_by_id=group['referral__examined_by_id'], count=group['count'],
+            )
+            for group in morbidity_groups
+        ),
+        batch_size=1000,
+    )
+
+    marks = Referral.objects.using(db).aggregate(created=Max('created_at'), completed=Max('completed_at'))
+    RollupWatermark.objects.using(db).update_or_create(
+        name='daily_rollups',
+        defaults={
+            'referral_created_at': marks['created'],
+            'referral_completed_at': marks['completed'],
+            'history_id': Medical_History.objects.using(db).aggregate(last=Max('pk'))['last'] or 0,
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_morbidity_rollup_disease'),
+        # Run after the illness labels are backfilled, so the morbidity rollup carries them
+        ('patients', '0005_backfill_illness_labels'),
+        ('referrals', '0002_alter_referral_family_planning_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
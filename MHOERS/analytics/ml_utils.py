@@ -4,6 +4,8 @@ import os
 import joblib
 import re
 import scipy
+import time
+from datetime import date
 
 from referrals.models import Referral 
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -11,10 +13,26 @@ from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, G
 from sklearn.preprocessing import StandardScaler, LabelEncoder, MultiLabelBinarizer
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score, accuracy_score, f1_score
-from django.db.models import Count, Q
-from django.db.models.functions import TruncMonth
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import Count, Q, TextField
+from django.db.models.functions import Cast, TruncMonth
 from django.conf import settings
 
+from .model_registry import ModelRegistry
+from .text_normalizer import ClinicalTextNormalizer
+from .disease_features import DiseaseFeatureLayout, get_disease_feature_layout
+from .dataset_cache import cached_frame, read_csv_cached
+from .forecast_cache import forecast_cache_key, FORECAST_CACHE_TIMEOUT
+from .peak_training import (
+    fit_group_models, build_forecast_table, BARANGAY_PEAK_MODELS_ARTIFACT,
+    BARANGAY_PEAK_METADATA_ARTIFACT, BARANGAY_FORECAST_ARTIFACT, FORECAST_YEAR,
+)
+from .time_features import (
+    TimeToCaterFeaturePipeline, referrals_to_time_frame, load_time_feature_pipeline, load_time_model, save_time_model,
+    MIN_TIME_HOURS, MAX_TIME_HOURS,
+)
+
 # Medical keywords for advanced time prediction
 MEDICAL_KEYWORDS = ['fever', 'cough', 'pain', 'headache', 'dizziness', 'nausea',
                    'vomiting', 'diarrhea', 'rash', 'bleeding', 'swelling',
@@ -85,87 +103,47 @@ def normalize_sex(value):
     return SEX_NORMALIZATION.get(normalized, normalized if normalized in {'M', 'F'} else 'Unknown')
 
 
-def clean_and_tokenize_complaints(text, translations=None, stopwords=None):
-    if pd.isna(text):
-        text = ''
-    translations = translations or COMPLAINT_TRANSLATIONS
-    stopwords = set(stopwords or COMPLAINT_STOPWORDS)
-    cleaned = str(text).lower()
-    cleaned = re.sub(r'[^a-z\s]', ' ', cleaned)
-    for source, target in translations.items():
-        cleaned = cleaned.replace(source, target)
-    return [word for word in cleaned.split() if word and word not in stopwords and len(word) > 1]
-
+_NORMALIZERS = {}
 
-def _prepare_complaint_tokens(tokens, mlb, fallback_token):
-    if not isinstance(tokens, (list, tuple)):
-        tokens = []
-    filtered = [token for token in tokens if token in getattr(mlb, 'classes_', [])]
-    if not filtered:
-        filtered = [fallback_token]
-    return filtered
 
+def get_text_normalizer(translations=None, stopwords=None):
+    """
+    Compiled ClinicalTextNormalizer for the given tables (defaults: the module
+    constants), built once per distinct table set and reused across calls.
+    """
+    translations = translations or COMPLAINT_TRANSLATIONS
+    stopwords = stopwords or COMPLAINT_STOPWORDS
+    key = (tuple(translations.items()), frozenset(stopwords))
+    normalizer = _NORMALIZERS.get(key)
+    if normalizer is None:
+        normalizer = ClinicalTextNormalizer(
+            translations=translations,
+            stopwords=stopwords,
+            synonyms=MEDICAL_SYNONYMS,
+            keywords=MEDICAL_KEYWORDS,
+        )
+        _NORMALIZERS[key] = normalizer
+    return normalizer
 
-def build_disease_feature_frame(referrals, metadata):
-    if not referrals or metadata is None:
-        return pd.DataFrame()
 
-    mlb = metadata.get('mlb')
-    if mlb is None:
-        return pd.DataFrame()
+def clean_and_tokenize_complaints(text, translations=None, stopwords=None):
+    return get_text_normalizer(translations, stopwords).tokenize(text)
 
-    translations = metadata.get('translations') or COMPLAINT_TRANSLATIONS
-    stopwords = metadata.get('stopwords') or COMPLAINT_STOPWORDS
-    fallback_token = metadata.get('fallback_token', NO_COMPLAINT_TOKEN)
-    sex_columns = metadata.get('sex_columns', [])
-    symptom_columns = metadata.get('symptom_columns')
-    mlb_classes = metadata.get('mlb_classes', getattr(mlb, 'classes_', []))
-    feature_columns = metadata.get('feature_columns', [])
-    default_age = metadata.get('default_age', 30.0)
-
-    rows = []
-    tokens_list = []
-
-    for referral in referrals:
-        patient = getattr(referral, 'patient', None)
-        age = getattr(patient, 'age', None)
-        sex = normalize_sex(getattr(patient, 'sex', None))
-        text = referral.symptoms or referral.chief_complaint or ''
-        tokens = clean_and_tokenize_complaints(text, translations, stopwords)
-        tokens = _prepare_complaint_tokens(tokens, mlb, fallback_token)
-
-        rows.append({'AGE': age, 'SEX': sex})
-        tokens_list.append(tokens)
-
-    if not rows:
-        return pd.DataFrame(columns=feature_columns)
-
-    df = pd.DataFrame(rows)
-    df['AGE'] = pd.to_numeric(df['AGE'], errors='coerce').fillna(default_age)
-
-    sex_dummies = pd.get_dummies(df['SEX'], prefix='SEX')
-    for column in sex_columns:
-        if column not in sex_dummies.columns:
-            sex_dummies[column] = 0
-    if sex_columns:
-        sex_dummies = sex_dummies[sex_columns]
-
-    symptom_matrix = mlb.transform(tokens_list)
-    if symptom_columns and len(symptom_columns) == len(mlb_classes):
-        symptom_df = pd.DataFrame(symptom_matrix, columns=symptom_columns)
-    else:
-        symptom_df = pd.DataFrame(symptom_matrix, columns=[f"SYM_{cls}" for cls in mlb_classes])
 
-    feature_frames = [df[['AGE']].reset_index(drop=True)]
-    if not sex_dummies.empty:
-        feature_frames.append(sex_dummies.reset_index(drop=True))
-    feature_frames.append(symptom_df.reset_index(drop=True))
+def build_disease_feature_matrix(referrals, metadata):
+    """CSR design matrix of the ICD-10 classifier for ``referrals``, or None if unavailable"""
+    if not referrals or not metadata or metadata.get('mlb') is None:
+        return None
+    return get_disease_feature_layout(metadata).transform_referrals(referrals)
 
-    feature_df = pd.concat(feature_frames, axis=1)
-    if feature_columns:
-        feature_df = feature_df.reindex(columns=feature_columns, fill_value=0)
 
-    return feature_df.fillna(0).astype(float)
+def build_disease_feature_frame(referrals, metadata):
+    """Dense DataFrame view of build_disease_feature_matrix (training column names)"""
+    matrix = build_disease_feature_matrix(referrals, metadata)
+    if matrix is None:
+        return pd.DataFrame()
+    layout = get_disease_feature_layout(metadata)
+    return pd.DataFrame(matrix.toarray(), columns=layout.feature_columns)
 
 
 def format_icd_prediction(icd_code, metadata=None):
@@ -179,14 +157,7 @@ def format_icd_prediction(icd_code, metadata=None):
 
 def preprocess_text_advanced(text):
     """Advanced text preprocessing for complaints"""
-    if pd.isna(text) or text == '':
-        return ''
-    text = str(text).lower().strip()
-    for pattern, replacement in MEDICAL_SYNONYMS.items():
-        text = re.sub(pattern, replacement, text)
-    text = re.sub(r'[^a-z0-9\s]', ' ', text)
-    text = ' '.join(text.split())
-    return text
+    return get_text_normalizer().preprocess(text)
 
 def assign_age_group(age):
     """Assign age to group category"""
@@ -226,7 +197,7 @@ def train_random_forest_model_classification():
     if not os.path.exists(dataset_path):
         return {"error": f"Dataset not found at {dataset_path}"}
 
-    df = pd.read_csv(dataset_path, encoding='ISO-8859-1').rename(columns=str.strip)
+    df = read_csv_cached(dataset_path, encoding='latin1').rename(columns=str.strip)
 
     required_columns = {'AGE', 'SEX', 'COMPLAINTS', 'ICD10 CODE', 'DIAGNOSIS'}
     missing_columns = required_columns - set(df.columns)
@@ -249,33 +220,29 @@ def train_random_forest_model_classification():
     translations = dict(COMPLAINT_TRANSLATIONS)
     stopwords = list(COMPLAINT_STOPWORDS)
     df['COMPLAINTS_CLEAN'] = (
-        df['COMPLAINTS']
-        .fillna('')
-        .astype(str)
-        .apply(lambda text: clean_and_tokenize_complaints(text, translations, stopwords))
+        get_text_normalizer(translations, stopwords)
+        .tokenize_series(df['COMPLAINTS'].fillna('').astype(str))
         .apply(lambda tokens: tokens if tokens else [NO_COMPLAINT_TOKEN])
     )
 
     mlb = MultiLabelBinarizer()
-    complaint_matrix = mlb.fit_transform(df['COMPLAINTS_CLEAN'])
+    mlb.fit(df['COMPLAINTS_CLEAN'])
     mlb_classes = list(mlb.classes_)
     symptom_columns = [f"SYM_{cls}" for cls in mlb_classes]
-    symptoms_df = pd.DataFrame(complaint_matrix, columns=symptom_columns)
 
     df['SEX_NORMALIZED'] = df['SEX'].apply(normalize_sex)
-    sex_dummies = pd.get_dummies(df['SEX_NORMALIZED'], prefix='SEX')
-    if 'SEX_Unknown' not in sex_dummies.columns:
-        sex_dummies['SEX_Unknown'] = 0
-    sex_columns = sorted(sex_dummies.columns)
-    sex_dummies = sex_dummies[sex_columns]
-
-    feature_frames = [
-        df[['AGE']].reset_index(drop=True),
-        sex_dummies.reset_index(drop=True),
-        symptoms_df.reset_index(drop=True)
-    ]
-    X = pd.concat(feature_frames, axis=1).fillna(0).astype(float)
-    feature_columns = list(X.columns)
+    sex_columns = sorted({f"SEX_{value}" for value in df['SEX_NORMALIZED'].unique()} | {'SEX_Unknown'})
+    feature_columns = ['AGE'] + sex_columns + symptom_columns
+
+    # Same layout (and code path) as inference in build_disease_feature_matrix
+    layout = DiseaseFeatureLayout({
+        "mlb": mlb,
+        "mlb_classes": mlb_classes,
+        "symptom_columns": symptom_columns,
+        "sex_columns": sex_columns,
+        "feature_columns": feature_columns,
+    })
+    X = layout.transform(df['AGE'], df['SEX_NORMALIZED'], df['COMPLAINTS_CLEAN'])
 
     y = df['ICD10 CODE'].astype(str)
     if y.nunique() < 2:
@@ -298,7 +265,7 @@ def train_random_forest_model_classification():
     model_path = os.path.join(models_dir, 'disease_rf_model.pkl')
     metadata_path = os.path.join(models_dir, 'disease_vectorizer.pkl')
 
-    joblib.dump(classifier, model_path)
+    ModelRegistry.save(classifier, 'disease_rf_model.pkl')
 
     icd_to_label = (
         df[['ICD10 CODE', 'DIAGNOSIS']]
@@ -322,7 +289,7 @@ def train_random_forest_model_classification():
         "default_age": float(df['AGE'].median()),
         "version": 2
     }
-    joblib.dump(metadata, metadata_path)
+    ModelRegistry.save(metadata, 'disease_vectorizer.pkl')
 
     return {
         "status": "Training completed",
@@ -345,8 +312,8 @@ def predict_disease_for_referral(referral_id):
         return "Error: Disease vectorizer not found. Please train the model first."
 
     try:
-        model = joblib.load(model_path)
-        metadata = joblib.load(metadata_path) or {}
+        model = ModelRegistry.get('disease_rf_model.pkl')
+        metadata = ModelRegistry.get('disease_vectorizer.pkl') or {}
     except Exception as e:
         return f"Error loading model/vectorizer: {e}"
 
@@ -355,13 +322,14 @@ def predict_disease_for_referral(referral_id):
     except Referral.DoesNotExist:
         return "Referral not found"
 
-    feature_df = build_disease_feature_frame([referral], metadata)
-    if feature_df.empty:
+    feature_matrix = build_disease_feature_matrix([referral], metadata)
+    if feature_matrix is None or feature_matrix.shape[0] == 0:
         return "Insufficient data for prediction"
 
     # Get prediction and confidence scores
-    prediction_code = model.predict(feature_df)[0]
-    prediction_proba = model.predict_proba(feature_df)[0]
+    predictions, probabilities = DiseaseFeatureLayout.predict(model, feature_matrix)
+    prediction_code = predictions[0]
+    prediction_proba = probabilities[0]
     max_confidence = max(prediction_proba)
     
     # Convert to string and strip whitespace - handle numpy types
@@ -496,8 +464,8 @@ def gradient_boosting_regression_train_model():
     model_path = os.path.join(models_dir, 'time_gb_model.pkl')
     vectorizer_path = os.path.join(models_dir, 'symptom_vectorizer.pkl')
 
-    joblib.dump(model, model_path)
-    joblib.dump(time_vectorizer, vectorizer_path)
+    ModelRegistry.save(model, 'time_gb_model.pkl')
+    ModelRegistry.save(time_vectorizer, 'symptom_vectorizer.pkl')
 
     return {"status": "Training completed (GradientBoostingRegressor)", **metrics, "model_path": model_path}
 
@@ -527,7 +495,7 @@ def gradient_boosting_regression_prediction_time(referral, model=None, vectorize
         if not os.path.exists(load_path):
             return "Error: Time prediction model not found. Please train the model first."
         try:
-            model = joblib.load(load_path)
+            model = ModelRegistry.get(os.path.basename(load_path))
         except Exception as e:
             return f"Error loading model: {e}"
 
@@ -536,7 +504,7 @@ def gradient_boosting_regression_prediction_time(referral, model=None, vectorize
         if not os.path.exists(vectorizer_path):
             return "Error: Symptom vectorizer not found. Please train the model first."
         try:
-            vectorizer = joblib.load(vectorizer_path)
+            vectorizer = ModelRegistry.get('symptom_vectorizer.pkl')
         except Exception as e:
             return f"Error loading vectorizer: {e}"
 
@@ -621,10 +589,10 @@ def train_time_prediction_model_advanced():
             
             # Prepare features
             data.append({
-                'symptoms': r.symptoms or '',
-                'diagnosis': r.final_diagnosis or r.initial_diagnosis or '',
-                'age': age or 30,
-                'sex': patient.sex if patient else 'M',
+                'COMPLAINTS': r.symptoms or '',
+                'DIAGNOSIS': r.final_diagnosis or r.initial_diagnosis or 'Unknown',
+                'AGE': age or 30,
+                'SEX': patient.sex if patient else 'M',
                 'time_to_cater': time_to_cater
             })
         except Exception as e:
@@ -635,70 +603,9 @@ def train_time_prediction_model_advanced():
     
     df = pd.DataFrame(data)
     
-    # Preprocess text
-    df['COMPLAINTS_PREPROCESSED'] = df['symptoms'].fillna('').apply(preprocess_text_advanced)
-    df['DIAGNOSIS_CLEAN'] = df['diagnosis'].fillna('Unknown').astype(str).str.strip()
-    
-    # Feature engineering
-    df['AGE'] = df['age'].fillna(df['age'].median())
-    df['SEX'] = df['sex'].fillna('M').map({'M': 0, 'F': 1, 'Male': 0, 'Female': 1, 'male': 0, 'female': 1}).fillna(0)
-    
-    # Text features
-    df['COMPLAINTS_LENGTH'] = df['COMPLAINTS_PREPROCESSED'].str.len()
-    df['COMPLAINTS_WORD_COUNT'] = df['COMPLAINTS_PREPROCESSED'].str.split().str.len()
-    df['COMPLAINTS_AVG_WORD_LENGTH'] = df['COMPLAINTS_LENGTH'] / (df['COMPLAINTS_WORD_COUNT'] + 1)
-    
-    # Medical keywords
-    for keyword in MEDICAL_KEYWORDS:
-        df[f'HAS_{keyword.upper()}_TIME'] = df['COMPLAINTS_PREPROCESSED'].str.contains(keyword, regex=False, na=False).astype(int)
-    
-    # Age features
-    df['AGE_GROUP'] = df['AGE'].apply(assign_age_group)
-    df['AGE_NORMALIZED'] = (df['AGE'] - df['AGE'].mean()) / (df['AGE'].std() + 1e-8)
-    
-    # Diagnosis features
-    df['DIAGNOSIS_LENGTH'] = df['DIAGNOSIS_CLEAN'].str.len()
-    df['DIAGNOSIS_WORD_COUNT'] = df['DIAGNOSIS_CLEAN'].str.split().str.len()
-    
-    # Encode diagnosis
-    diag_encoder = LabelEncoder()
-    df['DIAGNOSIS_ENCODED'] = diag_encoder.fit_transform(df['DIAGNOSIS_CLEAN'])
-    
-    # Fill NaN
-    numeric_cols = ['COMPLAINTS_LENGTH', 'COMPLAINTS_WORD_COUNT', 'COMPLAINTS_AVG_WORD_LENGTH',
-                    'AGE_NORMALIZED', 'DIAGNOSIS_LENGTH', 'DIAGNOSIS_WORD_COUNT']
-    for col in numeric_cols:
-        df[col] = df[col].fillna(0).astype(float)
-    
-    df['AGE_GROUP'] = df['AGE_GROUP'].fillna(2).astype(int)
-    
-    # Text vectorization
-    time_vectorizer = TfidfVectorizer(
-        max_features=1000,
-        ngram_range=(1, 2),
-        min_df=2,
-        max_df=0.90,
-        stop_words='english',
-        sublinear_tf=True
-    )
-    
-    X_time_text = time_vectorizer.fit_transform(df['COMPLAINTS_PREPROCESSED'])
-    
-    # Numeric features
-    time_numeric_features = ['AGE', 'SEX', 'COMPLAINTS_LENGTH', 'COMPLAINTS_WORD_COUNT',
-                            'COMPLAINTS_AVG_WORD_LENGTH', 'AGE_GROUP', 'AGE_NORMALIZED',
-                            'DIAGNOSIS_ENCODED', 'DIAGNOSIS_LENGTH', 'DIAGNOSIS_WORD_COUNT']
-    time_keyword_features = [f'HAS_{kw.upper()}_TIME' for kw in MEDICAL_KEYWORDS]
-    all_time_numeric = time_numeric_features + time_keyword_features
-    
-    X_time_numeric = df[all_time_numeric].values
-    
-    # Scale numeric features
-    time_scaler = StandardScaler()
-    X_time_numeric_scaled = time_scaler.fit_transform(X_time_numeric)
-    
-    # Combine features
-    X_time = scipy.sparse.hstack([X_time_numeric_scaled, X_time_text])
+    # Numeric/keyword/diagnosis features + TF-IDF, as one sparse matrix
+    time_pipeline = TimeToCaterFeaturePipeline()
+    X_time = time_pipeline.fit_transform(df)
     y_time = df['time_to_cater'].values
     
     # Train-test split
@@ -754,10 +661,7 @@ def train_time_prediction_model_advanced():
     models_dir = get_ml_models_path()
     os.makedirs(models_dir, exist_ok=True)
     
-    joblib.dump(best_model, os.path.join(models_dir, 'time_prediction_model_advanced.pkl'))
-    joblib.dump(time_vectorizer, os.path.join(models_dir, 'time_vectorizer_advanced.pkl'))
-    joblib.dump(time_scaler, os.path.join(models_dir, 'time_scaler_advanced.pkl'))
-    joblib.dump(diag_encoder, os.path.join(models_dir, 'diag_time_encoder_advanced.pkl'))
+    save_time_model(best_model, time_pipeline)
     
     return {
         "status": "Training completed",
@@ -777,30 +681,14 @@ def predict_time_to_cater_advanced(referral_id):
     Returns:
         float: Predicted time in hours, or error message string
     """
-    models_dir = get_ml_models_path()
-    model_path = os.path.join(models_dir, 'time_prediction_model_advanced.pkl')
-    vectorizer_path = os.path.join(models_dir, 'time_vectorizer_advanced.pkl')
-    scaler_path = os.path.join(models_dir, 'time_scaler_advanced.pkl')
-    encoder_path = os.path.join(models_dir, 'diag_time_encoder_advanced.pkl')
-    
-    # Check if model files exist
-    if not os.path.exists(model_path):
-        return "Error: Advanced time prediction model not found. Please train the model first."
-    if not os.path.exists(vectorizer_path):
-        return "Error: Time vectorizer not found. Please train the model first."
-    if not os.path.exists(scaler_path):
-        return "Error: Time scaler not found. Please train the model first."
-    if not os.path.exists(encoder_path):
-        return "Error: Diagnosis encoder not found. Please train the model first."
-    
     try:
-        # Load components
-        model = joblib.load(model_path)
-        vectorizer = joblib.load(vectorizer_path)
-        scaler = joblib.load(scaler_path)
-        diag_encoder = joblib.load(encoder_path)
+        # Load components (the model is saved inside the pipeline artifact)
+        pipeline = load_time_feature_pipeline()
+        model = load_time_model(pipeline)
     except Exception as e:
         return f"Error loading model components: {e}"
+    if model is None:
+        return "Error: Advanced time prediction model not found. Please train the model first."
     
     try:
         # Get referral
@@ -809,99 +697,8 @@ def predict_time_to_cater_advanced(referral_id):
         return "Referral not found"
     
     try:
-        # Get patient info
-        patient = referral.patient
-        age = patient.age if patient else 30
-        sex = patient.sex if patient else 'M'
-        
-        # Preprocess text
-        complaints_preprocessed = preprocess_text_advanced(referral.symptoms or '')
-        diagnosis_clean = str(referral.final_diagnosis or referral.initial_diagnosis or 'Unknown').strip()
-        
-        # Feature engineering
-        complaints_length = len(complaints_preprocessed)
-        complaints_word_count = len(complaints_preprocessed.split())
-        complaints_avg_word_length = complaints_length / (complaints_word_count + 1)
-        
-        # Medical keywords
-        keyword_features = []
-        for keyword in MEDICAL_KEYWORDS:
-            keyword_features.append(1 if keyword in complaints_preprocessed else 0)
-        
-        # Age features
-        age_group = assign_age_group(age)
-        # Age normalization - we need to estimate from training data
-        # For prediction, use a reasonable approximation (mean=30, std=15)
-        # Note: This should ideally be saved from training, but using approximation for now
-        age_normalized = (age - 30) / 15  # Adjusted std for better normalization
-        
-        # Diagnosis features
-        diagnosis_length = len(diagnosis_clean)
-        diagnosis_word_count = len(diagnosis_clean.split())
-        
-        # ICD10 features (must match training!)
-        # Check if referral has ICD10 code field
-        has_icd10 = 0
-        icd10_length = 0
-        if hasattr(referral, 'icd10_code') and referral.icd10_code:
-            has_icd10 = 1
-            icd10_length = len(str(referral.icd10_code))
-        elif hasattr(referral, 'icd10') and referral.icd10:
-            has_icd10 = 1
-            icd10_length = len(str(referral.icd10))
-        
-        # Encode diagnosis (handle unseen values)
-        try:
-            # Check if diagnosis exists in encoder classes
-            if diagnosis_clean in list(diag_encoder.classes_):
-                diagnosis_encoded = diag_encoder.transform([diagnosis_clean])[0]
-            else:
-                diagnosis_encoded = 0  # Default for unseen diagnosis
-        except:
-            diagnosis_encoded = 0
-        
-        # Sex encoding
-        sex_encoded = 0 if str(sex).upper() in ['M', 'MALE'] else 1
-        
-        # Build numeric features - MUST MATCH TRAINING ORDER!
-        numeric_features = [
-            age, sex_encoded, complaints_length, complaints_word_count,
-            complaints_avg_word_length, age_group, age_normalized,
-            diagnosis_encoded, diagnosis_length, diagnosis_word_count,
-            has_icd10, icd10_length  # ADD THESE TWO FEATURES!
-        ] + keyword_features
-        
-        # Scale numeric features
-        X_numeric_scaled = scaler.transform([numeric_features])
-        
-        # Vectorize text
-        X_text = vectorizer.transform([complaints_preprocessed])
-        
-        # Combine features
-        X_combined = scipy.sparse.hstack([X_numeric_scaled, X_text])
-        
-        # Predict
-        prediction = model.predict(X_combined)
-        predicted_time = float(prediction[0])
-        
-        # Regression models can predict negative values when:
-        # 1. Input features are very different from training data
-        # 2. Model extrapolates beyond training range
-        # 3. Feature scaling/normalization issues
-        # 
-        # We clamp to reasonable bounds to prevent invalid predictions
-        original_prediction = predicted_time
-        predicted_time = max(0.25, min(predicted_time, 4.0))
-        
-        # Log if prediction was clamped (for debugging)
-        if original_prediction != predicted_time:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.warning(
-                f"Time prediction clamped for referral {referral_id}: "
-                f"{original_prediction:.2f} -> {predicted_time:.2f} hours"
-            )
-        
+        # Same sparse features (and clamping) as BatchPredictor.predict_times_batch
+        predicted_time = float(pipeline.predict_hours(model, referrals_to_time_frame([referral]))[0])
         return round(predicted_time, 2)
         
     except Exception as e:
@@ -987,6 +784,9 @@ def disease_forecast(pv_df, months_ahead=12):
     return predictions
 
 
+ICD10_PATTERN = r'\b([A-Z]\d{2}(?:\.\d{1,2})?)\b'
+
+
 def extract_icd10_from_text(text):
     """
     Extract ICD10 code from diagnosis text if present.
@@ -997,8 +797,7 @@ def extract_icd10_from_text(text):
         return None
     
     # Pattern: Letter(s) + digits + optional dot + digits
-    pattern = r'\b([A-Z]\d{2}(?:\.\d{1,2})?)\b'
-    matches = re.findall(pattern, str(text).upper())
+    matches = re.findall(ICD10_PATTERN, str(text).upper())
     
     if matches:
         return matches[0]  # Return first match
@@ -1018,7 +817,8 @@ def get_top_diseases_from_dataframe(df, top_n=5):
         if df_filtered.empty:
             # If filtering Z00 leaves no data, use original df
             df_filtered = df.copy()
-        top_diseases = df_filtered['ICD10 CODE'].value_counts().head(top_n)
+        # astype(object): a categorical value_counts() would also list unseen codes
+        top_diseases = df_filtered['ICD10 CODE'].astype(object).value_counts().head(top_n)
         return top_diseases.index.tolist()
     else:
         # Fallback: use diagnosis categories
@@ -1067,6 +867,14 @@ def load_disease_peak_csv_data(csv_2023_path=None, csv_2024_path=None):
     if not os.path.exists(csv_2024_path):
         raise FileNotFoundError(f"CSV file not found: {csv_2024_path}")
     
+    # Cleaned, typed frame is cached on disk until either CSV changes
+    return cached_frame(
+        'disease_peak', [csv_2023_path, csv_2024_path],
+        lambda: _build_disease_peak_frame(csv_2023_path, csv_2024_path)
+    )
+
+
+def _build_disease_peak_frame(csv_2023_path, csv_2024_path):
     df_2023 = pd.read_csv(csv_2023_path, encoding='latin1')
     df_2024 = pd.read_csv(csv_2024_path, encoding='latin1')
     
@@ -1110,49 +918,99 @@ def load_disease_peak_csv_data(csv_2023_path=None, csv_2024_path=None):
     return df
 
 
-def queryset_to_disease_peak_dataframe(referrals):
+DISEASE_PEAK_LOADER_CHUNK_SIZE = 5000
+
+# Referral columns read by queryset_to_disease_peak_dataframe
+_DISEASE_PEAK_COLUMNS = [
+    'date_of_birth_text', 'patient__sex', 'chief_complaint', 'symptoms',
+    'final_diagnosis', 'initial_diagnosis', 'ICD_code', 'created_at_text',
+    'facility_id', 'facility__name', 'patient__facility_id', 'patient__facility__name',
+]
+# Dates are read as ISO text: the sqlite backend otherwise parses them with a
+# Python converter per row and value, which costs more than the rest of the load
+_DISEASE_PEAK_TEXT_COLUMNS = {
+    'date_of_birth_text': 'patient__date_of_birth',
+    'created_at_text': 'created_at',
+}
+
+
+def _first_filled(*columns):
+    """Row-wise first non-empty value of object columns (like ``a or b or ''``)"""
+    result = pd.Series('', index=columns[0].index, dtype=object)
+    for column in reversed(columns):
+        result = column.where(column.notna() & (column != ''), result)
+    return result
+
+
+def queryset_to_disease_peak_dataframe(referrals, chunk_size=DISEASE_PEAK_LOADER_CHUNK_SIZE):
     """
     Convert Django QuerySet to pandas DataFrame for disease peak analysis.
     Maps Django model fields to CSV column equivalents.
+
+    Reads only the needed columns in server-side cursor chunks (no model
+    instances or per-row ORM conversion); dates, age, diagnosis and ICD-10
+    extraction are computed per column, the extraction once per distinct
+    diagnosis. SEX, ICD10 CODE and SITIO/BARANGAY are categorical, so group
+    them with ``observed=True``.
     """
-    data = []
-    
-    for referral in referrals.select_related('patient', 'facility'):
-        patient = referral.patient
-        if not patient:
-            continue
-            
-        diagnosis = referral.final_diagnosis or referral.initial_diagnosis or ''
-        
-        # Get ICD10 code
-        if hasattr(referral, 'ICD_code') and referral.ICD_code:
-            icd10_code = str(referral.ICD_code).strip()
-        elif hasattr(referral, 'icd10_code') and referral.icd10_code:
-            icd10_code = str(referral.icd10_code).strip()
-        else:
-            icd10_code = extract_icd10_from_text(diagnosis)
-        
-        diagnosis_label = icd10_code if icd10_code else str(diagnosis)[:50].strip() or 'Unknown'
-        
-        # Get barangay/facility name
-        barangay = 'Unknown'
-        if referral.facility:
-            barangay = referral.facility.name
-        elif hasattr(patient, 'facility') and patient.facility:
-            barangay = patient.facility.name
-        
-        data.append({
-            'AGE': patient.age,
-            'SEX': patient.sex,
-            'COMPLAINTS': referral.chief_complaint or referral.symptoms or '',
-            'DIAGNOSIS': diagnosis,
-            'ICD10 CODE': icd10_code if icd10_code else diagnosis_label,
-            'CREATED_AT': referral.created_at,
-            'SITIO/BARANGAY': barangay,
-            'DATE': referral.created_at,
-        })
-    
-    return pd.DataFrame(data)
+    # Raw rows straight from the cursor: the dates are parsed per column below
+    # instead of by the ORM's per-row converters
+    query = referrals.filter(patient__isnull=False).annotate(**{
+        alias: Cast(field, TextField()) for alias, field in _DISEASE_PEAK_TEXT_COLUMNS.items()
+    }).values_list(*_DISEASE_PEAK_COLUMNS)
+    try:
+        sql, params = query.query.get_compiler(using=query.db).as_sql()
+    except EmptyResultSet:
+        return pd.DataFrame()
+    chunks = []
+    with connections[query.db].chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunks.append(pd.DataFrame.from_records(rows, columns=_DISEASE_PEAK_COLUMNS))
+    if not chunks:
+        return pd.DataFrame()
+    raw = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    created_at = pd.to_datetime(raw['created_at_text'], utc=True, format='ISO8601')
+
+    # Patient.age as of today
+    today = date.today()
+    dob = pd.to_datetime(raw['date_of_birth_text'], errors='coerce', format='ISO8601')
+    before_birthday = (dob.dt.month > today.month) | ((dob.dt.month == today.month) & (dob.dt.day > today.day))
+    age = today.year - dob.dt.year - before_birthday.astype(int)
+
+    # ICD10 CODE: the stored ICD_code, else one extracted from the diagnosis, else
+    # the diagnosis' first 50 characters; worked out once per distinct diagnosis
+    diagnosis = _first_filled(raw['final_diagnosis'], raw['initial_diagnosis'])
+    distinct = pd.Categorical(diagnosis)
+    labels = pd.Series(distinct.categories, dtype=object)
+    fallback = labels.str[:50].str.strip().replace('', 'Unknown')
+    extracted = labels.str.upper().str.extract(ICD10_PATTERN, expand=False)
+    fallback_codes = fallback.to_numpy()[distinct.codes]
+    derived_codes = extracted.where(extracted.notna(), fallback).to_numpy()[distinct.codes]
+
+    stored = raw['ICD_code']
+    has_stored = (stored.notna() & (stored != '')).to_numpy()
+    stored = stored.where(has_stored, '').astype(str).str.strip().to_numpy()
+    icd10 = np.where(has_stored, np.where(stored != '', stored, fallback_codes), derived_codes)
+
+    barangay = raw['facility__name'].where(
+        raw['facility_id'].notna(),
+        raw['patient__facility__name'].where(raw['patient__facility_id'].notna(), 'Unknown'),
+    )
+
+    return pd.DataFrame({
+        'AGE': age,
+        'SEX': raw['patient__sex'].astype('category'),
+        'COMPLAINTS': _first_filled(raw['chief_complaint'], raw['symptoms']),
+        'DIAGNOSIS': diagnosis,
+        'ICD10 CODE': pd.Categorical(icd10),
+        'CREATED_AT': created_at,
+        'SITIO/BARANGAY': barangay.astype('category'),
+        'DATE': created_at,
+    })
 
 
 def train_disease_peak_prediction_model(csv_2023_path=None, csv_2024_path=None, use_db=False, top_n=5):
@@ -1320,10 +1178,10 @@ def train_disease_peak_prediction_model(csv_2023_path=None, csv_2024_path=None,
     models_dir = get_ml_models_path()
     os.makedirs(models_dir, exist_ok=True)
     
-    joblib.dump(best_model, os.path.join(models_dir, 'disease_peak_model.pkl'))
-    joblib.dump(tfidf, os.path.join(models_dir, 'disease_peak_tfidf.pkl'))
-    joblib.dump(scaler, os.path.join(models_dir, 'disease_peak_scaler.pkl'))
-    joblib.dump(target_encoder, os.path.join(models_dir, 'disease_peak_encoder.pkl'))
+    ModelRegistry.save(best_model, 'disease_peak_model.pkl')
+    ModelRegistry.save(tfidf, 'disease_peak_tfidf.pkl')
+    ModelRegistry.save(scaler, 'disease_peak_scaler.pkl')
+    ModelRegistry.save(target_encoder, 'disease_peak_encoder.pkl')
     
     # Save metadata
     metadata = {
@@ -1334,7 +1192,7 @@ def train_disease_peak_prediction_model(csv_2023_path=None, csv_2024_path=None,
         'best_model_name': best_model_name,
         'results': results
     }
-    joblib.dump(metadata, os.path.join(models_dir, 'disease_peak_metadata.pkl'))
+    ModelRegistry.save(metadata, 'disease_peak_metadata.pkl')
     
     return {
         "status": "Training completed",
@@ -1426,18 +1284,18 @@ def train_disease_forecast_best_model(csv_2023_path=None, csv_2024_path=None, us
         return {"error": "No valid dates found"}
     
     # Step 4: Aggregate daily cases per disease
-    df_grouped = df.groupby(['DATE', 'ICD10 CODE']).size().reset_index(name='cases')
+    df_grouped = df.groupby(['DATE', 'ICD10 CODE'], observed=True).size().reset_index(name='cases')
     df_grouped = df_grouped.sort_values(['ICD10 CODE', 'DATE'])
     
     if df_grouped.empty:
         return {"error": "No grouped data available"}
     
     # Step 5: Create lag features and rolling averages
-    df_grouped['Cases_lag1'] = df_grouped.groupby('ICD10 CODE')['cases'].shift(1)
-    df_grouped['Cases_lag7'] = df_grouped.groupby('ICD10 CODE')['cases'].shift(7)
-    df_grouped['Cases_lag30'] = df_grouped.groupby('ICD10 CODE')['cases'].shift(30)
-    df_grouped['Cases_MA7'] = df_grouped.groupby('ICD10 CODE')['cases'].transform(lambda x: x.rolling(7).mean())
-    df_grouped['Cases_MA30'] = df_grouped.groupby('ICD10 CODE')['cases'].transform(lambda x: x.rolling(30).mean())
+    df_grouped['Cases_lag1'] = df_grouped.groupby('ICD10 CODE', observed=True)['cases'].shift(1)
+    df_grouped['Cases_lag7'] = df_grouped.groupby('ICD10 CODE', observed=True)['cases'].shift(7)
+    df_grouped['Cases_lag30'] = df_grouped.groupby('ICD10 CODE', observed=True)['cases'].shift(30)
+    df_grouped['Cases_MA7'] = df_grouped.groupby('ICD10 CODE', observed=True)['cases'].transform(lambda x: x.rolling(7).mean())
+    df_grouped['Cases_MA30'] = df_grouped.groupby('ICD10 CODE', observed=True)['cases'].transform(lambda x: x.rolling(30).mean())
     df_grouped = df_grouped.dropna()
     
     if df_grouped.empty:
@@ -1515,9 +1373,9 @@ def train_disease_forecast_best_model(csv_2023_path=None, csv_2024_path=None, us
     encoder_path = os.path.join(models_dir, 'disease_forecast_best_encoder.pkl')
     metadata_path = os.path.join(models_dir, 'disease_forecast_best_metadata.pkl')
     
-    joblib.dump(best_model, model_path)
-    joblib.dump(scaler, scaler_path)
-    joblib.dump(le, encoder_path)
+    ModelRegistry.save(best_model, 'disease_forecast_best_model.pkl')
+    ModelRegistry.save(scaler, 'disease_forecast_best_scaler.pkl')
+    ModelRegistry.save(le, 'disease_forecast_best_encoder.pkl')
     
     # Save history for iterative forecasting
     metadata = {
@@ -1527,7 +1385,7 @@ def train_disease_forecast_best_model(csv_2023_path=None, csv_2024_path=None, us
         'results': train_results,
         'history_df': df_grouped[['DATE', 'ICD10 CODE', 'cases', 'ICD10_CODE_ENC']].copy()
     }
-    joblib.dump(metadata, metadata_path)
+    ModelRegistry.save(metadata, 'disease_forecast_best_metadata.pkl')
     
     return {
         "status": "Training completed",
@@ -1540,16 +1398,81 @@ def train_disease_forecast_best_model(csv_2023_path=None, csv_2024_path=None, us
     }
 
 
+FORECAST_WINDOW = 30
+
+
+def forecast_daily_cases(model, history_df, disease_codes, n_days, features, scaler=None):
+    """
+    Recursively forecast daily case counts for several diseases at once.
+
+    Keeps a sliding window of the last FORECAST_WINDOW case counts per disease
+    (one NumPy row each) and derives lag1/lag7/lag30/MA7/MA30 from it, so every
+    forecast day costs a single batched ``predict`` call over all diseases
+    instead of one call per (disease, day) with a full history re-filter.
+
+    Args:
+        model: Fitted regressor trained on ``features``
+        history_df: DataFrame with 'DATE', 'ICD10_CODE_ENC' and 'cases' columns
+        disease_codes: Encoded ICD10 codes to forecast (one row each in the output)
+        n_days: Number of consecutive days to forecast
+        features: Feature column order used during training
+        scaler: Optional fitted scaler applied before predicting (Linear SVR)
+
+    Returns:
+        np.ndarray: Raw predictions of shape (len(disease_codes), n_days)
+    """
+    disease_codes = np.asarray(disease_codes)
+    n_diseases = len(disease_codes)
+
+    window = np.zeros((n_diseases, FORECAST_WINDOW))
+    lengths = np.zeros(n_diseases, dtype=np.int64)
+    ordered = history_df.sort_values('DATE')
+    for i, code in enumerate(disease_codes):
+        cases = ordered.loc[ordered['ICD10_CODE_ENC'] == code, 'cases'].to_numpy(dtype=float)
+        tail = cases[-FORECAST_WINDOW:]
+        if len(tail):
+            window[i, -len(tail):] = tail
+        lengths[i] = len(cases)
+
+    X = np.zeros((n_diseases, len(features)))
+    X[:, 0] = disease_codes
+    predictions = np.empty((n_diseases, n_days))
+
+    for day in range(n_days):
+        # Fewer than 7/30 observations: lags fall back to 0 and averages to lag1
+        lag1 = np.where(lengths >= 1, window[:, -1], 0.0)
+        has_week = lengths >= 7
+        has_month = lengths >= 30
+        X[:, 1] = lag1
+        X[:, 2] = np.where(has_week, window[:, -7], 0.0)
+        X[:, 3] = np.where(has_month, window[:, -30], 0.0)
+        X[:, 4] = np.where(has_week, window[:, -7:].mean(axis=1), lag1)
+        X[:, 5] = np.where(has_month, window[:, -30:].mean(axis=1), lag1)
+
+        x_pred = pd.DataFrame(X, columns=features)
+        if scaler is not None:
+            x_pred = scaler.transform(x_pred)
+        day_pred = model.predict(x_pred)
+        predictions[:, day] = day_pred
+
+        # Slide the window: raw (unclipped) predictions feed the next day's lags
+        window[:, :-1] = window[:, 1:]
+        window[:, -1] = day_pred
+        lengths += 1
+
+    return predictions
+
+
 def predict_disease_forecast_2025_monthly():
     """
     Predict monthly disease cases for 2025 using trained time-series model (best model selected).
     Returns monthly aggregated forecasts.
-    OPTIMIZED: Results are cached for 24 hours since predictions don't change unless model is retrained.
+    OPTIMIZED: Results are cached per model version, so a retrain switches to fresh predictions.
     """
     from django.core.cache import cache
     
     # Check cache first - predictions don't change unless model is retrained
-    cache_key = 'disease_forecast_2025_monthly_results_v1'
+    cache_key = forecast_cache_key('disease_forecast_2025_monthly')
     cached_result = cache.get(cache_key)
     if cached_result is not None:
         return cached_result
@@ -1564,73 +1487,36 @@ def predict_disease_forecast_2025_monthly():
         return {"error": "Disease forecast model not found. Please train the model first using train_disease_forecast_best_model()"}
     
     try:
-        model = joblib.load(model_path)
-        scaler = joblib.load(scaler_path)
-        le = joblib.load(encoder_path)
-        metadata = joblib.load(metadata_path)
+        model = ModelRegistry.get('disease_forecast_best_model.pkl')
+        scaler = ModelRegistry.get('disease_forecast_best_scaler.pkl')
+        le = ModelRegistry.get('disease_forecast_best_encoder.pkl')
+        metadata = ModelRegistry.get('disease_forecast_best_metadata.pkl')
     except Exception as e:
         return {"error": f"Error loading model: {e}"}
     
     features = metadata['features']
-    history_df = metadata['history_df'].copy()
+    history_df = metadata['history_df']
     
     # Forecasting daily cases for 2025
     diseases = history_df['ICD10 CODE'].unique()
     future_dates = pd.date_range(start='2025-01-01', end='2025-12-31')
-    future_df = pd.DataFrame(
-        [(d, date) for d in diseases for date in future_dates],
-        columns=['ICD10 CODE', 'DATE']
+    disease_codes = le.transform(diseases)
+    
+    # Recursive day-by-day forecast, all diseases predicted together per day
+    daily_predictions = forecast_daily_cases(
+        model,
+        history_df,
+        disease_codes,
+        len(future_dates),
+        features,
+        scaler=scaler if metadata['best_model_name'] == "Linear SVR" else None
     )
-    future_df['ICD10_CODE_ENC'] = le.transform(future_df['ICD10 CODE'])
-    
-    # OPTIMIZED: Use list append instead of DataFrame concat in loop
-    predictions = []
-    history = history_df.copy()
-    new_rows_list = []  # Collect new rows in list (much faster)
-    
-    # Iteratively forecast day-by-day
-    for idx, row in future_df.iterrows():
-        disease = row['ICD10_CODE_ENC']
-        date = row['DATE']
-        disease_history = history[history['ICD10_CODE_ENC'] == disease].sort_values('DATE')
-        
-        lag1 = disease_history['cases'].iloc[-1] if len(disease_history) >= 1 else 0
-        lag7 = disease_history['cases'].iloc[-7] if len(disease_history) >= 7 else 0
-        lag30 = disease_history['cases'].iloc[-30] if len(disease_history) >= 30 else 0
-        ma7 = disease_history['cases'].iloc[-7:].mean() if len(disease_history) >= 7 else lag1
-        ma30 = disease_history['cases'].iloc[-30:].mean() if len(disease_history) >= 30 else lag1
-        
-        x_pred = pd.DataFrame([[disease, lag1, lag7, lag30, ma7, ma30]], columns=features)
-        
-        # Use appropriate scaling based on best model
-        if metadata['best_model_name'] == "Linear SVR":
-            x_pred_scaled = scaler.transform(x_pred)
-            pred = model.predict(x_pred_scaled)[0]
-        else:
-            pred = model.predict(x_pred)[0]
-        
-        predictions.append(max(0, pred))  # Ensure non-negative
-        
-        # OPTIMIZED: Append to list instead of concatenating DataFrame
-        new_rows_list.append({
-            'DATE': date,
-            'ICD10_CODE_ENC': disease,
-            'cases': pred,
-            'ICD10 CODE': row['ICD10 CODE']
-        })
-        
-        # OPTIMIZED: Concatenate in batches (every 100 rows) instead of every row
-        if len(new_rows_list) >= 100:
-            new_df = pd.DataFrame(new_rows_list)
-            history = pd.concat([history, new_df], ignore_index=True)
-            new_rows_list = []  # Clear list
     
-    # Final concatenation for remaining rows
-    if new_rows_list:
-        new_df = pd.DataFrame(new_rows_list)
-        history = pd.concat([history, new_df], ignore_index=True)
-    
-    future_df['predicted_cases'] = predictions
+    future_df = pd.DataFrame({
+        'ICD10 CODE': np.repeat(diseases, len(future_dates)),
+        'DATE': np.tile(future_dates, len(diseases)),
+    })
+    future_df['predicted_cases'] = np.maximum(daily_predictions, 0).ravel()  # Ensure non-negative
     
     # Aggregate monthly forecasts
     monthly_forecast = (
@@ -1651,8 +1537,8 @@ def predict_disease_forecast_2025_monthly():
             results[disease] = {}
         results[disease][month] = cases
     
-    # Cache results for 24 hours (predictions don't change unless model is retrained)
-    cache.set(cache_key, results, 86400)  # 24 hours
+    # Cache results until the model is retrained (the key carries the model version)
+    cache.set(cache_key, results, FORECAST_CACHE_TIMEOUT)
     
     return results
 
@@ -1753,7 +1639,8 @@ def predict_disease_peak_for_month(month_name=None, samples_per_month=100, use_d
     return results
 
 
-def train_barangay_disease_peak_model(csv_2023_path=None, csv_2024_path=None, use_db=False, allowed_icd=None):
+def train_barangay_disease_peak_model(csv_2023_path=None, csv_2024_path=None, use_db=False, allowed_icd=None,
+                                      n_workers=None):
     """
     Train barangay-based disease peak prediction model (similar to Google Colab code).
     Trains a RandomForestRegressor per disease per barangay using YEAR and MONTH features.
@@ -1763,9 +1650,12 @@ def train_barangay_disease_peak_model(csv_2023_path=None, csv_2024_path=None, us
         csv_2024_path: Path to 2024 CSV file (if None, uses default)
         use_db: If True, load from Django database instead of CSV
         allowed_icd: List of allowed ICD10 codes (if None, uses default)
+        n_workers: Worker processes for fitting the per-group models (if None,
+            settings.ML_TRAINING_WORKERS or all cores)
     
     Returns:
-        dict: Training status and saved model paths
+        dict: Training status, saved model paths and training_stats (including
+            per-group fit timings)
     """
     # Default allowed ICD codes
     if allowed_icd is None:
@@ -1820,7 +1710,7 @@ def train_barangay_disease_peak_model(csv_2023_path=None, csv_2024_path=None, us
     
     # Step 3: Aggregate disease counts by Barangay, Disease, Year, and Month
     barangay_trends = (
-        df.groupby(['SITIO/BARANGAY', 'ICD10 CODE', 'YEAR', 'MONTH'])
+        df.groupby(['SITIO/BARANGAY', 'ICD10 CODE', 'YEAR', 'MONTH'], observed=True)
           .size()
           .reset_index(name='CASE_COUNT')
     )
@@ -1828,56 +1718,60 @@ def train_barangay_disease_peak_model(csv_2023_path=None, csv_2024_path=None, us
     if barangay_trends.empty:
         return {"error": "No aggregated data available"}
     
-    # Step 4: Train regression model per disease per barangay
+    # Step 4: Train regression model per disease per barangay; the frame is
+    # partitioned once and the groups are fitted concurrently
+    barangays = list(barangay_trends['SITIO/BARANGAY'].unique())
+    diseases = list(barangay_trends['ICD10 CODE'].unique())
+
+    started = time.perf_counter()
+    fitted_models, timings, workers = fit_group_models(
+        barangay_trends, ['SITIO/BARANGAY', 'ICD10 CODE'], ['YEAR', 'MONTH'], 'CASE_COUNT',
+        n_workers=n_workers,
+    )
+    elapsed = time.perf_counter() - started
+
     models_dict = {}
+    for barangay in barangays:
+        models_dict[barangay] = {}
+        for disease in diseases:
+            if (barangay, disease) in fitted_models:
+                models_dict[barangay][disease] = fitted_models[(barangay, disease)]
+
+    group_seconds = [timing['seconds'] for timing in timings]
     training_stats = {
-        'total_barangays': 0,
-        'total_diseases': 0,
-        'models_trained': 0,
-        'skipped_insufficient_data': 0
+        'total_barangays': len(barangays),
+        'total_diseases': len(barangays) * len(diseases),
+        'models_trained': len(fitted_models),
+        'skipped_insufficient_data': len(barangays) * len(diseases) - len(fitted_models),
+        'workers': workers,
+        'training_seconds': round(elapsed, 3),
+        'fit_seconds_total': round(sum(group_seconds), 3),
+        'fit_seconds_max': round(max(group_seconds, default=0.0), 3),
+        'group_timings': [
+            {'barangay': timing['group'][0], 'disease': timing['group'][1],
+             'rows': timing['rows'], 'seconds': round(timing['seconds'], 4)}
+            for timing in timings
+        ],
     }
     
-    for barangay in barangay_trends['SITIO/BARANGAY'].unique():
-        training_stats['total_barangays'] += 1
-        models_dict[barangay] = {}
-        
-        for disease in barangay_trends['ICD10 CODE'].unique():
-            training_stats['total_diseases'] += 1
-            
-            subset = barangay_trends[
-                (barangay_trends['SITIO/BARANGAY'] == barangay) &
-                (barangay_trends['ICD10 CODE'] == disease)
-            ]
-            
-            if len(subset) < 3:
-                training_stats['skipped_insufficient_data'] += 1
-                continue  # Skip if not enough data points
-            
-            X = subset[['YEAR', 'MONTH']]
-            y = subset['CASE_COUNT']
-            
-            model = RandomForestRegressor(n_estimators=100, random_state=42)
-            model.fit(X, y)
-            
-            models_dict[barangay][disease] = model
-            training_stats['models_trained'] += 1
-    
-    # Save models
+    # Save models, plus the forecast table prediction reads instead of the forests
     models_dir = get_ml_models_path()
     os.makedirs(models_dir, exist_ok=True)
     
-    model_path = os.path.join(models_dir, 'barangay_disease_peak_models.pkl')
-    metadata_path = os.path.join(models_dir, 'barangay_disease_peak_metadata.pkl')
+    model_path = os.path.join(models_dir, BARANGAY_PEAK_MODELS_ARTIFACT)
+    metadata_path = os.path.join(models_dir, BARANGAY_PEAK_METADATA_ARTIFACT)
     
-    joblib.dump(models_dict, model_path)
+    ModelRegistry.save(models_dict, BARANGAY_PEAK_MODELS_ARTIFACT)
+    ModelRegistry.save(build_forecast_table(models_dict, barangays, diseases), BARANGAY_FORECAST_ARTIFACT)
     
     metadata = {
         'allowed_icd': allowed_icd,
-        'barangays': list(barangay_trends['SITIO/BARANGAY'].unique()),
-        'diseases': list(barangay_trends['ICD10 CODE'].unique()),
+        'barangays': barangays,
+        'diseases': diseases,
+        'forecast_year': FORECAST_YEAR,
         'training_stats': training_stats
     }
-    joblib.dump(metadata, metadata_path)
+    ModelRegistry.save(metadata, BARANGAY_PEAK_METADATA_ARTIFACT)
     
     return {
         "status": "Training completed",
@@ -1887,6 +1781,40 @@ def train_barangay_disease_peak_model(csv_2023_path=None, csv_2024_path=None, us
     }
 
 
+# Forecast tables computed from forests trained before the .npy artifact existed
+_legacy_forecast_tables = {}
+
+
+def load_barangay_forecast_table():
+    """
+    (table, barangays, diseases) for the barangay disease peak forecast.
+
+    The table is the memory-mapped .npy written at training time. Models trained
+    before it existed get the table computed once from the forests instead.
+    """
+    metadata = ModelRegistry.get(BARANGAY_PEAK_METADATA_ARTIFACT)
+    barangays = list(metadata.get('barangays', []))
+    diseases = list(metadata.get('diseases', []))
+
+    if ModelRegistry.exists(BARANGAY_FORECAST_ARTIFACT):
+        table = ModelRegistry.get(BARANGAY_FORECAST_ARTIFACT)
+        if table.shape == (len(barangays), len(diseases), 12):
+            return table, barangays, diseases
+
+    # Thousands of tiny tree arrays: memory-mapping each one costs more than it saves
+    models_dict = ModelRegistry.get(BARANGAY_PEAK_MODELS_ARTIFACT, mmap_mode=None)
+    version = ModelRegistry.get_version([BARANGAY_PEAK_MODELS_ARTIFACT, BARANGAY_PEAK_METADATA_ARTIFACT])
+    cached = _legacy_forecast_tables.get(version)
+    if cached is None:
+        barangays = list(models_dict.keys())
+        for disease_models in models_dict.values():
+            diseases += [disease for disease in disease_models if disease not in diseases]
+        cached = (build_forecast_table(models_dict, barangays, diseases), barangays, diseases)
+        _legacy_forecast_tables.clear()
+        _legacy_forecast_tables[version] = cached
+    return cached
+
+
 def predict_barangay_disease_peak_2025(target_barangays=None, csv_2023_path=None, csv_2024_path=None, use_db=False):
     """
     Predict monthly disease peaks for each barangay in 2025 (similar to Google Colab code).
@@ -1900,22 +1828,31 @@ def predict_barangay_disease_peak_2025(target_barangays=None, csv_2023_path=None
     Returns:
         dict: Predictions with structure {barangay: {month: {disease: count, ...}}}
     """
-    # Load saved models
+    from django.core.cache import cache
+    
+    # Check cache first - keyed by the model version, so a retrain is picked up at once
+    cache_key = forecast_cache_key(
+        'barangay_disease_peak_2025', ','.join(sorted(target_barangays)) if target_barangays else 'all'
+    )
+    cached_result = cache.get(cache_key)
+    if cached_result is not None:
+        return cached_result
+    
+    # Load saved forecast
     models_dir = get_ml_models_path()
-    model_path = os.path.join(models_dir, 'barangay_disease_peak_models.pkl')
-    metadata_path = os.path.join(models_dir, 'barangay_disease_peak_metadata.pkl')
+    model_path = os.path.join(models_dir, BARANGAY_PEAK_MODELS_ARTIFACT)
+    metadata_path = os.path.join(models_dir, BARANGAY_PEAK_METADATA_ARTIFACT)
     
     if not os.path.exists(model_path) or not os.path.exists(metadata_path):
         return {"error": "Barangay disease peak models not found. Please train the model first using train_barangay_disease_peak_model()"}
     
     try:
-        models_dict = joblib.load(model_path)
-        metadata = joblib.load(metadata_path)
+        table, table_barangays, table_diseases = load_barangay_forecast_table()
     except Exception as e:
         return {"error": f"Error loading models: {e}"}
     
     # Get all barangays from models (poblacion already excluded during training)
-    all_barangays = list(models_dict.keys())
+    all_barangays = list(table_barangays)
     
     # Filter target barangays if specified
     if target_barangays:
@@ -1926,78 +1863,51 @@ def predict_barangay_disease_peak_2025(target_barangays=None, csv_2023_path=None
             return {"error": f"No matching barangays found. Available: {all_barangays}"}
         all_barangays = filtered_barangays
     
-    # Step 5: Generate predictions for 2025
-    predictions = []
+    # Step 5: Slice the 2025 predictions off the forecast table
+    barangay_index = {barangay: i for i, barangay in enumerate(table_barangays)}
+    forecast = table[[barangay_index[barangay] for barangay in all_barangays]]
     
-    for barangay in all_barangays:
-        if barangay not in models_dict:
-            continue
-        
-        for disease in models_dict[barangay].keys():
-            model = models_dict[barangay][disease]
-            
-            # Predict for 2025 months (1-12)
-            future_months = pd.DataFrame({'YEAR': [2025]*12, 'MONTH': range(1, 13)})
-            y_pred = model.predict(future_months)
-            
-            for m, p in zip(range(1, 13), y_pred):
-                predictions.append({
-                    'Barangay': barangay,
-                    'Disease': disease,
-                    'Year': 2025,
-                    'Month': m,
-                    'Predicted_Cases': max(0, int(round(p)))
-                })
-    
-    if not predictions:
+    if np.isnan(forecast[:, :, 0]).all():
         return {"error": "No predictions generated"}
     
-    # Convert predictions to DataFrame
-    pred_df = pd.DataFrame(predictions)
-    
-    # Find the top disease per barangay each month
-    peak_disease = (
-        pred_df.sort_values(['Barangay', 'Month', 'Predicted_Cases'], ascending=[True, True, False])
-        .groupby(['Barangay', 'Month'])
-        .first()
-        .reset_index()
-    )
-    
-    # Organize results by barangay and month
+    results = summarize_barangay_peaks(all_barangays, table_diseases, forecast)
+    cache.set(cache_key, results, FORECAST_CACHE_TIMEOUT)
+    return results
+
+
+def summarize_barangay_peaks(barangays, diseases, forecast):
+    """
+    {barangay: {month: {'peak_disease', 'peak_cases', 'all_diseases'}}} from a
+    (barangay, disease, month) forecast array (NaN where a pair has no model).
+
+    Cases are rounded and floored at 0; the peak is the disease with the most
+    cases, ties going to the earlier disease, all computed with one argmax.
+    """
+    forecast = np.asarray(forecast, dtype=float)
+    present = ~np.isnan(forecast[:, :, 0])
+    # np.rint rounds half to even, like round()
+    cases = np.maximum(np.rint(np.nan_to_num(forecast)), 0).astype(np.int64)
+    ranked = np.where(present[:, :, None], cases, -1)
+    peak_index = ranked.argmax(axis=1)
+    peak_cases = np.take_along_axis(ranked, peak_index[:, None, :], axis=1)[:, 0, :]
+    disease_names = [str(disease) for disease in diseases]
+
     results = {}
-    for barangay in all_barangays:
+    for i, barangay in enumerate(barangays):
+        modelled = np.flatnonzero(present[i])
+        names = [disease_names[j] for j in modelled]
+        # Plain Python ints for JSON serialization
+        monthly_cases = cases[i, modelled].T.tolist()
+        peaks = peak_index[i].tolist()
+        peak_values = peak_cases[i].tolist()
+
         results[barangay] = {}
-        
-        # Get all predictions for this barangay
-        barangay_preds = pred_df[pred_df['Barangay'] == barangay]
-        
         for month in range(1, 13):
-            month_data = barangay_preds[barangay_preds['Month'] == month]
-            
-            # Get peak disease
-            peak = peak_disease[
-                (peak_disease['Barangay'] == barangay) & 
-                (peak_disease['Month'] == month)
-            ]
-            
-            # Get all diseases for this month
-            all_diseases = {}
-            for _, row in month_data.iterrows():
-                # Convert to Python native types for JSON serialization
-                all_diseases[str(row['Disease'])] = int(row['Predicted_Cases'])
-            
-            if not peak.empty:
-                results[barangay][month] = {
-                    'peak_disease': str(peak.iloc[0]['Disease']),
-                    'peak_cases': int(peak.iloc[0]['Predicted_Cases']),
-                    'all_diseases': all_diseases
-                }
-            else:
-                results[barangay][month] = {
-                    'peak_disease': None,
-                    'peak_cases': 0,
-                    'all_diseases': all_diseases
-                }
+            results[barangay][month] = {
+                'peak_disease': disease_names[peaks[month - 1]] if names else None,
+                'peak_cases': peak_values[month - 1] if names else 0,
+                'all_diseases': dict(zip(names, monthly_cases[month - 1]))
+            }
     
     return results
 
@@ -2043,7 +1953,7 @@ def train_time_prediction_model_advanced_from_csv(csv_path=None):
     if not os.path.exists(csv_path):
         return {"error": f"CSV file not found: {csv_path}"}
     
-    df_time = pd.read_csv(csv_path, encoding='latin1')
+    df_time = read_csv_cached(csv_path, encoding='latin1')
     
     # Clean data (same as time_cater.py)
     df_time = df_time[df_time['COMPLAINTS'].notna()].copy()
@@ -2051,91 +1961,20 @@ def train_time_prediction_model_advanced_from_csv(csv_path=None):
     df_time = df_time[(df_time['AGE'] >= 0) & (df_time['AGE'] <= 120)].copy()
     
     
-    # Preprocess text
-    df_time['COMPLAINTS_PREPROCESSED'] = df_time['COMPLAINTS'].fillna('').apply(preprocess_text_advanced)
-    df_time['DIAGNOSIS_CLEAN'] = df_time['DIAGNOSIS'].fillna('Unknown').astype(str).str.strip()
-    
-    # Feature engineering (same as time_cater.py)
+    # Proxy time target (same as time_cater.py)
     df_time['AGE'] = df_time['AGE'].fillna(df_time['AGE'].median())
-    # Convert SEX to numeric (M=0, F=1)
-    df_time['SEX'] = df_time['SEX'].fillna('M').map({'M': 0, 'F': 1, 'Male': 0, 'Female': 1, 'male': 0, 'female': 1}).fillna(0)
-    
-    # Text features
-    df_time['COMPLAINTS_LENGTH'] = df_time['COMPLAINTS_PREPROCESSED'].str.len()
-    df_time['COMPLAINTS_WORD_COUNT'] = df_time['COMPLAINTS_PREPROCESSED'].str.split().str.len()
-    df_time['COMPLAINTS_AVG_WORD_LENGTH'] = df_time['COMPLAINTS_LENGTH'] / (df_time['COMPLAINTS_WORD_COUNT'] + 1)
-    
-    # Medical keywords
-    for keyword in MEDICAL_KEYWORDS:
-        df_time[f'HAS_{keyword.upper()}_TIME'] = df_time['COMPLAINTS_PREPROCESSED'].str.contains(keyword, regex=False, na=False).astype(int)
-    
-    # Age features
-    df_time['AGE_GROUP'] = df_time['AGE'].apply(assign_age_group)
-    df_time['AGE_NORMALIZED'] = (df_time['AGE'] - df_time['AGE'].mean()) / (df_time['AGE'].std() + 1e-8)
-    
-    # Diagnosis features
-    df_time['DIAGNOSIS_LENGTH'] = df_time['DIAGNOSIS_CLEAN'].str.len()
-    df_time['DIAGNOSIS_WORD_COUNT'] = df_time['DIAGNOSIS_CLEAN'].str.split().str.len()
-    
-    # Encode diagnosis
-    diag_time_encoder = LabelEncoder()
-    df_time['DIAGNOSIS_ENCODED'] = diag_time_encoder.fit_transform(df_time['DIAGNOSIS_CLEAN'])
-    
-    # ICD10 (if available)
-    if 'ICD10 CODE' in df_time.columns:
-        df_time['HAS_ICD10'] = df_time['ICD10 CODE'].notna().astype(int)
-        df_time['ICD10_LENGTH'] = df_time['ICD10 CODE'].astype(str).str.len()
-    else:
-        df_time['HAS_ICD10'] = 0
-        df_time['ICD10_LENGTH'] = 0
-    
-    # Fill NaN
-    numeric_cols = ['COMPLAINTS_LENGTH', 'COMPLAINTS_WORD_COUNT', 'COMPLAINTS_AVG_WORD_LENGTH',
-                    'AGE_NORMALIZED', 'DIAGNOSIS_LENGTH', 'DIAGNOSIS_WORD_COUNT', 'ICD10_LENGTH']
-    for col in numeric_cols:
-        df_time[col] = df_time[col].fillna(0).astype(float)
-    
-    df_time['AGE_GROUP'] = df_time['AGE_GROUP'].fillna(2).astype(int)
-    
-    # Create proxy time target (same as time_cater.py)
-    def calculate_proxy_time(row):
-        base_time = 0.5
-        complaint_score = min(row['COMPLAINTS_WORD_COUNT'] / 50, 1.0) * 1.0
-        diagnosis_complexity = len(str(row['DIAGNOSIS_CLEAN']).split()) * 0.1
-        age_factor = min(row['AGE'] / 100, 0.5)
-        total = base_time + complaint_score + diagnosis_complexity + age_factor
-        return max(0.25, min(total, 4.0))
-    
-    df_time['TIME_TO_CATER'] = df_time.apply(calculate_proxy_time, axis=1)
-    
-    # Text vectorization
-    time_vectorizer = TfidfVectorizer(
-        max_features=1000,
-        ngram_range=(1, 2),
-        min_df=2,
-        max_df=0.90,
-        stop_words='english',
-        sublinear_tf=True
-    )
-    
-    X_time_text = time_vectorizer.fit_transform(df_time['COMPLAINTS_PREPROCESSED'])
-    
-    # Numeric features
-    time_numeric_features = ['AGE', 'SEX', 'COMPLAINTS_LENGTH', 'COMPLAINTS_WORD_COUNT',
-                            'COMPLAINTS_AVG_WORD_LENGTH', 'AGE_GROUP', 'AGE_NORMALIZED',
-                            'DIAGNOSIS_ENCODED', 'DIAGNOSIS_LENGTH', 'DIAGNOSIS_WORD_COUNT',
-                            'HAS_ICD10', 'ICD10_LENGTH']
-    time_keyword_features = [f'HAS_{kw.upper()}_TIME' for kw in MEDICAL_KEYWORDS]
-    all_time_numeric = time_numeric_features + time_keyword_features
-    
-    X_time_numeric = df_time[all_time_numeric].values
-    
-    # Scale numeric features
-    time_scaler = StandardScaler()
-    X_time_numeric_scaled = time_scaler.fit_transform(X_time_numeric)
-    
-    # Combine features
-    X_time = scipy.sparse.hstack([X_time_numeric_scaled, X_time_text])
+    complaint_words = get_text_normalizer().preprocess_series(df_time['COMPLAINTS']).str.split().str.len().fillna(0)
+    diagnosis_words = df_time['DIAGNOSIS'].fillna('Unknown').astype(str).str.strip().str.split().str.len()
+    df_time['TIME_TO_CATER'] = (
+        0.5
+        + (complaint_words / 50).clip(upper=1.0)
+        + diagnosis_words * 0.1
+        + (df_time['AGE'] / 100).clip(upper=0.5)
+    ).clip(MIN_TIME_HOURS, MAX_TIME_HOURS)
+    
+    # Numeric/keyword/diagnosis features + TF-IDF, as one sparse matrix
+    time_pipeline = TimeToCaterFeaturePipeline()
+    X_time = time_pipeline.fit_transform(df_time)
     y_time = df_time['TIME_TO_CATER'].values
     
     # Train-test split
@@ -2193,10 +2032,7 @@ def train_time_prediction_model_advanced_from_csv(csv_path=None):
     models_dir = get_ml_models_path()
     os.makedirs(models_dir, exist_ok=True)
 
-    joblib.dump(best_model, os.path.join(models_dir, 'time_prediction_model_advanced.pkl'))
-    joblib.dump(time_vectorizer, os.path.join(models_dir, 'time_vectorizer_advanced.pkl'))
-    joblib.dump(time_scaler, os.path.join(models_dir, 'time_scaler_advanced.pkl'))
-    joblib.dump(diag_time_encoder, os.path.join(models_dir, 'diag_time_encoder_advanced.pkl'))
+    save_time_model(best_model, time_pipeline)
     print("Training Completed")
     
     return {
@@ -1,6 +1,4 @@
-import joblib
 import os
-from django.core.cache import cache
 from django.conf import settings
 from .ml_utils import (
     train_random_forest_model_classification,
@@ -8,47 +6,29 @@ from .ml_utils import (
     train_disease_peak_prediction_model,
     get_ml_models_path
 )
+from .model_registry import ModelRegistry
+from .time_features import (
+    load_time_feature_pipeline, load_time_model, TIME_FEATURE_PIPELINE_ARTIFACT, TIME_MODEL_ARTIFACT,
+    LEGACY_TIME_COMPONENTS
+)
 
 class MLModelManager:
-    """Manages loading and caching of ML models"""
+    """Resolves the models used for batch predictions through the process-wide ModelRegistry"""
     
-    CACHE_KEYS = {
-        'disease_model': 'ml_disease_model',
-        'disease_vectorizer': 'ml_disease_vectorizer', 
-        'time_model': 'ml_time_model',
-        'time_vectorizer': 'ml_time_vectorizer'
+    # Candidate artifacts per model key, in order of preference
+    ARTIFACTS = {
+        'disease_model': ['disease_rf_model.pkl'],
+        'disease_vectorizer': ['disease_vectorizer.pkl'],
     }
+    # The time feature pipeline, which carries the time model (older trainings: the
+    # separate model artifact and the legacy components the pipeline is rebuilt from)
+    TIME_PIPELINE_ARTIFACTS = [TIME_FEATURE_PIPELINE_ARTIFACT, TIME_MODEL_ARTIFACT] + LEGACY_TIME_COMPONENTS
     
     @classmethod
     def load_models(cls):
-        """Load all models and cache them"""
+        """Load all models into the registry (warm-up)"""
         try:
-            models_dir = get_ml_models_path()
-
-            disease_model = joblib.load(os.path.join(models_dir, 'disease_rf_model.pkl'))
-            disease_vectorizer = joblib.load(os.path.join(models_dir, 'disease_vectorizer.pkl'))
-
-            time_model = None
-            for candidate in ['time_prediction_model_advanced.pkl', 'time_gb_model.pkl', 'time_rf_model.pkl']:
-                candidate_path = os.path.join(models_dir, candidate)
-                if os.path.exists(candidate_path):
-                    time_model = joblib.load(candidate_path)
-                    break
-
-            time_vectorizer = None
-            for candidate in ['time_vectorizer_advanced.pkl', 'symptom_vectorizer.pkl']:
-                candidate_path = os.path.join(models_dir, candidate)
-                if os.path.exists(candidate_path):
-                    time_vectorizer = joblib.load(candidate_path)
-                    break
-
-            cache.set(cls.CACHE_KEYS['disease_model'], disease_model, 3600)
-            cache.set(cls.CACHE_KEYS['disease_vectorizer'], disease_vectorizer, 3600)
-            if time_model is not None:
-                cache.set(cls.CACHE_KEYS['time_model'], time_model, 3600)
-            if time_vectorizer is not None:
-                cache.set(cls.CACHE_KEYS['time_vectorizer'], time_vectorizer, 3600)
-
+            cls.get_models()
             return True
         except Exception as e:
             print(f"Error loading models: {e}")
@@ -56,19 +36,23 @@ class MLModelManager:
     
     @classmethod
     def get_models(cls):
-        """Get cached models or load them if not cached"""
+        """Get models from the registry; files changed on disk are reloaded automatically"""
         models = {}
         
-        for key, cache_key in cls.CACHE_KEYS.items():
-            model = cache.get(cache_key)
-            if model is None:
-                # Models not in cache, load them
-                cls.load_models()
-                model = cache.get(cache_key)
-            models[key] = model
+        for key, candidates in cls.ARTIFACTS.items():
+            _, models[key] = ModelRegistry.get_first(candidates)
+        models['time_pipeline'] = load_time_feature_pipeline()
+        models['time_model'] = load_time_model(models['time_pipeline'])
             
         return models
     
+    @classmethod
+    def get_version(cls):
+        """Version string of the model artifacts; changes after any retrain"""
+        names = [name for candidates in cls.ARTIFACTS.values() for name in candidates]
+        names += cls.TIME_PIPELINE_ARTIFACTS
+        return ModelRegistry.get_version(names)
+    
     @classmethod
     def train_models_if_needed(cls):
         """Train models only if they don't exist"""
@@ -77,14 +61,6 @@ class MLModelManager:
             os.path.join(models_dir, 'disease_rf_model.pkl'),
             os.path.join(models_dir, 'disease_vectorizer.pkl')
         ]
-        time_model_candidates = [
-            os.path.join(models_dir, name)
-            for name in ['time_prediction_model_advanced.pkl', 'time_gb_model.pkl', 'time_rf_model.pkl']
-        ]
-        time_vectorizer_candidates = [
-            os.path.join(models_dir, name)
-            for name in ['time_vectorizer_advanced.pkl', 'symptom_vectorizer.pkl']
-        ]
         disease_peak_files = [
             os.path.join(models_dir, 'disease_peak_model.pkl'),
             os.path.join(models_dir, 'disease_peak_tfidf.pkl'),
@@ -94,10 +70,8 @@ class MLModelManager:
         ]
 
         missing = [path for path in disease_files if not os.path.exists(path)]
-        if not any(os.path.exists(path) for path in time_model_candidates):
+        if load_time_model(load_time_feature_pipeline()) is None:
             missing.append('time_model')
-        if not any(os.path.exists(path) for path in time_vectorizer_candidates):
-            missing.append('time_vectorizer')
         if not all(os.path.exists(path) for path in disease_peak_files):
             missing.append('disease_peak_model')
 
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+
+import joblib
+import numpy as np
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of unpickled ML artifacts, keyed by file name in ml_models/.
+
+    Each artifact is loaded once per process and reused until the file on disk
+    changes (mtime/size), so retraining hot-swaps models without a restart.
+    Numpy arrays are memory-mapped read-only by default, letting forked workers
+    share the same pages instead of holding private copies. Artifacts named *.npy
+    are plain numpy arrays (np.save/np.load) rather than joblib pickles.
+    """
+
+    _artifacts = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_path(cls, name):
+        """Absolute path of an artifact inside the ml_models directory"""
+        from .ml_utils import get_ml_models_path
+        return os.path.join(get_ml_models_path(), name)
+
+    @classmethod
+    def _signature(cls, path):
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size)
+
+    @classmethod
+    def exists(cls, name):
+        return os.path.exists(cls.get_path(name))
+
+    @classmethod
+    def get(cls, name, mmap_mode='r'):
+        """
+        Return the artifact stored under ``name``, (re)loading it if the file changed.
+        Raises FileNotFoundError if the artifact does not exist.
+        """
+        path = cls.get_path(name)
+        signature = cls._signature(path)
+
+        entry = cls._artifacts.get(name)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        with cls._lock:
+            # Another thread may have loaded it while we waited
+            entry = cls._artifacts.get(name)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+            if name.endswith('.npy'):
+                artifact = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+            else:
+                artifact = joblib.load(path, mmap_mode=mmap_mode)
+            cls._artifacts[name] = (signature, artifact)
+            return artifact
+
+    @classmethod
+    def get_version(cls, names):
+        """
+        Short fingerprint of the on-disk state (mtime/size) of the given artifacts.
+        Changes whenever any of them is retrained, created or removed.
+        """
+        parts = []
+        for name in names:
+            try:
+                _, mtime, size = cls._signature(cls.get_path(name))
+            except FileNotFoundError:
+                mtime = size = None
+            parts.append(f"{name}:{mtime}:{size}")
+        return hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()[:12]
+
+    @classmethod
+    def get_first(cls, names, mmap_mode='r'):
+        """Return (name, artifact) for the first existing artifact in ``names``, or (None, None)"""
+        for name in names:
+            if cls.exists(name):
+                return name, cls.get(name, mmap_mode=mmap_mode)
+        return None, None
+
+    @classmethod
+    def save(cls, artifact, name):
+        """
+        Dump an artifact atomically (temp file + rename). Memory-mapped readers keep
+        the old inode, and the next get() picks up the new file.
+        """
+        path = cls.get_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        if name.endswith('.npy'):
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.asarray(artifact), allow_pickle=False)
+        else:
+            joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def evict(cls, name=None):
+        """Drop one artifact (or all of them) from the registry"""
+        with cls._lock:
+            if name is None:
+                cls._artifacts.clear()
+            else:
+                cls._artifacts.pop(name, None)
@@ -105,3 +105,73 @@ class DiseasePrediction(models.Model):
     def __str__(self):
         return f"{self.predicted_disease.name} - {self.confidence_level}% confidence"
 
+
+
+# ReferralPrediction Model (ML predictions persisted when a referral is written)
+class ReferralPrediction(models.Model):
+    referral = models.OneToOneField(
+        'referrals.Referral',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='prediction'
+    )
+    icd_code = models.CharField(max_length=20)  # Predicted ICD-10 code, or 'Unspecified' / 'No prediction'
+    confidence = models.FloatField(null=True, blank=True)  # Highest class probability of the disease model
+    predicted_minutes = models.FloatField(null=True, blank=True)  # Predicted time to cater
+    feature_hash = models.CharField(max_length=16)  # Fingerprint of the referral fields the models read
+    model_version = models.CharField(max_length=12, db_index=True)  # Artifact version used for the prediction
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Referral #{self.referral_id} - {self.icd_code}"
+
+    def as_tuple(self):
+        """(disease, time) pair in the format BatchPredictor.predict_all_batch returns"""
+        return (self.icd_code, self.predicted_minutes if self.predicted_minutes is not None else "N/A")
+
+
+# Daily rollups read by the analytics reports instead of scanning Referral /
+# Medical_History (maintained by analytics.rollups)
+class DailyReferralRollup(models.Model):
+    day = models.DateField()  # Local date of Referral.created_at
+    facility = models.ForeignKey(Facility, on_delete=models.CASCADE, null=True, blank=True, related_name='+')  # Patient's facility
+    status = models.CharField(max_length=20)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')  # Who referred
+    examined_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['day', 'facility'])]
+
+    def __str__(self):
+        return f"{self.day} - {self.facility_id} - {self.status}: {self.count}"
+
+
+class DailyMorbidityRollup(models.Model):
+    day = models.DateField()  # Medical_History.diagnosed_date
+    facility = models.ForeignKey(Facility, on_delete=models.CASCADE, null=True, blank=True, related_name='+')  # Patient's facility
+    illness = models.CharField(max_length=255)  # Normalized illness name (trimmed, lower-cased)
+    disease = models.ForeignKey('Disease', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')  # Medical_History.disease
+    illness_label = models.CharField(max_length=255, blank=True)  # Medical_History.illness_label
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')  # Who recorded it
+    referral_status = models.CharField(max_length=20, blank=True)  # Status of the linked referral ('' if none)
+    examined_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')  # Linked referral's doctor
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['day', 'facility'])]
+
+    def __str__(self):
+        return f"{self.day} - {self.facility_id} - {self.illness}: {self.count}"
+
+
+class RollupWatermark(models.Model):
+    """High-water marks of the incremental rollup refresh (refresh_analytics_rollups)"""
+    name = models.CharField(max_length=50, primary_key=True)
+    referral_created_at = models.DateTimeField(null=True, blank=True)
+    referral_completed_at = models.DateTimeField(null=True, blank=True)
+    history_id = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.updated_at}"
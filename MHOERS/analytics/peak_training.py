@@ -0,0 +1,88 @@
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from sklearn.ensemble import RandomForestRegressor
+
+BARANGAY_PEAK_MODELS_ARTIFACT = 'barangay_disease_peak_models.pkl'
+BARANGAY_PEAK_METADATA_ARTIFACT = 'barangay_disease_peak_metadata.pkl'
+# (barangay, disease, month) table of forecast cases, indexed by the metadata's
+# 'barangays' and 'diseases' lists; NaN where the pair has no model
+BARANGAY_FORECAST_ARTIFACT = 'barangay_disease_peak_forecast.npy'
+FORECAST_YEAR = 2025
+
+# Fewer rows than this and a barangay/disease pair gets no model
+MIN_GROUP_ROWS = 3
+# Each worker gets about this many batches of groups: one forest per task costs
+# more in dispatch than in fitting for the small groups
+BATCHES_PER_WORKER = 4
+
+
+def resolve_training_workers(n_workers=None, n_tasks=None):
+    """
+    Worker processes for per-group model training: ``n_workers`` if given, else
+    settings.ML_TRAINING_WORKERS, else every available core; never more than there are tasks.
+    """
+    if n_workers is None:
+        n_workers = getattr(settings, 'ML_TRAINING_WORKERS', None)
+    if not n_workers or n_workers < 1:
+        n_workers = joblib.cpu_count()
+    if n_tasks is not None:
+        n_workers = min(n_workers, max(n_tasks, 1))
+    return int(n_workers)
+
+
+def fit_group_model(key, X, y):
+    """
+    Fit one barangay/disease regressor. Runs in a worker process, so this module
+    must stay importable without the Django app registry.
+    """
+    started = time.perf_counter()
+    model = RandomForestRegressor(n_estimators=100, random_state=42)
+    model.fit(X, y)
+    return key, model, time.perf_counter() - started
+
+
+def fit_group_models(trends, group_columns, feature_columns, target_column, n_workers=None):
+    """
+    Partition ``trends`` once by ``group_columns`` and fit a regressor per group
+    with at least MIN_GROUP_ROWS rows. With one worker the groups are fitted in
+    this process; otherwise on a process pool, dispatched in batches of groups.
+
+    Returns (models keyed by group tuple, per-group timing rows, workers used).
+    """
+    groups = [
+        (key, subset[feature_columns], subset[target_column])
+        for key, subset in trends.groupby(group_columns, sort=False, observed=True)
+        if len(subset) >= MIN_GROUP_ROWS
+    ]
+    workers = resolve_training_workers(n_workers, len(groups))
+    if workers == 1:
+        fitted = [fit_group_model(key, X, y) for key, X, y in groups]
+    else:
+        batch_size = max(1, len(groups) // (workers * BATCHES_PER_WORKER))
+        fitted = joblib.Parallel(n_jobs=workers, batch_size=batch_size)(
+            joblib.delayed(fit_group_model)(key, X, y) for key, X, y in groups
+        )
+    models = {key: model for key, model, _ in fitted}
+    timings = [
+        {'group': key, 'rows': len(y), 'seconds': seconds}
+        for (key, _, y), (_, _, seconds) in zip(groups, fitted)
+    ]
+    return models, timings, workers
+
+
+def build_forecast_table(models_dict, barangays, diseases, year=FORECAST_YEAR):
+    """
+    Forecast cases for every month of ``year``, shape (len(barangays), len(diseases), 12).
+    Pairs without a model stay NaN.
+    """
+    table = np.full((len(barangays), len(diseases), 12), np.nan)
+    future_months = pd.DataFrame({'YEAR': [year] * 12, 'MONTH': range(1, 13)})
+    disease_index = {disease: j for j, disease in enumerate(diseases)}
+    for i, barangay in enumerate(barangays):
+        for disease, model in models_dict.get(barangay, {}).items():
+            table[i, disease_index[disease]] = model.predict(future_months)
+    return table
@@ -0,0 +1,90 @@
+"""
+Persisted referral predictions (ReferralPrediction).
+
+Predictions are computed when a referral is written (post_save signal) or by the
+refresh_referral_predictions command, so list views only read a joined table.
+"""
+from .batch_predictor import BatchPredictor
+from .model_manager import MLModelManager
+from .models import ReferralPrediction
+
+
+def refresh_referral_predictions(referrals, force=False):
+    """
+    Compute and upsert ReferralPrediction rows for the given referrals.
+    Rows whose feature hash and model version are unchanged are skipped unless force=True.
+    Returns the number of rows written.
+    """
+    referrals = list(referrals)
+    if not referrals:
+        return 0
+
+    model_version = MLModelManager.get_version()
+    hashes = {r.referral_id: BatchPredictor.feature_fingerprint(r) for r in referrals}
+
+    if not force:
+        current = set(
+            ReferralPrediction.objects.filter(
+                referral_id__in=list(hashes),
+                model_version=model_version
+            ).values_list('referral_id', 'feature_hash')
+        )
+        referrals = [r for r in referrals if (r.referral_id, hashes[r.referral_id]) not in current]
+        if not referrals:
+            return 0
+
+    disease_scores = BatchPredictor.score_diseases_batch(referrals)
+    time_predictions = BatchPredictor.predict_times_batch(referrals)
+
+    rows = []
+    for r in referrals:
+        icd_code, confidence = disease_scores.get(r.referral_id, ("No prediction", None))
+        rows.append(ReferralPrediction(
+            referral_id=r.referral_id,
+            icd_code=icd_code,
+            confidence=confidence,
+            predicted_minutes=time_predictions.get(r.referral_id),
+            feature_hash=hashes[r.referral_id],
+            model_version=model_version,
+        ))
+
+    ReferralPrediction.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['referral'],
+        update_fields=['icd_code', 'confidence', 'predicted_minutes', 'feature_hash', 'model_version', 'computed_at'],
+    )
+    return len(rows)
+
+
+def get_stored_predictions(referrals):
+    """
+    Return {referral_id: (disease, time)} from the persisted predictions.
+    Referrals should be fetched with select_related('prediction'); any without a
+    stored row (e.g. created before the backfill) are predicted once and stored.
+    """
+    predictions = {}
+    missing = []
+    for referral in referrals:
+        try:
+            predictions[referral.referral_id] = referral.prediction.as_tuple()
+        except ReferralPrediction.DoesNotExist:
+            missing.append(referral)
+
+    if missing:
+        refresh_referral_predictions(missing, force=True)
+        for stored in ReferralPrediction.objects.filter(referral_id__in=[r.referral_id for r in missing]):
+            predictions[stored.referral_id] = stored.as_tuple()
+
+    return predictions
+
+
+def ensure_stored_predictions(queryset):
+    """
+    Store predictions for referrals in ``queryset`` that have none yet (e.g. created
+    before the backfill), so SQL ordering on prediction__icd_code sees them.
+    """
+    missing = queryset.filter(prediction__isnull=True).select_related('patient')
+    if not missing.exists():
+        return 0
+    return refresh_referral_predictions(missing, force=True)
@@ -0,0 +1,214 @@
+"""
+Daily referral / morbidity rollups (DailyReferralRollup, DailyMorbidityRollup).
+
+Each rollup row counts the referrals (or medical histories) of one day for one
+combination of facility, status, user and examining doctor, so the analytics
+reports aggregate a few rows per day instead of every Referral/Medical_History.
+
+A day is always recomputed as a whole from the source rows, which keeps updates
+idempotent: the analytics.signals handlers refresh the days a write touched, the
+refresh_analytics_rollups command catches up from its high-water marks (and
+rebuilds everything with --rebuild). Data that predates the tables is backfilled
+by migration 0005_backfill_daily_rollups.
+"""
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Lower, Trim, TruncDate
+from django.utils import timezone
+
+from .models import DailyMorbidityRollup, DailyReferralRollup, RollupWatermark
+
+ROLLUP_WATERMARK = 'daily_rollups'
+
+# Source lookups -> rollup lookups, longest prefix first
+REFERRAL_ROLLUP_FIELDS = [
+    ('created_at__date', 'day'),
+    ('created_at', 'day'),
+    ('patient__facility_id', 'facility_id'),
+    ('patient__facility', 'facility'),
+    ('examined_by', 'examined_by'),
+    ('status', 'status'),
+    ('user_id', 'user_id'),
+    ('user', 'user'),
+]
+MORBIDITY_ROLLUP_FIELDS = [
+    ('diagnosed_date', 'day'),
+    ('patient_id__facility_id', 'facility_id'),
+    ('patient_id__facility', 'facility'),
+    ('referral__examined_by', 'examined_by'),
+    ('referral__status', 'referral_status'),
+    ('disease', 'disease'),
+    ('illness_label', 'illness_label'),
+    ('user_id', 'user_id'),
+]
+
+
+def _translate(filters, fields):
+    translated = {}
+    for lookup, value in filters.items():
+        for source, target in fields:
+            if lookup == source or lookup.startswith(source + '__'):
+                translated[target + lookup[len(source):]] = value
+                break
+        else:
+            raise ValueError(f"No rollup column for filter {lookup!r}")
+    return translated
+
+
+def referral_rollup(**filters):
+    """DailyReferralRollup rows matching Referral-style filters (e.g. created_at__year=2025)"""
+    return DailyReferralRollup.objects.filter(**_translate(filters, REFERRAL_ROLLUP_FIELDS))
+
+
+def morbidity_rollup(**filters):
+    """DailyMorbidityRollup rows matching Medical_History-style filters (e.g. diagnosed_date__month=3)"""
+    return DailyMorbidityRollup.objects.filter(**_translate(filters, MORBIDITY_ROLLUP_FIELDS))
+
+
+def refresh_referral_days(days):
+    """Recompute the referral rollup rows of the given local dates"""
+    from referrals.models import Referral
+
+    days = sorted(set(days))
+    if not days:
+        return 0
+    groups = (
+        Referral.objects.filter(created_at__date__in=days)
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'patient__facility_id', 'status', 'user_id', 'examined_by_id')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    rows = [
+        DailyReferralRollup(
+            day=group['day'], facility_id=group['patient__facility_id'], status=group['status'],
+            user_id=group['user_id'], examined_by_id=group['examined_by_id'], count=group['count'],
+        )
+        for group in groups
+    ]
+    with transaction.atomic():
+        DailyReferralRollup.objects.filter(day__in=days).delete()
+        DailyReferralRollup.objects.bulk_create(rows)
+    return len(rows)
+
+
+def refresh_morbidity_days(days):
+    """Recompute the morbidity rollup rows of the given diagnosed dates"""
+    from patients.models import Medical_History
+
+    days = sorted(set(days))
+    if not days:
+        return 0
+    groups = (
+        Medical_History.objects.filter(diagnosed_date__in=days)
+        .annotate(illness=Lower(Trim('illness_name')))
+        .values('diagnosed_date', 'patient_id__facility_id', 'illness', 'disease_id', 'illness_label',
+                'user_id', 'referral__status', 'referral__examined_by_id')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    rows = [
+        DailyMorbidityRollup(
+            day=group['diagnosed_date'], facility_id=group['patient_id__facility_id'],
+            illness=group['illness'] or '', disease_id=group['disease_id'],
+            illness_label=group['illness_label'], user_id=group['user_id'],
+            referral_status=group['referral__status'] or '',
+            examined_by_id=group['referral__examined_by_id'], count=group['count'],
+        )
+        for group in groups
+    ]
+    with transaction.atomic():
+        DailyMorbidityRollup.objects.filter(day__in=days).delete()
+        DailyMorbidityRollup.objects.bulk_create(rows)
+    return len(rows)
+
+
+def referral_day(referral):
+    """Local date a referral is rolled up under"""
+    created_at = referral.created_at
+    if created_at is None:
+        return None
+    return timezone.localdate(created_at) if timezone.is_aware(created_at) else created_at.date()
+
+
+def _in_chunks(values, size=90):
+    values = sorted(set(values))
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _mark_watermark():
+    """Record the current maxima of the tracked columns"""
+    from patients.models import Medical_History
+    from referrals.models import Referral
+
+    marks = Referral.objects.aggregate(created=Max('created_at'), completed=Max('completed_at'))
+    RollupWatermark.objects.update_or_create(
+        name=ROLLUP_WATERMARK,
+        defaults={
+            'referral_created_at': marks['created'],
+            'referral_completed_at': marks['completed'],
+            'history_id': Medical_History.objects.aggregate(last=Max('pk'))['last'] or 0,
+        },
+    )
+
+
+def rebuild_rollups():
+    """Recompute both rollups from scratch (backfill); returns (referral rows, morbidity rows)"""
+    from patients.models import Medical_History
+    from referrals.models import Referral
+
+    referral_days = set(
+        Referral.objects.annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct()
+    )
+    history_days = set(Medical_History.objects.values_list('diagnosed_date', flat=True).distinct())
+
+    with transaction.atomic():
+        DailyReferralRollup.objects.all().delete()
+        DailyMorbidityRollup.objects.all().delete()
+        referral_rows = sum(refresh_referral_days(chunk) for chunk in _in_chunks(d for d in referral_days if d))
+        morbidity_rows = sum(refresh_morbidity_days(chunk) for chunk in _in_chunks(d for d in history_days if d))
+        _mark_watermark()
+    return referral_rows, morbidity_rows
+
+
+def refresh_rollups_incremental():
+    """
+    Refresh the days touched since the last run: referrals created or completed
+    after the marks, and medical histories added after the last seen id (plus the
+    histories of newly completed referrals). Returns the number of days refreshed,
+    or None if there is no watermark yet and a rebuild is needed.
+    """
+    from patients.models import Medical_History
+    from referrals.models import Referral
+
+    watermark = RollupWatermark.objects.filter(name=ROLLUP_WATERMARK).first()
+    if watermark is None:
+        return None
+
+    touched = Q(pk__in=[])
+    if watermark.referral_created_at:
+        touched |= Q(created_at__gt=watermark.referral_created_at)
+    else:
+        touched |= Q(created_at__isnull=False)
+    if watermark.referral_completed_at:
+        touched |= Q(completed_at__gt=watermark.referral_completed_at)
+    else:
+        touched |= Q(completed_at__isnull=False)
+
+    referrals = Referral.objects.filter(touched)
+    referral_days = {
+        day for day in referrals.annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct() if day
+    }
+    history_days = set(
+        Medical_History.objects.filter(Q(pk__gt=watermark.history_id) | Q(referral__in=referrals))
+        .values_list('diagnosed_date', flat=True).distinct()
+    )
+
+    for chunk in _in_chunks(referral_days):
+        refresh_referral_days(chunk)
+    for chunk in _in_chunks(history_days):
+        refresh_morbidity_days(chunk)
+    _mark_watermark()
+    return len(referral_days) + len(history_days)
+
@@ -0,0 +1,115 @@
+"""
+Normalized Disease lookup index (ICD code / name -> critical level).
+
+Built with a single query and kept in the Django cache for
+SEVERITY_INDEX_CACHE_TIMEOUT seconds, so sorting and rendering referral lists
+resolves severity with dict lookups instead of one Disease query per referral.
+A Disease save or delete drops it at once (see analytics.signals), but only in
+the cache of the process that handled the write when the cache is per-process
+(LocMemCache); the timeout bounds how long other workers serve the old index.
+"""
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Value, When
+
+SEVERITY_INDEX_CACHE_KEY = 'disease_severity_index_v2'
+SEVERITY_INDEX_CACHE_TIMEOUT = 60 * 5
+
+# Sort order used by the referral lists: High -> Medium -> Low -> Unspecified
+SEVERITY_ORDER = {'high': 0, 'medium': 1, 'low': 2}
+UNSPECIFIED_ORDER = 3
+
+
+def canonical_icd(code):
+    """Canonical form of an ICD code: 'i10-1', ' I10.1 ' -> 'I10.1'"""
+    if code is None:
+        return ''
+    return str(code).strip().upper().replace('-', '.')
+
+
+def _is_placeholder(code):
+    return not code or (isinstance(code, str) and ('No prediction' in code or 'Unspecified' in code))
+
+
+class SeverityIndex:
+    """Cached lookups over the Disease table keyed by canonical ICD code and lowercase name"""
+
+    @classmethod
+    def build(cls):
+        from .models import Disease
+
+        by_icd = {}
+        by_name = {}
+        for pk, name, icd_code, level in Disease.objects.values_list('pk', 'name', 'icd_code', 'critical_level'):
+            entry = {'id': pk, 'name': name, 'icd_code': icd_code, 'critical_level': level}
+            by_icd[canonical_icd(icd_code)] = entry
+            by_name[name.lower()] = entry
+        return {'by_icd': by_icd, 'by_name': by_name}
+
+    @classmethod
+    def get(cls):
+        index = cache.get(SEVERITY_INDEX_CACHE_KEY)
+        if index is None:
+            index = cls.build()
+            cache.set(SEVERITY_INDEX_CACHE_KEY, index, SEVERITY_INDEX_CACHE_TIMEOUT)
+        return index
+
+    @classmethod
+    def invalidate(cls):
+        cache.delete(SEVERITY_INDEX_CACHE_KEY)
+
+    @classmethod
+    def lookup(cls, icd_code, index=None):
+        """Disease entry ({'id', 'name', 'icd_code', 'critical_level'}) for an ICD code, or None"""
+        if _is_placeholder(icd_code):
+            return None
+        index = index if index is not None else cls.get()
+        return index['by_icd'].get(canonical_icd(icd_code))
+
+    @classmethod
+    def lookup_name(cls, name, index=None):
+        """Disease entry for a disease name (case-insensitive), or None"""
+        if not name:
+            return None
+        index = index if index is not None else cls.get()
+        return index['by_name'].get(str(name).strip().lower())
+
+    @classmethod
+    def severity(cls, icd_code, index=None):
+        """Display severity ('High', 'Medium', 'Low' or 'Unspecified') for an ICD code"""
+        entry = cls.lookup(icd_code, index)
+        if entry and entry['critical_level']:
+            return entry['critical_level'].capitalize()
+        return "Unspecified"
+
+    @classmethod
+    def severity_order(cls, icd_code, index=None):
+        """Sort value for an ICD code (lower = higher priority): 0=High, 1=Medium, 2=Low, 3=Unspecified"""
+        entry = cls.lookup(icd_code, index)
+        if not entry:
+            return UNSPECIFIED_ORDER
+        return SEVERITY_ORDER.get((entry['critical_level'] or '').lower(), UNSPECIFIED_ORDER)
+
+    @classmethod
+    def order_expression(cls, field='prediction__icd_code', index=None):
+        """
+        Case/When annotation mapping a stored ICD code column to the severity sort value,
+        so referral lists can be ordered and paginated in SQL. Both '.' and '-' spellings
+        of each Disease code are matched.
+        """
+        index = index if index is not None else cls.get()
+        codes_by_order = {}
+        for canonical, entry in index['by_icd'].items():
+            order = SEVERITY_ORDER.get((entry['critical_level'] or '').lower())
+            if order is None:
+                continue
+            codes_by_order.setdefault(order, set()).update(
+                {entry['icd_code'], canonical, canonical.replace('.', '-')}
+            )
+
+        whens = [
+            When(**{f'{field}__in': sorted(codes), 'then': Value(order)})
+            for order, codes in sorted(codes_by_order.items())
+        ]
+        if not whens:
+            return Value(UNSPECIFIED_ORDER, output_field=IntegerField())
+        return Case(*whens, default=Value(UNSPECIFIED_ORDER), output_field=IntegerField())
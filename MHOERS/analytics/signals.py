@@ -0,0 +1,197 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from facilities.models import Barangay, Facility
+from patients.models import Medical_History, Patient
+from referrals.models import Referral
+
+from .barangay_index import BarangayFacilityIndex
+from .models import Disease
+from .severity_index import SeverityIndex
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Referral)
+def refresh_referral_prediction(sender, instance, **kwargs):
+    """
+    Store the disease/time prediction for a referral once it is committed, so list
+    views read ReferralPrediction instead of running the models per request.
+    Unchanged referrals (same feature hash and model version) are skipped.
+    """
+    def _refresh():
+        from .prediction_store import refresh_referral_predictions
+        try:
+            referral = Referral.objects.select_related('patient').get(pk=instance.pk)
+            refresh_referral_predictions([referral])
+        except Exception as e:
+            # Never break the referral write; the view/command will fill it later
+            logger.warning(f"Could not store prediction for referral {instance.pk}: {e}")
+
+    transaction.on_commit(_refresh)
+
+
+@receiver(post_save, sender=Referral)
+@receiver(post_delete, sender=Referral)
+@receiver(post_save, sender=Facility)
+@receiver(post_delete, sender=Facility)
+def invalidate_referral_statistics(sender, **kwargs):
+    """Expire memoized get_referral_statistics charts after any referral or facility write"""
+    from .views import bump_referral_stats_generation
+    bump_referral_stats_generation()
+
+
+@receiver(post_save, sender=Patient)
+def invalidate_referral_statistics_on_patient_move(sender, instance, created, **kwargs):
+    """Referrals are charted under the patient's facility: expire the charts when it changes"""
+    if not created and instance.facility_id != getattr(instance, '_previous_facility_id', instance.facility_id):
+        from .views import bump_referral_stats_generation
+        bump_referral_stats_generation()
+
+
+@receiver(post_save, sender=Disease)
+@receiver(post_delete, sender=Disease)
+def invalidate_severity_index(sender, **kwargs):
+    """Rebuild the ICD -> critical level index on the next lookup"""
+    SeverityIndex.invalidate()
+
+
+@receiver(pre_save, sender=Disease)
+def remember_disease_name(sender, instance, **kwargs):
+    """Keep the stored name, so a rename also re-resolves histories under the old name"""
+    instance._previous_name = None
+    if instance.pk:
+        instance._previous_name = Disease.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Disease)
+@receiver(post_delete, sender=Disease)
+def renormalize_disease_histories(sender, instance, created=False, **kwargs):
+    """Re-resolve the medical histories whose illness matches an added, renamed or deleted Disease"""
+    previous_name = getattr(instance, '_previous_name', None)
+    if kwargs['signal'] is post_save and not created and previous_name == instance.name:
+        return
+
+    from .illness import normalize_medical_histories
+
+    names = {instance.name, previous_name} - {None}
+
+    def _refresh():
+        try:
+            normalize_medical_histories(names)
+        except Exception as e:
+            # Never break the Disease write; normalize_medical_histories can be run later
+            logger.warning(f"Could not re-normalize medical histories for {sorted(names)}: {e}")
+
+    transaction.on_commit(_refresh)
+
+
+@receiver(post_save, sender=Facility)
+@receiver(post_delete, sender=Facility)
+@receiver(post_save, sender=Barangay)
+@receiver(post_delete, sender=Barangay)
+def invalidate_barangay_facility_index(sender, **kwargs):
+    """Rebuild the barangay -> facility match index on the next lookup"""
+    BarangayFacilityIndex.invalidate()
+
+
+@receiver(post_save, sender=Referral)
+@receiver(post_delete, sender=Referral)
+def refresh_referral_rollups(sender, instance, **kwargs):
+    """
+    Recompute the referral's day in the daily rollups once committed, plus the days
+    of its medical histories (their rows carry the referral's status and doctor)
+    """
+    from .rollups import referral_day, refresh_morbidity_days, refresh_referral_days
+
+    day = referral_day(instance)
+    referral_id = instance.pk
+
+    def _refresh():
+        try:
+            if day:
+                refresh_referral_days([day])
+            refresh_morbidity_days(
+                Medical_History.objects.filter(referral_id=referral_id).values_list('diagnosed_date', flat=True)
+            )
+        except Exception as e:
+            # Never break the referral write; refresh_analytics_rollups catches up
+            logger.warning(f"Could not refresh rollups for referral {referral_id}: {e}")
+
+    transaction.on_commit(_refresh)
+
+
+@receiver(pre_save, sender=Medical_History)
+def normalize_medical_history_illness(sender, instance, **kwargs):
+    """Resolve illness_name into the Disease link and report label stored with the row"""
+    from .illness import normalize_history
+
+    normalize_history(instance)
+
+
+@receiver(pre_save, sender=Medical_History)
+def remember_diagnosed_date(sender, instance, **kwargs):
+    """Keep the stored diagnosed_date, so moving a record also refreshes its old day"""
+    instance._rollup_previous_day = None
+    if instance.pk:
+        instance._rollup_previous_day = (
+            Medical_History.objects.filter(pk=instance.pk).values_list('diagnosed_date', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Medical_History)
+@receiver(post_delete, sender=Medical_History)
+def refresh_morbidity_rollups(sender, instance, **kwargs):
+    """Recompute the medical history's day(s) in the morbidity rollup once committed"""
+    from .rollups import refresh_morbidity_days
+
+    days = {instance.diagnosed_date, getattr(instance, '_rollup_previous_day', None)} - {None}
+
+    def _refresh():
+        try:
+            refresh_morbidity_days(days)
+        except Exception as e:
+            logger.warning(f"Could not refresh morbidity rollup for {sorted(days)}: {e}")
+
+    transaction.on_commit(_refresh)
+
+
+@receiver(pre_save, sender=Patient)
+def remember_patient_facility(sender, instance, **kwargs):
+    """Keep the stored facility, so a facility change refreshes the patient's rollups and charts"""
+    instance._previous_facility_id = None
+    if instance.pk:
+        instance._previous_facility_id = (
+            Patient.objects.filter(pk=instance.pk).values_list('facility_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Patient)
+def refresh_patient_facility_rollups(sender, instance, created, **kwargs):
+    """Recompute the days of a patient's referrals and histories once its facility changed"""
+    if created or instance.facility_id == getattr(instance, '_previous_facility_id', instance.facility_id):
+        return
+
+    from django.db.models.functions import TruncDate
+    from .rollups import _in_chunks, refresh_morbidity_days, refresh_referral_days
+
+    patient_id = instance.pk
+
+    def _refresh():
+        try:
+            referral_days = (
+                Referral.objects.filter(patient_id=patient_id)
+                .annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct()
+            )
+            for chunk in _in_chunks(day for day in referral_days if day):
+                refresh_referral_days(chunk)
+            history_days = Medical_History.objects.filter(patient_id=patient_id).values_list('diagnosed_date', flat=True)
+            for chunk in _in_chunks(day for day in history_days if day):
+                refresh_morbidity_days(chunk)
+        except Exception as e:
+            logger.warning(f"Could not refresh rollups for patient {patient_id}: {e}")
+
+    transaction.on_commit(_refresh)
@@ -1,5 +1,5 @@
 from django import template
-from analytics.models import Disease
+from analytics.severity_index import SeverityIndex
 register = template.Library()
 
 @register.filter
@@ -53,6 +53,10 @@ def icd_to_disease(icd_code):
     }
     
     disease_name = icd_mapping.get(icd_code_str, None)
+    if not disease_name:
+        # Fall back to the Disease table (cached, '.'/'-' variants resolve alike)
+        entry = SeverityIndex.lookup(icd_code_str)
+        disease_name = entry['name'] if entry else None
     
     if disease_name:
         return f"{icd_code_str} - {disease_name}"
@@ -76,36 +80,9 @@ def icd_to_severity(icd_code):
     else:
         icd_code_str = str(icd_code).strip()
     
-    # Try to find Disease by ICD code (exact match first)
+    # Cached ICD index; '.' and '-' variants resolve to the same Disease
     try:
-        disease = Disease.objects.get(icd_code=icd_code_str)
-        # Get the display value for critical_level (capitalize first letter)
-        severity = disease.critical_level
-        if severity:
-            return severity.capitalize()
-        return "Unspecified"
-    except Disease.DoesNotExist:
-        # Try alternative format (replace dots with dashes or vice versa)
-        try:
-            # Try with dots replaced by dashes
-            alt_code = icd_code_str.replace('.', '-')
-            if alt_code != icd_code_str:
-                disease = Disease.objects.get(icd_code=alt_code)
-                severity = disease.critical_level
-                if severity:
-                    return severity.capitalize()
-        except Disease.DoesNotExist:
-            try:
-                # Try with dashes replaced by dots
-                alt_code = icd_code_str.replace('-', '.')
-                if alt_code != icd_code_str:
-                    disease = Disease.objects.get(icd_code=alt_code)
-                    severity = disease.critical_level
-                    if severity:
-                        return severity.capitalize()
-            except Disease.DoesNotExist:
-                pass
-        return "Unspecified"
+        return SeverityIndex.severity(icd_code_str)
     except Exception:
         return "Unspecified"
 
@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from referrals.models import Referral, Facility
 from patients.models import Patient
 from analytics.models import Disease
+from analytics.model_registry import ModelRegistry
 from analytics.ml_utils import (
     get_ml_models_path,
     train_random_forest_model_classification,
@@ -12,13 +13,17 @@ from analytics.ml_utils import (
     random_forest_regression_prediction_time,
     train_model_disease_spike,
     disease_forecast,
-    train_disease_forecast_best_model
+    train_disease_forecast_best_model,
+    forecast_daily_cases
 )
 from datetime import datetime, timedelta, date
 from decimal import Decimal
 import os
 import shutil
 
+import numpy as np
+import pandas as pd
+
 
 class MLUtilsTestCase(TestCase):
     """Comprehensive tests for ml_utils functions"""
@@ -494,4 +499,1154 @@ class MLUtilsTestCase(TestCase):
         # Verify model files were saved
         models_dir = get_ml_models_path()
         model_path = os.path.join(models_dir, 'disease_forecast_best_model.pkl')
-        # Note: File may not exist if test data is insufficient, but selection logic should work
\ No newline at end of file
+        # Note: File may not exist if test data is insufficient, but selection logic should work
+
+class ForecastDailyCasesTestCase(TestCase):
+    """Tests for the batched recursive disease forecaster"""
+
+    def setUp(self):
+        from sklearn.linear_model import LinearRegression
+
+        self.features = ['ICD10_CODE_ENC', 'Cases_lag1', 'Cases_lag7', 'Cases_lag30', 'Cases_MA7', 'Cases_MA30']
+        rng = np.random.RandomState(0)
+        rows = []
+        # Disease 1 has fewer than 30 observations to exercise the fallbacks
+        for code, n_days in [(0, 45), (1, 12)]:
+            for offset in range(n_days):
+                rows.append({
+                    'DATE': pd.Timestamp('2024-01-01') + pd.Timedelta(days=offset),
+                    'ICD10_CODE_ENC': code,
+                    'cases': int(rng.randint(0, 6)),
+                })
+        self.history_df = pd.DataFrame(rows)
+        X = rng.rand(50, len(self.features)) * 5
+        y = X @ np.array([0.3, 0.4, 0.1, 0.05, 0.2, 0.1]) + 0.5
+        self.model = LinearRegression().fit(pd.DataFrame(X, columns=self.features), y)
+
+    def _reference_forecast(self, code, n_days):
+        """Row-by-row recursion over a growing history (the original algorithm)"""
+        history = list(self.history_df[self.history_df['ICD10_CODE_ENC'] == code]
+                       .sort_values('DATE')['cases'].astype(float))
+        predictions = []
+        for _ in range(n_days):
+            lag1 = history[-1] if len(history) >= 1 else 0
+            lag7 = history[-7] if len(history) >= 7 else 0
+            lag30 = history[-30] if len(history) >= 30 else 0
+            ma7 = np.mean(history[-7:]) if len(history) >= 7 else lag1
+            ma30 = np.mean(history[-30:]) if len(history) >= 30 else lag1
+            x_pred = pd.DataFrame([[code, lag1, lag7, lag30, ma7, ma30]], columns=self.features)
+            pred = self.model.predict(x_pred)[0]
+            predictions.append(pred)
+            history.append(pred)
+        return predictions
+
+    def test_matches_row_by_row_recursion(self):
+        """Batched forecast equals the per-disease, per-day recursion"""
+        result = forecast_daily_cases(self.model, self.history_df, [0, 1], 40, self.features)
+
+        self.assertEqual(result.shape, (2, 40))
+        for row, code in enumerate([0, 1]):
+            np.testing.assert_allclose(result[row], self._reference_forecast(code, 40), rtol=1e-9)
+
+
+class ModelRegistryTestCase(TestCase):
+    """Tests for the process-wide model registry"""
+
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+
+        self.base_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(BASE_DIR=self.base_dir)
+        self.settings_override.enable()
+        ModelRegistry.evict()
+
+    def tearDown(self):
+        ModelRegistry.evict()
+        self.settings_override.disable()
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def test_loads_once_per_process(self):
+        ModelRegistry.save({'weights': np.arange(5)}, 'dummy.pkl')
+        first = ModelRegistry.get('dummy.pkl')
+        self.assertIs(ModelRegistry.get('dummy.pkl'), first)
+
+    def test_reloads_after_retrain(self):
+        ModelRegistry.save({'version': 1}, 'dummy.pkl')
+        self.assertEqual(ModelRegistry.get('dummy.pkl')['version'], 1)
+
+        ModelRegistry.save({'version': 2, 'extra': 'changes the file size'}, 'dummy.pkl')
+        self.assertEqual(ModelRegistry.get('dummy.pkl')['version'], 2)
+
+    def test_npy_artifacts_are_memory_mapped(self):
+        table = np.arange(24, dtype=float).reshape(2, 1, 12)
+        ModelRegistry.save(table, 'table.npy')
+        loaded = ModelRegistry.get('table.npy')
+        self.assertIsInstance(loaded, np.memmap)
+        np.testing.assert_array_equal(loaded, table)
+
+    def test_missing_artifacts(self):
+        self.assertFalse(ModelRegistry.exists('missing.pkl'))
+        self.assertEqual(ModelRegistry.get_first(['missing.pkl']), (None, None))
+        with self.assertRaises(FileNotFoundError):
+            ModelRegistry.get('missing.pkl')
+
+
+class BatchPredictorCacheTestCase(TestCase):
+    """Tests for the per-referral prediction cache in BatchPredictor.predict_all_batch"""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        user = User.objects.create_user(username='cacheuser', password='testpass123')
+        facility = Facility.objects.create(name='Cache Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        patient = Patient.objects.create(
+            first_name='Jane', last_name='Doe', p_address='Street', p_number='09123456789',
+            user=user, date_of_birth=date(1990, 1, 1), sex='Female', facility=facility
+        )
+        self.referrals = [
+            Referral.objects.create(
+                facility=facility, user=user, patient=patient,
+                weight=Decimal('60.0'), height=Decimal('160.0'), bp_systolic=120, bp_diastolic=80,
+                pulse_rate=70, respiratory_rate=16, temperature=Decimal('37.0'), oxygen_saturation=98,
+                chief_complaint=f'complaint {i}', symptoms='fever', work_up_details='-', initial_diagnosis='-'
+            )
+            for i in range(3)
+        ]
+
+    def _predict(self, referrals):
+        from unittest import mock
+        from analytics.batch_predictor import BatchPredictor
+
+        predicted = []
+
+        def fake_diseases(batch):
+            predicted.extend(r.referral_id for r in batch)
+            return {r.referral_id: 'J06.9' for r in batch}
+
+        with mock.patch.object(BatchPredictor, 'predict_diseases_batch', side_effect=fake_diseases), \
+                mock.patch.object(BatchPredictor, 'predict_times_batch',
+                                  side_effect=lambda batch: {r.referral_id: 30.0 for r in batch}):
+            result = BatchPredictor.predict_all_batch(referrals)
+        return result, predicted
+
+    def test_only_misses_are_predicted(self):
+        result, predicted = self._predict(self.referrals[:2])
+        self.assertEqual(len(predicted), 2)
+        self.assertEqual(result[self.referrals[0].referral_id], ('J06.9', 30.0))
+
+        # Same length, different list: only the new referral is inferred
+        result, predicted = self._predict(self.referrals[1:])
+        self.assertEqual(predicted, [self.referrals[2].referral_id])
+        self.assertEqual(set(result), {r.referral_id for r in self.referrals[1:]})
+
+    def test_changed_referral_is_repredicted(self):
+        self._predict(self.referrals)
+        self.referrals[0].symptoms = 'cough and headache'
+
+        _, predicted = self._predict(self.referrals)
+        self.assertEqual(predicted, [self.referrals[0].referral_id])
+
+
+class ReferralPredictionStoreTestCase(TestCase):
+    """Tests for the persisted ReferralPrediction table (analytics.prediction_store)"""
+
+    def setUp(self):
+        user = User.objects.create_user(username='storeuser', password='testpass123')
+        facility = Facility.objects.create(name='Store Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        patient = Patient.objects.create(
+            first_name='John', last_name='Doe', p_address='Street', p_number='09123456789',
+            user=user, date_of_birth=date(1985, 5, 5), sex='Male', facility=facility
+        )
+        self.referrals = [
+            Referral.objects.create(
+                facility=facility, user=user, patient=patient,
+                weight=Decimal('70.0'), height=Decimal('170.0'), bp_systolic=130, bp_diastolic=85,
+                pulse_rate=80, respiratory_rate=18, temperature=Decimal('38.0'), oxygen_saturation=97,
+                chief_complaint=f'complaint {i}', symptoms='fever', work_up_details='-', initial_diagnosis='-'
+            )
+            for i in range(2)
+        ]
+
+    def _refresh(self, referrals, force=False):
+        from unittest import mock
+        from analytics.batch_predictor import BatchPredictor
+        from analytics.prediction_store import refresh_referral_predictions
+
+        with mock.patch.object(BatchPredictor, 'score_diseases_batch',
+                               side_effect=lambda batch: {r.referral_id: ('A09', 0.8) for r in batch}), \
+                mock.patch.object(BatchPredictor, 'predict_times_batch',
+                                  side_effect=lambda batch: {r.referral_id: 45.0 for r in batch}):
+            return refresh_referral_predictions(referrals, force=force)
+
+    def test_refresh_skips_unchanged(self):
+        from analytics.models import ReferralPrediction
+
+        self.assertEqual(self._refresh(self.referrals), 2)
+        self.assertEqual(ReferralPrediction.objects.count(), 2)
+        self.assertEqual(self._refresh(self.referrals), 0)
+
+        self.referrals[1].symptoms = 'diarrhea'
+        self.assertEqual(self._refresh(self.referrals), 1)
+        self.assertEqual(self._refresh(self.referrals, force=True), 2)
+        self.assertEqual(ReferralPrediction.objects.count(), 2)
+
+    def test_stored_predictions_read_from_join(self):
+        from analytics.prediction_store import get_stored_predictions
+
+        self._refresh(self.referrals)
+        referrals = list(Referral.objects.select_related('patient', 'prediction').filter(
+            referral_id__in=[r.referral_id for r in self.referrals]
+        ))
+        with self.assertNumQueries(0):
+            predictions = get_stored_predictions(referrals)
+        self.assertEqual(predictions[self.referrals[0].referral_id], ('A09', 45.0))
+
+
+class SeverityIndexTestCase(TestCase):
+    """Tests for the cached ICD -> critical level index (analytics.severity_index)"""
+
+    def setUp(self):
+        from analytics.severity_index import SeverityIndex
+
+        SeverityIndex.invalidate()
+        Disease.objects.create(name='Hypertension Level 2', icd_code='I10-1', description='-', critical_level='high')
+        Disease.objects.create(name='Pneumonia', icd_code='J15', description='-', critical_level='medium')
+
+    def test_canonical_variants_resolve(self):
+        from analytics.severity_index import SeverityIndex
+
+        index = SeverityIndex.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(SeverityIndex.severity_order('I10.1', index), 0)
+            self.assertEqual(SeverityIndex.severity_order(' i10-1 ', index), 0)
+            self.assertEqual(SeverityIndex.severity('J15', index), 'Medium')
+            self.assertEqual(SeverityIndex.severity_order('No prediction available', index), 3)
+            self.assertEqual(SeverityIndex.severity_order('Z99', index), 3)
+
+    def test_invalidated_on_disease_changes(self):
+        from analytics.severity_index import SeverityIndex
+
+        self.assertEqual(SeverityIndex.severity('J15'), 'Medium')
+        disease = Disease.objects.get(icd_code='J15')
+        disease.critical_level = 'low'
+        disease.save()
+        self.assertEqual(SeverityIndex.severity('J15'), 'Low')
+        disease.delete()
+        self.assertEqual(SeverityIndex.severity('J15'), 'Unspecified')
+
+    def test_expires_for_other_processes(self):
+        from unittest import mock
+        from analytics.severity_index import SEVERITY_INDEX_CACHE_TIMEOUT, SeverityIndex
+
+        # Another worker's write only invalidates its own cache; ours must expire
+        with mock.patch('analytics.severity_index.cache') as cache:
+            cache.get.return_value = None
+            SeverityIndex.get()
+        self.assertEqual(cache.set.call_args.args[2], SEVERITY_INDEX_CACHE_TIMEOUT)
+        self.assertIsNotNone(SEVERITY_INDEX_CACHE_TIMEOUT)
+
+
+class BarangayFacilityIndexTestCase(TestCase):
+    """Tests for the cached barangay -> facility match index (analytics.barangay_index)"""
+
+    def setUp(self):
+        from analytics.barangay_index import BarangayFacilityIndex
+        from facilities.models import Barangay
+
+        BarangayFacilityIndex.invalidate()
+        Barangay.objects.create(name='Carcor')
+        Facility.objects.create(name='Carcor Health Station', assigned_bhw='BHW', latitude=7.1, longitude=125.1)
+        Facility.objects.create(name='Purok 5 BHS', assigned_bhw='BHW', barangay='carcor', latitude=7.2, longitude=125.2)
+        Facility.objects.create(name='Mesaoy BHS', assigned_bhw='BHW', latitude=7.3, longitude=125.3)
+
+    def test_lookup_matches_name_and_barangay_fields(self):
+        from analytics.barangay_index import BarangayFacilityIndex
+
+        index = BarangayFacilityIndex.get()
+        with self.assertNumQueries(0):
+            coordinates = BarangayFacilityIndex.coordinates('CARCOR', index)
+            # Not a known key: falls back to scanning the indexed facilities
+            self.assertEqual(BarangayFacilityIndex.coordinates('mesaoy', index),
+                             [{'lat': 7.3, 'lng': 125.3, 'facility_name': 'Mesaoy BHS'}])
+            self.assertEqual(BarangayFacilityIndex.coordinates('New Cortez', index), [])
+        self.assertEqual([c['facility_name'] for c in coordinates], ['Carcor Health Station', 'Purok 5 BHS'])
+        latitudes, longitudes = BarangayFacilityIndex.coordinate_arrays('Carcor', index)
+        np.testing.assert_array_equal(latitudes, [7.1, 7.2])
+        np.testing.assert_array_equal(longitudes, [125.1, 125.2])
+
+    def test_rebuilt_on_facility_changes(self):
+        from analytics.barangay_index import BarangayFacilityIndex
+
+        version = BarangayFacilityIndex.get()['version']
+        Facility.objects.create(name='Carcor Annex', assigned_bhw='BHW', latitude=7.4, longitude=125.4)
+        index = BarangayFacilityIndex.get()
+        self.assertNotEqual(index['version'], version)
+        self.assertEqual(len(BarangayFacilityIndex.coordinates('Carcor', index)), 3)
+
+    def test_expires_for_other_processes(self):
+        from unittest import mock
+        from analytics.barangay_index import BARANGAY_FACILITY_INDEX_CACHE_TIMEOUT, BarangayFacilityIndex
+
+        with mock.patch('analytics.barangay_index.cache') as cache:
+            cache.get.return_value = None
+            BarangayFacilityIndex.get()
+        self.assertEqual(cache.set.call_args.args[2], BARANGAY_FACILITY_INDEX_CACHE_TIMEOUT)
+        self.assertIsNotNone(BARANGAY_FACILITY_INDEX_CACHE_TIMEOUT)
+
+
+class SeverityKeysetPaginationTestCase(TestCase):
+    """Tests for SQL severity ordering + keyset pages over stored predictions"""
+
+    def setUp(self):
+        from analytics.models import ReferralPrediction
+        from analytics.severity_index import SeverityIndex
+
+        SeverityIndex.invalidate()
+        Disease.objects.create(name='Hypertension Level 2', icd_code='I10-1', description='-', critical_level='high')
+        Disease.objects.create(name='Open Wounds', icd_code='T14.1', description='-', critical_level='low')
+
+        user = User.objects.create_user(username='pageuser', password='testpass123')
+        facility = Facility.objects.create(name='Page Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        patient = Patient.objects.create(
+            first_name='Ana', last_name='Cruz', p_address='Street', p_number='09123456789',
+            user=user, date_of_birth=date(1970, 1, 1), sex='Female', facility=facility
+        )
+        codes = ['T14.1', 'I10.1', 'No prediction', 'I10.1', 'T14.1']
+        self.referrals = []
+        for code in codes:
+            referral = Referral.objects.create(
+                facility=facility, user=user, patient=patient,
+                weight=Decimal('60.0'), height=Decimal('160.0'), bp_systolic=120, bp_diastolic=80,
+                pulse_rate=70, respiratory_rate=16, temperature=Decimal('37.0'), oxygen_saturation=98,
+                chief_complaint='-', symptoms='-', work_up_details='-', initial_diagnosis='-'
+            )
+            ReferralPrediction.objects.create(
+                referral=referral, icd_code=code, feature_hash='-', model_version='-'
+            )
+            self.referrals.append(referral)
+
+    def test_keyset_pages_follow_severity_order(self):
+        from referrals.query_optimizer import SeverityKeysetPaginator
+
+        paginator = SeverityKeysetPaginator(Referral.objects.all(), per_page=2)
+        seen = []
+        cursor = None
+        while True:
+            page = paginator.get_page(cursor)
+            seen.extend((r.severity_order, r.referral_id) for r in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        r = [ref.referral_id for ref in self.referrals]
+        # High (newest first) -> Low (newest first) -> Unspecified
+        self.assertEqual(seen, [(0, r[3]), (0, r[1]), (2, r[4]), (2, r[0]), (3, r[2])])
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        from referrals.query_optimizer import SeverityKeysetPaginator
+
+        paginator = SeverityKeysetPaginator(Referral.objects.all(), per_page=2)
+        first = [r.referral_id for r in paginator.get_page()]
+        for cursor in ['0_100000000000000000000_1', '0_0_100000000000000000000', '9_0_1', 'x_y_z']:
+            self.assertEqual([r.referral_id for r in paginator.get_page(cursor)], first)
+
+    def test_paginators_share_cursor_validation(self):
+        from referrals.query_optimizer import SeverityKeysetPaginator, CreatedKeysetPaginator
+
+        severity = SeverityKeysetPaginator(Referral.objects.all(), per_page=2)
+        created = CreatedKeysetPaginator(Referral.objects.all(), per_page=2)
+        self.assertIsNotNone(severity.decode_cursor(severity.get_page().next_cursor))
+        self.assertIsNotNone(created.decode_cursor(created.get_page().next_cursor))
+        for cursor in ['', '1', '1_2_3_4', '1__2', '100000000000000000000_1', f'0_{2 ** 31}', '0_0']:
+            self.assertIsNone(created.decode_cursor(cursor), cursor)
+            self.assertIsNone(severity.decode_cursor(f'0_{cursor}'), cursor)
+        self.assertIsNone(severity.decode_cursor('4_0_1'))
+
+    def test_cursor_params_select_the_tab(self):
+        from django.test import RequestFactory
+        from referrals.views import page_requested
+
+        factory = RequestFactory()
+        self.assertTrue(page_requested(factory.get('/', {'active_after': '0_0_1'}), 'active'))
+        self.assertTrue(page_requested(factory.get('/', {'active_page': '2'}), 'active'))
+        self.assertFalse(page_requested(factory.get('/', {'pending_after': '0_0_1'}), 'active'))
+
+
+class LatestMedicalHistoryLoaderTestCase(TestCase):
+    """Tests for ReferralQueryOptimizer.latest_medical_history / attach_medical_history"""
+
+    def setUp(self):
+        from patients.models import Medical_History
+
+        user = User.objects.create_user(username='mhuser', password='testpass123')
+        facility = Facility.objects.create(name='MH Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        patient = Patient.objects.create(
+            first_name='Ben', last_name='Reyes', p_address='Street', p_number='09123456789',
+            user=user, date_of_birth=date(1980, 1, 1), sex='Male', facility=facility
+        )
+        self.referrals = [
+            Referral.objects.create(
+                facility=facility, user=user, patient=patient,
+                weight=Decimal('60.0'), height=Decimal('160.0'), bp_systolic=120, bp_diastolic=80,
+                pulse_rate=70, respiratory_rate=16, temperature=Decimal('37.0'), oxygen_saturation=98,
+                chief_complaint='-', symptoms='-', work_up_details='-', initial_diagnosis='-'
+            )
+            for _ in range(2)
+        ]
+        for days, notes in [(10, 'old notes'), (1, 'latest notes'), (5, 'middle notes')]:
+            Medical_History.objects.create(
+                user_id=user, patient_id=patient, illness_name='Flu', notes=notes, advice='rest',
+                diagnosed_date=date.today() - timedelta(days=days), referral=self.referrals[0]
+            )
+
+    def test_attaches_latest_history_in_one_query(self):
+        from referrals.query_optimizer import ReferralQueryOptimizer
+
+        with self.assertNumQueries(1):
+            ReferralQueryOptimizer.attach_medical_history(self.referrals)
+
+        with_history, without_history = self.referrals
+        self.assertEqual(with_history.medical_history_notes, 'latest notes')
+        self.assertEqual(with_history.medical_history_advice, 'rest')
+        self.assertEqual(with_history.medical_history_count, 3)
+        self.assertIsNone(without_history.medical_history_notes)
+        self.assertEqual(without_history.medical_history_count, 0)
+
+
+class ReferralStatisticsTestCase(TestCase):
+    """Tests for the grouped, memoized get_referral_statistics endpoint"""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.admin = User.objects.create_user(username='statsadmin', password='testpass123', is_staff=True)
+        self.facilities = [
+            Facility.objects.create(name=name, assigned_bhw='BHW', latitude=0, longitude=0)
+            for name in ('Stats A', 'Stats B')
+        ]
+        self.patients = [
+            Patient.objects.create(
+                first_name='Ana', last_name='Cruz', p_address='Street', p_number='09123456789',
+                user=self.admin, date_of_birth=date(1970, 1, 1), sex='Female', facility=facility
+            )
+            for facility in self.facilities
+        ]
+        # (patient index, created_at)
+        for index, created in [(0, datetime(2024, 1, 15, 10)), (0, datetime(2024, 1, 20, 10)),
+                               (1, datetime(2024, 3, 5, 10)), (1, datetime(2023, 6, 1, 10))]:
+            self.create_referral(index, created)
+
+    def create_referral(self, index, created):
+        from django.utils import timezone
+
+        referral = Referral.objects.create(
+            facility=self.facilities[index], user=self.admin, patient=self.patients[index],
+            weight=Decimal('60.0'), height=Decimal('160.0'), bp_systolic=120, bp_diastolic=80,
+            pulse_rate=70, respiratory_rate=16, temperature=Decimal('37.0'), oxygen_saturation=98,
+            chief_complaint='-', symptoms='-', work_up_details='-', initial_diagnosis='-'
+        )
+        Referral.objects.filter(pk=referral.pk).update(created_at=timezone.make_aware(created))
+        return referral
+
+    def get_stats(self, **params):
+        import json
+        from django.test import RequestFactory
+        from analytics.views import get_referral_statistics
+
+        request = RequestFactory().get('/analytics/api/referral-statistics/', params)
+        request.user = self.admin
+        response = get_referral_statistics(request)
+        return {d['label']: d['data'] for d in json.loads(response.content)['datasets']}
+
+    def test_monthly_and_yearly_counts_per_facility(self):
+        monthly = self.get_stats(year=2024, view_type='monthly')
+        self.assertEqual(monthly['Stats A'], [2] + [0] * 11)
+        self.assertEqual(monthly['Stats B'], [0, 0, 1] + [0] * 9)
+
+        yearly = self.get_stats(year=2024, view_type='yearly')
+        self.assertEqual(yearly['Stats A'], [0, 0, 0, 2])
+        self.assertEqual(yearly['Stats B'], [0, 0, 1, 1])
+
+    def test_date_window_is_clipped_in_sql(self):
+        monthly = self.get_stats(year=2024, view_type='monthly', date_from='2024-01-16', date_to='2024-02-28')
+        self.assertEqual(monthly['Stats A'], [1] + [0] * 11)
+        self.assertEqual(monthly['Stats B'], [0] * 12)
+
+    def test_memoized_until_next_referral_write(self):
+        self.get_stats(year=2024, view_type='monthly')
+        with self.assertNumQueries(0):
+            self.get_stats(year=2024, view_type='monthly')
+
+        self.create_referral(1, datetime(2024, 3, 6, 10))
+        self.assertEqual(self.get_stats(year=2024, view_type='monthly')['Stats B'], [0, 0, 2] + [0] * 9)
+
+    def test_memo_follows_patient_facility_and_membership(self):
+        self.assertEqual(self.get_stats(year=2024, view_type='monthly')['Stats B'], [0, 0, 1] + [0] * 9)
+        patient = self.patients[0]
+        patient.facility = self.facilities[1]
+        patient.save()
+        self.assertEqual(self.get_stats(year=2024, view_type='monthly')['Stats B'], [2, 0, 1] + [0] * 9)
+
+        member = User.objects.create_user(username='statsmember', password='testpass123')
+        self.admin = member
+        self.assertEqual(self.get_stats(year=2024, view_type='monthly'), {'My Referrals': [0] * 12})
+        self.facilities[0].users.add(member)
+        self.assertEqual(self.get_stats(year=2024, view_type='monthly'), {'My Referrals': [2] + [0] * 11})
+
+
+class TimeToCaterFeaturePipelineTestCase(TestCase):
+    """Tests for the shared sparse time-to-cater feature pipeline"""
+
+    def setUp(self):
+        self.frame = pd.DataFrame({
+            'COMPLAINTS': ['fever and cough', 'head ache, dizzy', 'dog bite on leg', 'fever with chills', None],
+            'DIAGNOSIS': ['URTI', 'Hypertension', 'Animal bite', 'URTI', None],
+            'AGE': [30, 62, 8, 45, None],
+            'SEX': ['M', 'F', 'Male', 'female', None],
+        })
+
+    def test_emits_csr_with_fixed_layout(self):
+        from scipy import sparse
+        from analytics.time_features import TimeToCaterFeaturePipeline
+
+        pipeline = TimeToCaterFeaturePipeline(tfidf_params={'min_df': 1})
+        X_train = pipeline.fit_transform(self.frame)
+        self.assertTrue(sparse.isspmatrix_csr(X_train))
+        self.assertEqual(X_train.shape, (5, pipeline.n_features))
+
+        # One row at a time and a whole batch go through the same transform
+        X_batch = pipeline.transform(self.frame)
+        for i in range(len(self.frame)):
+            X_single = pipeline.transform(self.frame.iloc[[i]])
+            self.assertTrue(np.allclose(X_single.toarray(), X_batch[i].toarray()))
+
+        # Unseen diagnosis encodes to 0 instead of failing
+        unseen = self.frame.iloc[[0]].assign(DIAGNOSIS='Never seen')
+        self.assertEqual(pipeline.transform(unseen).shape, (1, pipeline.n_features))
+
+    def test_predictions_are_clamped(self):
+        from unittest import mock
+        from analytics.time_features import TimeToCaterFeaturePipeline, MIN_TIME_HOURS, MAX_TIME_HOURS
+
+        pipeline = TimeToCaterFeaturePipeline(tfidf_params={'min_df': 1}).fit(self.frame)
+        model = mock.Mock()
+        model.predict.return_value = np.array([-1.0, 2.0, 9.0, 1.0, 0.5])
+        hours = pipeline.predict_hours(model, self.frame)
+        self.assertEqual(list(hours), [MIN_TIME_HOURS, 2.0, MAX_TIME_HOURS, 1.0, 0.5])
+
+    def test_infant_age_is_kept_and_missing_age_uses_the_training_median(self):
+        from types import SimpleNamespace
+        from unittest import mock
+        from analytics.time_features import TimeToCaterFeaturePipeline, referrals_to_time_frame
+
+        pipeline = TimeToCaterFeaturePipeline(tfidf_params={'min_df': 1}).fit(self.frame)
+        infant = SimpleNamespace(age=0, sex='F')
+        referrals = [
+            SimpleNamespace(symptoms='fever and cough', final_diagnosis='URTI', initial_diagnosis=None, patient=patient)
+            for patient in (infant, None)
+        ]
+        frame = referrals_to_time_frame(referrals)
+        self.assertEqual(frame['AGE'].iloc[0], 0)
+        self.assertTrue(pd.isna(frame['AGE'].iloc[1]))
+
+        model = mock.Mock()
+        model.predict.side_effect = lambda X: np.zeros(X.shape[0])
+        pipeline.predict_hours(model, frame)
+        X = model.predict.call_args[0][0].toarray()
+        expected = pipeline.transform(frame.assign(AGE=[0, pipeline.age_fill])).toarray()
+        self.assertTrue(np.allclose(X, expected))
+        # The infant is not encoded as the old 30-year default
+        self.assertFalse(np.allclose(X[0], pipeline.transform(frame.iloc[[0]].assign(AGE=30)).toarray()[0]))
+
+    def test_model_is_published_inside_the_pipeline(self):
+        import tempfile
+        from sklearn.linear_model import LinearRegression
+        from analytics.model_manager import MLModelManager
+        from analytics.time_features import (
+            TimeToCaterFeaturePipeline, save_time_model, load_time_feature_pipeline, load_time_model,
+            TIME_MODEL_ARTIFACT,
+        )
+
+        base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, base_dir, ignore_errors=True)
+        self.addCleanup(ModelRegistry.evict)
+        ModelRegistry.evict()
+
+        pipeline = TimeToCaterFeaturePipeline(tfidf_params={'min_df': 1})
+        X = pipeline.fit_transform(self.frame)
+        model = LinearRegression().fit(X, np.arange(len(self.frame), dtype=float))
+        with self.settings(BASE_DIR=base_dir):
+            # An older training left a separate model file; the pipeline's own model wins
+            ModelRegistry.save(LinearRegression(), TIME_MODEL_ARTIFACT)
+            save_time_model(model, pipeline)
+
+            loaded = load_time_feature_pipeline()
+            self.assertTrue(np.allclose(load_time_model(loaded).coef_, model.coef_))
+            models = MLModelManager.get_models()
+            self.assertTrue(np.allclose(models['time_model'].coef_, model.coef_))
+            self.assertTrue(np.allclose(
+                models['time_pipeline'].predict_hours(models['time_model'], self.frame),
+                pipeline.predict_hours(model, self.frame),
+            ))
+
+
+class ClinicalTextNormalizerTestCase(TestCase):
+    """The compiled normalizer must match the rule-by-rule implementations exactly"""
+
+    SAMPLES = [
+        'Lagnat ug ubo x 3 days', 'nasamad sa point of injury', 'POI: dogbite sa tiyan',
+        'hilanat, labad ulo', 'High temp, head ache and dizzy', 'ache & vomit after toi',
+        'hear the cold earache, chest pain', '', None, float('nan'), 'bp 140/90 suka',
+    ]
+
+    def test_matches_sequential_rules(self):
+        import re
+        from analytics.ml_utils import (
+            COMPLAINT_TRANSLATIONS, COMPLAINT_STOPWORDS, MEDICAL_SYNONYMS, MEDICAL_KEYWORDS,
+            get_text_normalizer,
+        )
+
+        def sequential_tokens(text):
+            cleaned = re.sub(r'[^a-z\s]', ' ', '' if pd.isna(text) else str(text).lower())
+            for source, target in COMPLAINT_TRANSLATIONS.items():
+                cleaned = cleaned.replace(source, target)
+            return [w for w in cleaned.split() if w not in COMPLAINT_STOPWORDS and len(w) > 1]
+
+        def sequential_preprocess(text):
+            if pd.isna(text) or text == '':
+                return ''
+            text = str(text).lower().strip()
+            for pattern, replacement in MEDICAL_SYNONYMS.items():
+                text = re.sub(pattern, replacement, text)
+            return ' '.join(re.sub(r'[^a-z0-9\s]', ' ', text).split())
+
+        normalizer = get_text_normalizer()
+        for text in self.SAMPLES:
+            self.assertEqual(normalizer.tokenize(text), sequential_tokens(text), text)
+            preprocessed = sequential_preprocess(text)
+            self.assertEqual(normalizer.preprocess(text), preprocessed, text)
+            self.assertEqual(
+                normalizer.keyword_flags(preprocessed),
+                tuple(int(k in preprocessed) for k in MEDICAL_KEYWORDS), text
+            )
+
+        # Batch paths, including a text holding the join separator (per-text fallback)
+        for series in (pd.Series(self.SAMPLES * 2), pd.Series(self.SAMPLES + ['ubo\x00sakit ng ulo'])):
+            self.assertEqual(normalizer.tokenize_series(series).tolist(), [sequential_tokens(t) for t in series])
+            np.testing.assert_array_equal(
+                normalizer.keyword_matrix(series),
+                [[int(k in ('' if pd.isna(t) else str(t))) for k in MEDICAL_KEYWORDS] for t in series]
+            )
+
+
+class DiseaseFeatureLayoutTestCase(TestCase):
+    """Tests for the sparse ICD-10 classifier design matrix"""
+
+    def setUp(self):
+        from sklearn.preprocessing import MultiLabelBinarizer
+        from analytics.ml_utils import NO_COMPLAINT_TOKEN
+
+        mlb = MultiLabelBinarizer().fit([['cough', 'fever'], ['bite', 'dog'], [NO_COMPLAINT_TOKEN]])
+        self.metadata = {
+            'mlb': mlb,
+            'mlb_classes': list(mlb.classes_),
+            'symptom_columns': [f'SYM_{c}' for c in mlb.classes_],
+            'sex_columns': ['SEX_F', 'SEX_M', 'SEX_Unknown'],
+            # SYM_bite dropped from the final layout on purpose
+            'feature_columns': ['AGE', 'SEX_F', 'SEX_M', 'SEX_Unknown', f'SYM_{NO_COMPLAINT_TOKEN}',
+                                'SYM_cough', 'SYM_dog', 'SYM_fever'],
+            'default_age': 31.0,
+        }
+
+    def test_matrix_matches_column_layout(self):
+        from scipy import sparse
+        from analytics.disease_features import get_disease_feature_layout
+
+        layout = get_disease_feature_layout(self.metadata)
+        self.assertIs(layout, get_disease_feature_layout(self.metadata))
+
+        tokens = [layout.tokens('Lagnat ug ubo ubo'), layout.tokens('paak sa iro'), layout.tokens('zzz')]
+        self.assertEqual(tokens, [['fever', 'cough', 'cough'], ['bite', 'dog'], ['__no_symptom__']])
+
+        matrix = layout.transform([40, None, 0], ['M', 'Unknown', 'X'], tokens)
+        self.assertTrue(sparse.isspmatrix_csr(matrix))
+        self.assertEqual(matrix.toarray().tolist(), [
+            [40.0, 0, 1, 0, 0, 1, 0, 1],
+            [31.0, 0, 0, 1, 0, 0, 1, 0],
+            [0.0, 0, 0, 0, 1, 0, 0, 0],
+        ])
+
+    def test_predict_matches_model_predict(self):
+        from sklearn.ensemble import GradientBoostingClassifier
+        from analytics.disease_features import DiseaseFeatureLayout
+
+        layout = DiseaseFeatureLayout(self.metadata)
+        texts = ['lagnat ubo', 'paak iro', 'ubo', 'iro', 'lagnat', 'paak']
+        X = layout.transform([20, 30, 40, 50, 60, 70], ['M', 'F'] * 3, [layout.tokens(t) for t in texts])
+        model = GradientBoostingClassifier(n_estimators=5, random_state=0).fit(X, ['J06.9', 'W54.99'] * 3)
+
+        predictions, probabilities = DiseaseFeatureLayout.predict(model, X)
+        self.assertEqual(list(predictions), list(model.predict(X)))
+        self.assertTrue(np.array_equal(probabilities, model.predict_proba(X)))
+
+
+class BarangayPeakSummaryTestCase(TestCase):
+    """Tests for the vectorized barangay peak result assembly"""
+
+    def test_ties_missing_models_and_rounding(self):
+        from analytics.ml_utils import summarize_barangay_peaks
+
+        forecast = np.full((2, 3, 12), np.nan)
+        forecast[0, 0] = 2.4   # rounds to 2
+        forecast[0, 2] = 2.5   # rounds half to even: 2, ties with the first disease
+        forecast[0, 2, 11] = -3.0
+        results = summarize_barangay_peaks(['A', 'B'], ['J06.9', 'I10.1', 'Z00'], forecast)
+
+        self.assertEqual(results['A'][1], {
+            'peak_disease': 'J06.9', 'peak_cases': 2, 'all_diseases': {'J06.9': 2, 'Z00': 2},
+        })
+        self.assertEqual(results['A'][12]['all_diseases'], {'J06.9': 2, 'Z00': 0})
+        self.assertEqual(results['B'][6], {'peak_disease': None, 'peak_cases': 0, 'all_diseases': {}})
+        self.assertIsInstance(results['A'][1]['peak_cases'], int)
+
+
+class ForecastCacheTestCase(TestCase):
+    """Tests for the model-versioned forecast cache keys (analytics.forecast_cache)"""
+
+    def setUp(self):
+        import tempfile
+        from django.core.cache import cache
+        from django.test import override_settings
+
+        self.base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base_dir, ignore_errors=True)
+        settings_override = override_settings(BASE_DIR=self.base_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        ModelRegistry.evict()
+        self.addCleanup(ModelRegistry.evict)
+
+    def save_forecast(self, cases):
+        from analytics.peak_training import (
+            BARANGAY_PEAK_MODELS_ARTIFACT, BARANGAY_PEAK_METADATA_ARTIFACT, BARANGAY_FORECAST_ARTIFACT,
+        )
+
+        ModelRegistry.save({'A': {}}, BARANGAY_PEAK_MODELS_ARTIFACT)
+        ModelRegistry.save({'barangays': ['A'], 'diseases': ['J06.9']}, BARANGAY_PEAK_METADATA_ARTIFACT)
+        ModelRegistry.save(np.full((1, 1, 12), float(cases)), BARANGAY_FORECAST_ARTIFACT)
+
+    def test_retrain_switches_to_new_keys(self):
+        from unittest import mock
+        from analytics.forecast_cache import forecast_cache_key, warm_forecast_caches
+        from analytics.ml_utils import predict_barangay_disease_peak_2025
+
+        self.save_forecast(5)
+        first_key = forecast_cache_key('barangay_predictions', 'all')
+        self.assertEqual(predict_barangay_disease_peak_2025()['A'][1]['peak_cases'], 5)
+
+        # A retrain replaces the artifacts; nothing is cleared by hand
+        self.save_forecast(12)
+        self.assertNotEqual(forecast_cache_key('barangay_predictions', 'all'), first_key)
+
+        warmed = warm_forecast_caches()
+        self.assertEqual(set(warmed), {'barangay_peaks'})
+        self.assertEqual(warmed['barangay_peaks']['A'][1]['peak_cases'], 12)
+        with mock.patch('analytics.ml_utils.load_barangay_forecast_table') as load:
+            self.assertEqual(predict_barangay_disease_peak_2025()['A'][1]['peak_cases'], 12)
+        load.assert_not_called()
+
+
+class DatasetCacheTestCase(TestCase):
+    """Tests for the columnar sample_datasets cache (analytics.dataset_cache)"""
+
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        settings_override = override_settings(BASE_DIR=self.tmp_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.csv_path = os.path.join(self.tmp_dir, 'sample.csv')
+        self.write_csv('DATE,AGE,SEX,COMPLAINTS,ICD10 CODE\n'
+                       '2024-01-02,30,M,ubo,J06.9\n2024-01-03,,F,,\n2024-02-01,5,F,paak \xf1,W54.99\n')
+
+    def write_csv(self, content):
+        with open(self.csv_path, 'w', encoding='latin1') as f:
+            f.write(content)
+
+    def test_round_trip_and_rebuild_on_change(self):
+        from unittest import mock
+        from analytics.dataset_cache import cached_frame, DATASET_CACHE_DIR
+
+        def build():
+            df = pd.read_csv(self.csv_path, encoding='latin1')
+            df['DATE'] = pd.to_datetime(df['DATE'])
+            return df
+
+        builder = mock.Mock(side_effect=build)
+        first = cached_frame('sample', [self.csv_path], builder)
+        cached = cached_frame('sample', [self.csv_path], builder)
+        self.assertEqual(builder.call_count, 1)
+        pd.testing.assert_frame_equal(cached, first)
+        self.assertEqual(cached.loc[2, 'COMPLAINTS'], 'paak \xf1')
+
+        # The returned frame is the caller's to modify
+        cached.loc[0, 'AGE'] = 99
+        self.assertEqual(cached_frame('sample', [self.csv_path], builder).loc[0, 'AGE'], 30)
+
+        self.write_csv('DATE,AGE,SEX,COMPLAINTS,ICD10 CODE\n2025-01-01,40,M,lagnat,J06.9\n')
+        rebuilt = cached_frame('sample', [self.csv_path], builder)
+        self.assertEqual(builder.call_count, 2)
+        self.assertEqual(list(rebuilt['AGE']), [40])
+        # Only the entry for the current CSV is kept
+        self.assertEqual(len(os.listdir(os.path.join(self.tmp_dir, 'ml_models', DATASET_CACHE_DIR))), 1)
+
+
+class PeakTrainingTestCase(TestCase):
+    """Tests for the grouped, parallel barangay peak training (analytics.peak_training)"""
+
+    def setUp(self):
+        rows = []
+        for barangay, disease, months in [('A', 'J06.9', 6), ('A', 'I10.1', 2), ('B', 'J06.9', 4)]:
+            for month in range(1, months + 1):
+                rows.append({'SITIO/BARANGAY': barangay, 'ICD10 CODE': disease,
+                             'YEAR': 2024, 'MONTH': month, 'CASE_COUNT': month * 2})
+        self.trends = pd.DataFrame(rows)
+
+    def test_resolve_training_workers(self):
+        from analytics.peak_training import resolve_training_workers
+
+        self.assertEqual(resolve_training_workers(8, n_tasks=3), 3)
+        self.assertEqual(resolve_training_workers(2, n_tasks=0), 1)
+        with self.settings(ML_TRAINING_WORKERS=2):
+            self.assertEqual(resolve_training_workers(n_tasks=10), 2)
+
+    def test_parallel_fit_matches_serial(self):
+        from analytics.peak_training import fit_group_models
+
+        from unittest import mock
+
+        args = (self.trends, ['SITIO/BARANGAY', 'ICD10 CODE'], ['YEAR', 'MONTH'], 'CASE_COUNT')
+        # One worker (the web request path) fits in-process, without a pool
+        with mock.patch('analytics.peak_training.joblib.Parallel') as pool:
+            serial, timings, workers = fit_group_models(*args, n_workers=1)
+        pool.assert_not_called()
+        parallel, _, _ = fit_group_models(*args, n_workers=2)
+
+        # Groups under MIN_GROUP_ROWS rows get no model
+        self.assertEqual(set(serial), {('A', 'J06.9'), ('B', 'J06.9')})
+        self.assertEqual(workers, 1)
+        self.assertEqual([t['rows'] for t in timings], [6, 4])
+        future = pd.DataFrame({'YEAR': [2025] * 12, 'MONTH': range(1, 13)})
+        for key, model in serial.items():
+            np.testing.assert_array_equal(model.predict(future), parallel[key].predict(future))
+
+    def test_prediction_reads_forecast_table(self):
+        import tempfile
+        from analytics.ml_utils import predict_barangay_disease_peak_2025
+        from analytics.peak_training import (
+            fit_group_models, build_forecast_table, BARANGAY_PEAK_MODELS_ARTIFACT,
+            BARANGAY_PEAK_METADATA_ARTIFACT, BARANGAY_FORECAST_ARTIFACT,
+        )
+
+        base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, base_dir, ignore_errors=True)
+        self.addCleanup(ModelRegistry.evict)
+        ModelRegistry.evict()
+
+        fitted, _, _ = fit_group_models(
+            self.trends, ['SITIO/BARANGAY', 'ICD10 CODE'], ['YEAR', 'MONTH'], 'CASE_COUNT', n_workers=1
+        )
+        models_dict = {'A': {'J06.9': fitted[('A', 'J06.9')]}, 'B': {'J06.9': fitted[('B', 'J06.9')]}}
+        barangays, diseases = ['A', 'B'], ['J06.9', 'I10.1']
+        with self.settings(BASE_DIR=base_dir):
+            ModelRegistry.save(models_dict, BARANGAY_PEAK_MODELS_ARTIFACT)
+            ModelRegistry.save({'barangays': barangays, 'diseases': diseases}, BARANGAY_PEAK_METADATA_ARTIFACT)
+            ModelRegistry.save(build_forecast_table(models_dict, barangays, diseases), BARANGAY_FORECAST_ARTIFACT)
+
+            results = predict_barangay_disease_peak_2025(target_barangays=['a'])
+            # The forests are never unpickled
+            self.assertNotIn(BARANGAY_PEAK_MODELS_ARTIFACT, ModelRegistry._artifacts)
+
+        expected = models_dict['A']['J06.9'].predict(pd.DataFrame({'YEAR': [2025] * 12, 'MONTH': range(1, 13)}))
+        self.assertEqual(list(results), ['A'])
+        for month in range(1, 13):
+            self.assertEqual(results['A'][month]['all_diseases'], {'J06.9': max(0, int(round(expected[month - 1])))})
+
+
+class RollupsTestCase(TestCase):
+    """Tests for the daily referral/morbidity rollups (analytics.rollups)"""
+
+    def setUp(self):
+        from unittest import mock
+
+        # The referral post_save also stores model predictions; not under test here
+        patcher = mock.patch('analytics.prediction_store.refresh_referral_predictions')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(username='rollupuser', password='testpass123')
+        self.facility = Facility.objects.create(name='Rollup Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        self.patient = Patient.objects.create(
+            first_name='Ana', last_name='Cruz', p_address='Street', p_number='09123456789',
+            user=self.user, date_of_birth=date(1992, 3, 3), sex='Female', facility=self.facility
+        )
+
+    def _referral(self, status='pending'):
+        return Referral.objects.create(
+            facility=self.facility, user=self.user, patient=self.patient, status=status,
+            weight=Decimal('55.0'), height=Decimal('158.0'), bp_systolic=110, bp_diastolic=70,
+            pulse_rate=72, respiratory_rate=16, temperature=Decimal('36.8'), oxygen_saturation=99,
+            chief_complaint='bite', symptoms='wound', work_up_details='-', initial_diagnosis='-'
+        )
+
+    def _history(self, referral, illness, diagnosed_date):
+        from patients.models import Medical_History
+
+        return Medical_History.objects.create(
+            user_id=self.user, patient_id=self.patient, referral=referral, illness_name=illness,
+            diagnosed_date=diagnosed_date, notes='-', advice='-'
+        )
+
+    def _referral_counts(self, **filters):
+        from django.db.models import Sum
+        from analytics.rollups import referral_rollup
+
+        return {
+            row['status']: row['total']
+            for row in referral_rollup(**filters).values('status').annotate(total=Sum('count'))
+        }
+
+    def _morbidity_counts(self, **filters):
+        from django.db.models import Sum
+        from analytics.rollups import morbidity_rollup
+
+        return {
+            row['illness']: row['total']
+            for row in morbidity_rollup(**filters).values('illness').annotate(total=Sum('count'))
+        }
+
+    def test_signals_keep_rollups_in_step(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self._referral()
+            self._referral()
+            self._history(first, ' Dog Bite ', date(2025, 3, 1))
+            self._history(None, 'dog bite', date(2025, 3, 1))
+
+        self.assertEqual(self._referral_counts(), {'pending': 2})
+        self.assertEqual(self._morbidity_counts(diagnosed_date__year=2025), {'dog bite': 2})
+        self.assertEqual(self._morbidity_counts(referral__status='completed'), {})
+
+        # Completing the referral moves its day's counts and its medical history's status
+        with self.captureOnCommitCallbacks(execute=True):
+            first.status = 'completed'
+            first.examined_by = self.user
+            first.save()
+
+        self.assertEqual(self._referral_counts(), {'pending': 1, 'completed': 1})
+        self.assertEqual(self._referral_counts(examined_by=self.user, status='completed'), {'completed': 1})
+        self.assertEqual(self._morbidity_counts(referral__status='completed'), {'dog bite': 1})
+
+        # Moving a medical history to another date refreshes both days
+        history = first.medical_history.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            history.diagnosed_date = date(2025, 4, 2)
+            history.save()
+        self.assertEqual(self._morbidity_counts(diagnosed_date__month=3), {'dog bite': 1})
+        self.assertEqual(self._morbidity_counts(diagnosed_date__month=4), {'dog bite': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            history.delete()
+        self.assertEqual(self._morbidity_counts(diagnosed_date__month=4), {})
+
+    def test_patient_facility_change_moves_counts(self):
+        from django.db.models import Sum
+        from analytics.rollups import morbidity_rollup, referral_rollup
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._history(self._referral(), 'Fever', date(2025, 5, 5))
+
+        other = Facility.objects.create(name='Other Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.facility = other
+            self.patient.save()
+
+        def totals(rollup, lookup):
+            return dict(rollup().values_list(lookup).annotate(total=Sum('count')))
+
+        self.assertEqual(totals(referral_rollup, 'facility'), {other.pk: 1})
+        self.assertEqual(totals(morbidity_rollup, 'facility'), {other.pk: 1})
+
+    def test_rebuild_and_incremental_refresh(self):
+        from analytics.models import DailyMorbidityRollup, DailyReferralRollup, RollupWatermark
+        from analytics.rollups import rebuild_rollups, refresh_rollups_incremental
+
+        # Rows written without running the on-commit refresh (e.g. bulk imports)
+        referral = self._referral()
+        self._history(referral, 'Pneumonia', date(2025, 1, 15))
+        self.assertFalse(DailyReferralRollup.objects.exists())
+        # Migration 0005 records a watermark; without one a rebuild is required
+        RollupWatermark.objects.all().delete()
+        self.assertIsNone(refresh_rollups_incremental())
+
+        self.assertEqual(rebuild_rollups(), (1, 1))
+        self.assertEqual(self._referral_counts(), {'pending': 1})
+        self.assertEqual(self._morbidity_counts(), {'pneumonia': 1})
+
+        self._referral()
+        self._history(None, 'Hypertension', date(2025, 1, 20))
+        self.assertEqual(refresh_rollups_incremental(), 2)
+        self.assertEqual(self._referral_counts(), {'pending': 2})
+        self.assertEqual(self._morbidity_counts(), {'pneumonia': 1, 'hypertension': 1})
+
+        # Nothing new since the last run
+        self.assertEqual(refresh_rollups_incremental(), 0)
+
+    def test_unknown_filter_is_rejected(self):
+        from analytics.rollups import referral_rollup
+
+        with self.assertRaises(ValueError):
+            referral_rollup(chief_complaint='bite')
+
+
+class IllnessNormalizationTestCase(TestCase):
+    """Tests for write-time illness normalization of Medical_History (analytics.illness)"""
+
+    def setUp(self):
+        from analytics.severity_index import SeverityIndex
+
+        SeverityIndex.invalidate()
+        # Rolled-back Diseases must not linger in the cached index for later tests
+        self.addCleanup(SeverityIndex.invalidate)
+        self.rabies = Disease.objects.create(
+            name='Possible Rabies', icd_code='W54.99', description='-', critical_level='high'
+        )
+        self.user = User.objects.create_user(username='illnessuser', password='testpass123')
+        facility = Facility.objects.create(name='Illness Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        self.patient = Patient.objects.create(
+            first_name='Lea', last_name='Reyes', p_address='Street', p_number='09123456789',
+            user=self.user, date_of_birth=date(1994, 4, 4), sex='Female', facility=facility
+        )
+
+    def _history(self, illness):
+        from patients.models import Medical_History
+
+        return Medical_History.objects.create(
+            user_id=self.user, patient_id=self.patient, illness_name=illness,
+            diagnosed_date=date(2025, 5, 1), notes='-', advice='-'
+        )
+
+    def test_resolved_on_save(self):
+        bite = self._history(' Dog Bite ')
+        self.assertEqual((bite.disease, bite.illness_label), (self.rabies, 'Possible Rabies'))
+
+        fever = self._history('high FEVER')
+        self.assertEqual((fever.disease, fever.illness_label), (None, 'High Fever'))
+        self.assertEqual(self._history('').illness_label, 'Unspecified')
+
+        fever.illness_name = 'possible rabies'
+        fever.save()
+        fever.refresh_from_db()
+        self.assertEqual(fever.disease, self.rabies)
+
+    def test_backfill_resolves_stale_rows(self):
+        from patients.models import Medical_History
+        from analytics.illness import normalize_medical_histories
+
+        flu = self._history('Influenza')
+        self._history('cat bite')
+        self.assertEqual(flu.illness_label, 'Influenza')
+
+        # The Disease is added after the record was saved
+        influenza = Disease.objects.create(name='Influenza', icd_code='J11', description='-', critical_level='low')
+        self.assertEqual(normalize_medical_histories(), 1)
+        flu.refresh_from_db()
+        self.assertEqual(flu.disease, influenza)
+        self.assertEqual(normalize_medical_histories(), 0)
+        self.assertEqual(
+            set(Medical_History.objects.values_list('illness_label', flat=True)), {'Influenza', 'Possible Rabies'}
+        )
+
+    def test_disease_writes_renormalize_matching_histories(self):
+        bite = self._history('dog bite')
+        flu = self._history('flu')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            influenza = Disease.objects.create(name='Flu', icd_code='J11', description='-', critical_level='low')
+            self.rabies.name = 'Rabies'
+            self.rabies.save()
+        flu.refresh_from_db()
+        bite.refresh_from_db()
+        self.assertEqual((flu.disease, flu.illness_label), (influenza, 'Flu'))
+        # 'dog bite' is an alias of the old name only
+        self.assertEqual((bite.disease, bite.illness_label), (None, 'Dog Bite'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            influenza.delete()
+        flu.refresh_from_db()
+        self.assertEqual((flu.disease, flu.illness_label), (None, 'Flu'))
+
+
+class DiseasePeakLoaderTestCase(TestCase):
+    """Tests for the column-wise referral loader (queryset_to_disease_peak_dataframe)"""
+
+    def setUp(self):
+        from unittest import mock
+
+        patcher = mock.patch('analytics.prediction_store.refresh_referral_predictions')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        user = User.objects.create_user(username='loaderuser', password='testpass123')
+        self.facility = Facility.objects.create(name='Loader Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        self.patient = Patient.objects.create(
+            first_name='Rico', last_name='Tan', p_address='Street', p_number='09123456789',
+            user=user, date_of_birth=date(1990, 6, 15), sex='Male', facility=self.facility
+        )
+        cases = [
+            # (ICD_code, initial_diagnosis, final_diagnosis, chief_complaint, symptoms)
+            (None, 'acute infection j06.9 suspected', None, 'cough', 'fever'),
+            (' W54.99 ', 'dog bite', 'Dog bite T14.1', '', 'wound'),
+            ('  ', 'x' * 60, '', '', ''),
+            (None, '', None, 'check-up', ''),
+        ]
+        for icd, initial, final, complaint, symptoms in cases:
+            Referral.objects.create(
+                facility=self.facility, user=user, patient=self.patient, ICD_code=icd,
+                initial_diagnosis=initial, final_diagnosis=final, chief_complaint=complaint, symptoms=symptoms,
+                weight=Decimal('65.0'), height=Decimal('165.0'), bp_systolic=120, bp_diastolic=80,
+                pulse_rate=70, respiratory_rate=16, temperature=Decimal('36.7'), oxygen_saturation=98,
+                work_up_details='-'
+            )
+
+    def test_columns_match_the_model_properties(self):
+        from analytics.ml_utils import queryset_to_disease_peak_dataframe
+
+        df = queryset_to_disease_peak_dataframe(Referral.objects.order_by('referral_id'), chunk_size=3)
+        self.assertEqual(
+            list(df.columns),
+            ['AGE', 'SEX', 'COMPLAINTS', 'DIAGNOSIS', 'ICD10 CODE', 'CREATED_AT', 'SITIO/BARANGAY', 'DATE'],
+        )
+        self.assertEqual(list(df['ICD10 CODE']), ['J06.9', 'W54.99', 'x' * 50, 'Unknown'])
+        self.assertEqual(list(df['DIAGNOSIS']), ['acute infection j06.9 suspected', 'Dog bite T14.1', 'x' * 60, ''])
+        self.assertEqual(list(df['COMPLAINTS']), ['cough', 'wound', '', 'check-up'])
+        self.assertEqual(set(df['AGE']), {self.patient.age})
+        self.assertEqual(set(df['SITIO/BARANGAY']), {'Loader Facility'})
+        self.assertEqual(df['ICD10 CODE'].dtype.name, 'category')
+        self.assertEqual(
+            list(df['DATE']),
+            [pd.Timestamp(r.created_at) for r in Referral.objects.order_by('referral_id')],
+        )
+
+    def test_empty_queryset(self):
+        from analytics.ml_utils import queryset_to_disease_peak_dataframe
+
+        self.assertTrue(queryset_to_disease_peak_dataframe(Referral.objects.none()).empty)
+        self.assertTrue(queryset_to_disease_peak_dataframe(Referral.objects.filter(created_at__year=1999)).empty)
@@ -0,0 +1,203 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+_WORD_BOUNDED_LITERAL = re.compile(r'^\\b([a-z0-9 ]+)\\b$')
+_NON_ALPHA = re.compile(r'[^a-z\s]')
+_NON_ALNUM = re.compile(r'[^a-z0-9\s]')
+
+# Joins the distinct texts of a Series into one string for the batch passes; no
+# translation source or keyword contains it, so no match can span two texts
+_SEPARATOR = '\x00'
+_NON_ALPHA_KEEP_SEPARATOR = re.compile(r'[^a-z\s\x00]')
+
+
+def _overlaps(a, b):
+    """True if literal strings a and b can share characters when both occur in a text"""
+    if a in b or b in a:
+        return True
+    shortest = min(len(a), len(b))
+    return any(a.endswith(b[:k]) or b.endswith(a[:k]) for k in range(1, shortest))
+
+
+def _compile_stages(rules, word_bounded=False):
+    """
+    Group ordered (source, target) literal rules into stages that can each be applied
+    as one alternation regex with the same result as applying the rules one by one.
+
+    A rule joins the current stage only if its source can't overlap any source in the
+    stage, and no earlier target in the stage can form or contain it; otherwise it
+    starts a new stage. Stages are applied in order, so the original rule order (and
+    every chained replacement) is preserved exactly.
+    """
+    stages = []
+    current = []
+    for source, target in rules:
+        conflict = any(
+            _overlaps(source, other_source) or _overlaps(source, other_target)
+            for other_source, other_target in current
+        )
+        if conflict:
+            stages.append(current)
+            current = []
+        current.append((source, target))
+    if current:
+        stages.append(current)
+
+    compiled = []
+    for stage in stages:
+        mapping = dict(stage)
+        alternation = '|'.join(re.escape(source) for source in sorted(mapping, key=len, reverse=True))
+        pattern = rf'\b(?:{alternation})\b' if word_bounded else alternation
+        compiled.append((re.compile(pattern), mapping))
+    return compiled
+
+
+def _apply_stages(text, stages):
+    for pattern, mapping in stages:
+        text = pattern.sub(lambda m: mapping[m.group(0)], text)
+    return text
+
+
+class ClinicalTextNormalizer:
+    """
+    Complaint text normalization compiled once from the translation/synonym/stopword
+    and keyword tables:
+
+    - tokenize(): same tokens as clean_and_tokenize_complaints; tokenize_series()
+      runs the cleanup and each translation rule once over all distinct texts
+      joined together instead of once per text
+    - preprocess(): same text as applying MEDICAL_SYNONYMS regexes one by one
+      (preprocess_text_advanced), in a few alternation passes instead of one per rule
+    - keyword_flags()/keyword_matrix(): substring presence of every keyword;
+      keyword_matrix() scans the joined distinct texts once per keyword
+
+    tokenize()/preprocess() results are memoized per distinct string (bounded LRU),
+    and the *_series helpers normalize each distinct value of a Series only once.
+    """
+
+    def __init__(self, translations=None, stopwords=None, synonyms=None, keywords=None, cache_size=8192):
+        self.translations = dict(translations or {})
+        self.stopwords = frozenset(stopwords or ())
+        self.keywords = tuple(keywords or ())
+
+        # Translations chain and overlap ('poi' rewrites 'point of injury', 'samad'
+        # fires before 'nasamad'), so they are applied in order with str.replace. An
+        # alternation regex (even split into order-preserving stages) measured slower
+        # than these C substring scans, most of all over the joined batch text.
+        self._translation_rules = tuple(self.translations.items())
+
+        # \bphrase\b synonym rules become literal word-bounded alternations; anything
+        # else is kept as its own regex stage. Identity rules are no-ops and dropped.
+        self._synonym_stages = []
+        literal_rules = []
+        for pattern, replacement in (synonyms or {}).items():
+            match = _WORD_BOUNDED_LITERAL.match(pattern)
+            if match and replacement.isalnum():
+                if match.group(1) != replacement:
+                    literal_rules.append((match.group(1), replacement))
+                continue
+            if literal_rules:
+                self._synonym_stages += _compile_stages(literal_rules, word_bounded=True)
+                literal_rules = []
+            self._synonym_stages.append((re.compile(pattern), None, replacement))
+        if literal_rules:
+            self._synonym_stages += _compile_stages(literal_rules, word_bounded=True)
+
+        self._keyword_patterns = tuple(re.compile(re.escape(k)) for k in self.keywords)
+
+        self._tokenize = lru_cache(maxsize=cache_size)(self._tokenize_uncached)
+        self._preprocess = lru_cache(maxsize=cache_size)(self._preprocess_uncached)
+
+    @staticmethod
+    def _as_text(text):
+        if text is None or (not isinstance(text, str) and pd.isna(text)):
+            return ''
+        return str(text)
+
+    def _translate(self, text):
+        for source, target in self._translation_rules:
+            text = text.replace(source, target)
+        return text
+
+    def _words(self, cleaned):
+        return [word for word in cleaned.split() if word not in self.stopwords and len(word) > 1]
+
+    def _tokenize_uncached(self, text):
+        return tuple(self._words(self._translate(_NON_ALPHA.sub(' ', text.lower()))))
+
+    def _preprocess_uncached(self, text):
+        if text == '':
+            return ''
+        text = text.lower().strip()
+        for stage in self._synonym_stages:
+            if len(stage) == 3:
+                pattern, _, replacement = stage
+                text = pattern.sub(replacement, text)
+            else:
+                text = _apply_stages(text, [stage])
+        return ' '.join(_NON_ALNUM.sub(' ', text).split())
+
+    def tokenize(self, text):
+        """Complaint tokens (translated, without stopwords and 1-letter words)"""
+        return list(self._tokenize(self._as_text(text)))
+
+    def preprocess(self, text):
+        """Lower-cased text with synonyms applied and punctuation removed"""
+        return self._preprocess(self._as_text(text))
+
+    def keyword_flags(self, text):
+        """Tuple of 0/1, one per keyword, for substring presence in ``text``"""
+        if not isinstance(text, str):
+            text = self._as_text(text)
+        return tuple([1 if keyword in text else 0 for keyword in self.keywords])
+
+    def _map_distinct(self, series, func):
+        values = series.astype(object).where(series.notna(), '')
+        distinct = {value: func(value) for value in pd.unique(values)}
+        return values.map(distinct)
+
+    def _joined_distinct(self, series):
+        """(codes, distinct texts, the texts joined by _SEPARATOR or None if one contains it)"""
+        values = series.astype(object).where(series.notna(), '')
+        codes, uniques = pd.factorize(values)
+        texts = [self._as_text(value) for value in uniques]
+        joined = _SEPARATOR.join(texts)
+        if joined.count(_SEPARATOR) != max(len(texts) - 1, 0):
+            joined = None
+        return codes, texts, joined
+
+    def tokenize_series(self, series):
+        if not len(series):
+            return pd.Series([], index=series.index, dtype=object)
+        codes, texts, joined = self._joined_distinct(series)
+        if joined is None:
+            return self._map_distinct(series, self.tokenize)
+        cleaned = self._translate(_NON_ALPHA_KEEP_SEPARATOR.sub(' ', joined.lower()))
+        tokens = [self._words(part) for part in cleaned.split(_SEPARATOR)]
+        return pd.Series([tokens[code] for code in codes], index=series.index, dtype=object)
+
+    def preprocess_series(self, series):
+        return self._map_distinct(series, self.preprocess)
+
+    def keyword_matrix(self, series):
+        """(len(series), len(keywords)) 0/1 matrix of keyword presence"""
+        if not len(series):
+            return np.zeros((0, len(self.keywords)))
+        codes, texts, joined = self._joined_distinct(series)
+        if joined is None:
+            flags = np.array([self.keyword_flags(text) for text in texts], dtype=float).reshape(len(texts), -1)
+            return flags[codes]
+        # End offset (exclusive, separator included) of each text in the joined string
+        ends = np.cumsum([len(text) + 1 for text in texts])
+        flags = np.zeros((len(texts), len(self.keywords)))
+        for column, pattern in enumerate(self._keyword_patterns):
+            starts = np.fromiter((match.start() for match in pattern.finditer(joined)), dtype=np.int64)
+            flags[np.searchsorted(ends, starts, side='right'), column] = 1
+        return flags[codes]
+
+    def cache_clear(self):
+        self._tokenize.cache_clear()
+        self._preprocess.cache_clear()
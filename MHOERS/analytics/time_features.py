@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import StandardScaler
+
+from .model_registry import ModelRegistry
+from .text_normalizer import ClinicalTextNormalizer
+
+TIME_FEATURE_PIPELINE_ARTIFACT = 'time_feature_pipeline_advanced.pkl'
+TIME_MODEL_ARTIFACT = 'time_prediction_model_advanced.pkl'
+# Separate components written by older trainings, before the pipeline artifact existed
+LEGACY_TIME_COMPONENTS = ['time_vectorizer_advanced.pkl', 'time_scaler_advanced.pkl', 'diag_time_encoder_advanced.pkl']
+
+# Predictions are clamped to this range (hours); the proxy target never leaves it
+MIN_TIME_HOURS = 0.25
+MAX_TIME_HOURS = 4.0
+
+TIME_NUMERIC_FEATURES = ['AGE', 'SEX', 'COMPLAINTS_LENGTH', 'COMPLAINTS_WORD_COUNT',
+                         'COMPLAINTS_AVG_WORD_LENGTH', 'AGE_GROUP', 'AGE_NORMALIZED',
+                         'DIAGNOSIS_ENCODED', 'DIAGNOSIS_LENGTH', 'DIAGNOSIS_WORD_COUNT',
+                         'HAS_ICD10', 'ICD10_LENGTH']
+
+SEX_CODES = {'M': 0, 'F': 1, 'Male': 0, 'Female': 1, 'male': 0, 'female': 1, 'MALE': 0, 'FEMALE': 1}
+
+
+def referrals_to_time_frame(referrals):
+    """Raw COMPLAINTS/DIAGNOSIS/AGE/SEX/ICD10 CODE frame (CSV column names) for Referral objects"""
+    rows = []
+    for r in referrals:
+        patient = getattr(r, 'patient', None)
+        rows.append({
+            'COMPLAINTS': r.symptoms or '',
+            'DIAGNOSIS': r.final_diagnosis or r.initial_diagnosis or 'Unknown',
+            'AGE': patient.age if patient else None,  # missing ages get the pipeline's age_fill
+            'SEX': patient.sex if patient else 'M',
+            'ICD10 CODE': getattr(r, 'icd10_code', None) or None,
+        })
+    return pd.DataFrame(rows, columns=['COMPLAINTS', 'DIAGNOSIS', 'AGE', 'SEX', 'ICD10 CODE'])
+
+
+class TimeToCaterFeaturePipeline:
+    """
+    Fitted feature pipeline for the time-to-cater model: scaled numeric and keyword
+    features + complaint TF-IDF, emitted as one CSR matrix.
+
+    Training and prediction (single referral or a whole page) call the same
+    transform(), so the column layout can't drift between them, and nothing is
+    densified beyond the 42 numeric columns.
+    """
+
+    def __init__(self, keywords=None, tfidf_params=None):
+        from .ml_utils import MEDICAL_KEYWORDS
+
+        self.keywords = list(keywords or MEDICAL_KEYWORDS)
+        self.tfidf_params = tfidf_params or {
+            'max_features': 1000,
+            'ngram_range': (1, 2),
+            'min_df': 2,
+            'max_df': 0.90,
+            'stop_words': 'english',
+            'sublinear_tf': True,
+        }
+        self.vectorizer = None
+        self.scaler = None
+        self.diagnosis_index = {}
+        self.age_mean = 30.0
+        self.age_std = 15.0
+        self.age_fill = 30.0
+        # Trained regressor, saved inside this artifact (see save_time_model)
+        self.model = None
+
+    @classmethod
+    def from_components(cls, vectorizer, scaler, diag_encoder):
+        """Wrap separately pickled vectorizer/scaler/encoder from an older training"""
+        pipeline = cls()
+        pipeline.vectorizer = vectorizer
+        pipeline.scaler = scaler
+        pipeline.diagnosis_index = {label: i for i, label in enumerate(diag_encoder.classes_)}
+        return pipeline
+
+    @property
+    def n_features(self):
+        return len(TIME_NUMERIC_FEATURES) + len(self.keywords) + len(self.vectorizer.vocabulary_)
+
+    def _keyword_normalizer(self):
+        from .ml_utils import get_text_normalizer
+
+        normalizer = get_text_normalizer()
+        if list(normalizer.keywords) != self.keywords:
+            normalizer = ClinicalTextNormalizer(keywords=self.keywords)
+        return normalizer
+
+    def _prepare(self, df, fit=False):
+        from .ml_utils import get_text_normalizer, assign_age_group
+
+        complaints = get_text_normalizer().preprocess_series(df['COMPLAINTS'])
+        diagnosis = df['DIAGNOSIS'].fillna('Unknown').astype(str).str.strip()
+        age = pd.to_numeric(df['AGE'], errors='coerce')
+        if fit and age.notna().any():
+            self.age_fill = float(age.median())
+        # Missing ages get the training median, so a row encodes the same alone or in a batch
+        age = age.fillna(self.age_fill)
+        return complaints, diagnosis, age, assign_age_group
+
+    def _numeric(self, df, complaints, diagnosis, age, assign_age_group):
+        complaints_length = complaints.str.len().astype(float)
+        complaints_word_count = complaints.str.split().str.len().fillna(0).astype(float)
+        if 'ICD10 CODE' in df.columns:
+            icd = df['ICD10 CODE']
+            has_icd10 = icd.notna().astype(float)
+            icd10_length = icd.fillna('').astype(str).str.len().astype(float)
+        else:
+            has_icd10 = icd10_length = pd.Series(0.0, index=df.index)
+
+        columns = [
+            age.astype(float),
+            df['SEX'].fillna('M').map(SEX_CODES).fillna(0).astype(float),
+            complaints_length,
+            complaints_word_count,
+            complaints_length / (complaints_word_count + 1),
+            age.apply(assign_age_group).astype(float),
+            (age - self.age_mean) / (self.age_std + 1e-8),
+            diagnosis.map(self.diagnosis_index).fillna(0).astype(float),
+            diagnosis.str.len().astype(float),
+            diagnosis.str.split().str.len().fillna(0).astype(float),
+            has_icd10,
+            icd10_length,
+        ]
+        columns = [c.to_numpy() for c in columns]
+        if len(df):
+            columns.append(self._keyword_normalizer().keyword_matrix(complaints))
+        return np.column_stack(columns) if len(df) else np.empty((0, len(columns) + len(self.keywords)))
+
+    def fit(self, df):
+        """Fit encoder, scaler and TF-IDF on a raw frame (see referrals_to_time_frame)"""
+        self.fit_transform(df)
+        return self
+
+    def fit_transform(self, df):
+        complaints, diagnosis, age, assign_age_group = self._prepare(df, fit=True)
+        self.age_mean = float(age.mean())
+        self.age_std = float(age.std()) if len(age) > 1 else 0.0
+        self.diagnosis_index = {label: i for i, label in enumerate(sorted(diagnosis.unique()))}
+
+        self.scaler = StandardScaler()
+        X_numeric = self.scaler.fit_transform(self._numeric(df, complaints, diagnosis, age, assign_age_group))
+        self.vectorizer = TfidfVectorizer(**self.tfidf_params)
+        X_text = self.vectorizer.fit_transform(complaints)
+        return scipy.sparse.hstack([scipy.sparse.csr_matrix(X_numeric), X_text], format='csr')
+
+    def transform(self, df):
+        """CSR feature matrix for a raw frame; unseen diagnoses encode to 0"""
+        complaints, diagnosis, age, assign_age_group = self._prepare(df)
+        X_numeric = self.scaler.transform(self._numeric(df, complaints, diagnosis, age, assign_age_group))
+        X_text = self.vectorizer.transform(complaints)
+        return scipy.sparse.hstack([scipy.sparse.csr_matrix(X_numeric), X_text], format='csr')
+
+    def predict_hours(self, model, df):
+        """Clamped time-to-cater predictions (hours) for every row of ``df``"""
+        if not len(df):
+            return np.empty(0)
+        return np.clip(model.predict(self.transform(df)), MIN_TIME_HOURS, MAX_TIME_HOURS)
+
+
+def save_time_model(model, pipeline):
+    """
+    Publish a trained time model together with its feature pipeline in one artifact,
+    so a reader reloading mid-save can't pair a new model with the old pipeline
+    """
+    pipeline.model = model
+    ModelRegistry.save(pipeline, TIME_FEATURE_PIPELINE_ARTIFACT)
+
+
+def load_time_model(pipeline):
+    """
+    The model saved with ``pipeline``, else the separate TIME_MODEL_ARTIFACT an older
+    training wrote alongside it, else None
+    """
+    model = getattr(pipeline, 'model', None)
+    if model is None and pipeline is not None and ModelRegistry.exists(TIME_MODEL_ARTIFACT):
+        model = ModelRegistry.get(TIME_MODEL_ARTIFACT)
+    return model
+
+
+def load_time_feature_pipeline():
+    """The saved pipeline, else one assembled from the legacy components, else None"""
+    if ModelRegistry.exists(TIME_FEATURE_PIPELINE_ARTIFACT):
+        return ModelRegistry.get(TIME_FEATURE_PIPELINE_ARTIFACT)
+    if all(ModelRegistry.exists(name) for name in LEGACY_TIME_COMPONENTS):
+        return TimeToCaterFeaturePipeline.from_components(
+            *(ModelRegistry.get(name) for name in LEGACY_TIME_COMPONENTS)
+        )
+    return None
@@ -1,6 +1,7 @@
 from django.shortcuts import render
 from django.http import JsonResponse
 from analytics.models import Disease
+from accounts.principal import get_principal, get_request_principal
 from patients.models import Medical_History, Patient
 from referrals.models import Referral, FollowUpVisit
 from facilities.models import Facility
@@ -8,14 +9,18 @@ from accounts.models import BHWRegistration, Doctors
 from collections import Counter, defaultdict
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
-from django.db.models import Count, Q, Avg, DurationField, ExpressionWrapper, F
+from django.db.models import Count, Q, Avg, DurationField, ExpressionWrapper, F, Max, Sum
+from django.db.models.functions import ExtractMonth
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
 from django.utils import timezone
 import calendar
 from .models import *
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 from analytics.ml_utils import predict_disease_peak_for_month, train_barangay_disease_peak_model, predict_barangay_disease_peak_2025
+from analytics.forecast_cache import forecast_cache_key, warm_forecast_caches, FORECAST_CACHE_TIMEOUT
+from analytics.rollups import morbidity_rollup, referral_rollup
 
 
 SINGAPORE_TZ = ZoneInfo('Asia/Singapore')
@@ -27,11 +32,7 @@ def now_in_singapore():
 
 def is_doctor_user(user):
     """Check if user is an active doctor"""
-    try:
-        doctor_profile = Doctors.objects.get(user=user)
-        return doctor_profile.status == 'ACTIVE'
-    except Doctors.DoesNotExist:
-        return False
+    return get_principal(user).is_doctor
 
 
 def get_user_facilities(user, user_id=None):
@@ -55,22 +56,55 @@ def get_user_facilities(user, user_id=None):
         else:
             return Facility.objects.all().order_by('name')
     else:
-        # For non-staff users, check if they are BHW
-        try:
-            bhw_profile = BHWRegistration.objects.select_related('facility').get(user=user)
-            if bhw_profile.facility:
-                return Facility.objects.filter(pk=bhw_profile.facility.pk).order_by('name')
-        except BHWRegistration.DoesNotExist:
-            pass
-        
-        # If not BHW, check shared_facilities or users relationship
-        if hasattr(user, 'shared_facilities'):
-            facilities = user.shared_facilities.all()
-            if facilities.exists():
-                return facilities.order_by('name')
-        
-        # Fallback to users relationship
-        return Facility.objects.filter(users=user).order_by('name')
+        # For non-staff users, BHW registration facility first, then shared facilities
+        principal = get_principal(user)
+        if principal.bhw_facility_id:
+            return Facility.objects.filter(pk=principal.bhw_facility_id).order_by('name')
+        return Facility.objects.filter(pk__in=principal.shared_facility_ids).order_by('name')
+
+REFERRAL_STATS_CACHE_TIMEOUT = 60 * 10
+REFERRAL_STATS_GENERATION_KEY = 'referral_stats_generation'
+
+
+def parse_date_window(request):
+    """(date_from, date_to) from the date_from/date_to query params (YYYY-MM-DD); invalid or missing -> None"""
+    window = []
+    for param in ('date_from', 'date_to'):
+        value = None
+        if request.GET.get(param, ''):
+            try:
+                value = datetime.strptime(request.GET[param], '%Y-%m-%d').date()
+            except ValueError:
+                pass
+        window.append(value)
+    return tuple(window)
+
+
+def apply_date_window(queryset, date_from=None, date_to=None, field='created_at'):
+    """Clip a queryset to [date_from, date_to] (inclusive, local dates) in SQL"""
+    if date_from:
+        queryset = queryset.filter(**{f'{field}__date__gte': date_from})
+    if date_to:
+        queryset = queryset.filter(**{f'{field}__date__lte': date_to})
+    return queryset
+
+
+def referral_stats_generation():
+    """
+    Bumped on every referral write and on patient facility moves and facility
+    edits (analytics.signals), expiring memoized statistics
+    """
+    from django.core.cache import cache
+    return cache.get_or_set(REFERRAL_STATS_GENERATION_KEY, 1, None)
+
+
+def bump_referral_stats_generation():
+    from django.core.cache import cache
+    try:
+        cache.incr(REFERRAL_STATS_GENERATION_KEY)
+    except ValueError:
+        cache.set(REFERRAL_STATS_GENERATION_KEY, 2, None)
+
 
 def get_disease_diagnosis_counts(request):
     """
@@ -110,26 +144,31 @@ def get_disease_diagnosis_counts(request):
     
     year = request.GET.get('year')
     month = request.GET.get('month')
-    illness_qs = Medical_History.objects.all()
+    history_filters = {}
     if year:
-        illness_qs = illness_qs.filter(diagnosed_date__year=year)
+        history_filters['diagnosed_date__year'] = year
     if month:
-        illness_qs = illness_qs.filter(diagnosed_date__month=month)
-    
-    # Get all illness_name counts
-    illness_names = list(illness_qs.values_list('illness_name', flat=True))
+        history_filters['diagnosed_date__month'] = month
+    
+    # Diagnosis counts per normalized illness name, read from the daily rollup
+    illness_counts = (
+        morbidity_rollup(**history_filters)
+        .values('illness')
+        .annotate(total=Sum('count'))
+        .order_by()
+    )
     
     # Initialize counts for the 5 diseases
     data = {disease: 0 for disease in DISEASE_ORDER}
     others_count = 0
     
-    # Count illnesses and map to capstone diseases
-    for name in illness_names:
-        if not name:
-            others_count += 1
+    # Map each distinct illness to a capstone disease
+    for row in illness_counts:
+        name_lower = row['illness']
+        if not name_lower:
+            others_count += row['total']
             continue
         
-        name_lower = name.strip().lower()
         matched = False
         
         # Check if illness name matches any capstone disease
@@ -138,17 +177,17 @@ def get_disease_diagnosis_counts(request):
             # For ICD codes, check for exact match or code in the name
             if key in ['t14.1', 'w54.99', 'j06.9', 'j15', 'i10-1', 'i10.1']:
                 if key in name_lower:
-                    data[disease_label] += 1
+                    data[disease_label] += row['total']
                     matched = True
                     break
             # For disease names, check if key is contained in the illness name
             elif key in name_lower:
-                data[disease_label] += 1
+                data[disease_label] += row['total']
                 matched = True
                 break
         
         if not matched:
-            others_count += 1
+            others_count += row['total']
     
     # Add Others if there's any count
     if others_count > 0:
@@ -321,7 +360,6 @@ def get_disease_counts_per_user(request):
         qs = qs.filter(diagnosed_date__month=month)
 
     disease_names = list(Disease.objects.values_list('name', flat=True))
-    disease_name_map = {name.lower(): name for name in disease_names}
 
     # Users displayed as their username; if facility exists tie by patient.facility.name when possible
     user_ids = list(qs.values_list('user_id', flat=True).distinct())
@@ -334,20 +372,20 @@ def get_disease_counts_per_user(request):
     # Initialize matrix
     matrix = [[0 for _ in disease_names] for _ in users]
 
-    for illness, user in qs.values_list('illness_name', 'user_id__username'):
-        if not illness or not user or user not in user_to_idx:
-            continue
-        name_lc = illness.strip().lower()
-        if name_lc in ["cat bite", "dog bite"]:
-            name_lc = "possible rabies"
-        elif name_lc == "lbm":
-            name_lc = "gastrointestinal issue"
-        disease_label = disease_name_map.get(name_lc)
-        if not disease_label:
+    # Medical histories carry their Disease link (set on save), so count per pair in SQL
+    pair_counts = (
+        qs.filter(disease__isnull=False)
+        .values('user_id__username', 'disease__name')
+        .annotate(total=Count('pk'))
+        .order_by()
+    )
+    for row in pair_counts:
+        user = row['user_id__username']
+        if user not in user_to_idx:
             continue
         r = user_to_idx[user]
-        c = disease_to_idx[disease_label]
-        matrix[r][c] += 1
+        c = disease_to_idx[row['disease__name']]
+        matrix[r][c] += row['total']
 
     return JsonResponse({
         'users': users,
@@ -361,247 +399,111 @@ def get_referral_statistics(request):
     Returns monthly and yearly referral data.
     For non-staff users, returns only their own referrals from their assigned facilities.
     Supports date filtering via date_from and date_to parameters.
+    Each view is answered by one GROUP BY (period, facility) query and memoized
+    per user and facility set until the next referral, patient or facility change.
     """
+    from django.core.cache import cache
+    from django.db.models.functions import TruncMonth, TruncYear
+
     year = int(request.GET.get('year', datetime.now().year))    
     view_type = request.GET.get('view_type', 'monthly')
-    
-    # Get date filters
-    date_from_str = request.GET.get('date_from', '')
-    date_to_str = request.GET.get('date_to', '')
-    date_from = None
-    date_to = None
-    
-    if date_from_str:
-        try:
-            date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
-    
-    if date_to_str:
-        try:
-            date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
-
-    if request.user.is_staff or request.user.is_superuser:
-        # Staff/admin: get all facilities
-        facilities = Facility.objects.all()
-        # Get referrals from all facilities
+    date_from, date_to = parse_date_window(request)
+    is_admin = request.user.is_staff or request.user.is_superuser
+
+    if is_admin:
+        scope = 'all'
+    else:
+        facility_ids = get_request_principal(request).shared_facility_ids
+        # The user's facility membership is part of the key: it is not a referral write
+        scope = f"user_{request.user.id}_{'-'.join(str(pk) for pk in sorted(facility_ids))}"
+    cache_key = (
+        f"referral_stats_v1_{scope}_{view_type}_{year}_{date_from}_{date_to}_"
+        f"{referral_stats_generation()}"
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return JsonResponse(cached)
+
+    if is_admin:
+        # Staff/admin: referrals from all facilities, grouped by patient facility
         referrals_qs = Referral.objects.all()
     else:
-        # Non-staff users: get their assigned facilities
-        facilities = request.user.shared_facilities.all()
-        # Get only referrals created by this user or from their assigned facilities
-        from django.db.models import Q
+        # Non-staff users: only referrals created by this user or from their assigned facilities
         referrals_qs = Referral.objects.filter(
             Q(user=request.user) | 
-            Q(facility__in=facilities) | 
-            Q(patient__facility__in=facilities)
+            Q(facility_id__in=facility_ids) | 
+            Q(patient__facility_id__in=facility_ids)
         )
 
     if view_type == 'monthly':
-        months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+        labels = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
                   'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+        periods = list(range(1, 13))
+        referrals_qs = referrals_qs.filter(created_at__year=year)
+        truncate = TruncMonth('created_at')
+    else:  # yearly
+        periods = [year - 3, year - 2, year - 1, year]
+        labels = [str(y) for y in periods]
+        referrals_qs = referrals_qs.filter(created_at__year__gte=periods[0], created_at__year__lte=year)
+        truncate = TruncYear('created_at')
+
+    # Months/years outside the date range simply have no rows (count 0)
+    referrals_qs = apply_date_window(referrals_qs, date_from, date_to)
+    group_fields = ['period', 'patient__facility_id'] if is_admin else ['period']
+    rows = referrals_qs.annotate(period=truncate).values(*group_fields).annotate(count=Count('referral_id'))
+
+    period_index = {period: i for i, period in enumerate(periods)}
+
+    def period_of(row):
+        period = row['period']
+        if timezone.is_aware(period):
+            period = timezone.localtime(period)
+        return period.month if view_type == 'monthly' else period.year
+
+    if not is_admin:
+        user_data = [0] * len(periods)
+        for row in rows:
+            user_data[period_index[period_of(row)]] += row['count']
+
+        payload = {
+            'labels': labels,
+            'datasets': [
+                {
+                    'label': 'My Referrals',
+                    'data': user_data,
+                    'backgroundColor': '#4e73df',
+                    'borderColor': '#4e73df',
+                    'borderRadius': 10,
+                    'barThickness': 20,
+                }
+            ]
+        }
+    else:
+        # Staff/admin: show data by facility
+        counts = defaultdict(lambda: [0] * len(periods))
+        for row in rows:
+            counts[row['patient__facility_id']][period_index[period_of(row)]] += row['count']
 
-        # For non-staff users, show a single dataset with their referrals
-        if not request.user.is_staff and not request.user.is_superuser:
-            user_data = []
-            for month_num in range(1, 13):
-                month_filter = referrals_qs.filter(
-                    created_at__year=year,
-                    created_at__month=month_num,
-                )
-                
-                # Apply date range filter if provided
-                if date_from and date_to:
-                    # Check if this month falls within the date range
-                    month_start = datetime(year, month_num, 1).date()
-                    # Get last day of month
-                    last_day = calendar.monthrange(year, month_num)[1]
-                    month_end = datetime(year, month_num, last_day).date()
-                    
-                    # Only include month if it overlaps with date range
-                    if month_end >= date_from and month_start <= date_to:
-                        month_filter = month_filter.filter(
-                            created_at__date__gte=date_from,
-                            created_at__date__lte=date_to
-                        )
-                    else:
-                        # Month doesn't overlap with date range, set count to 0
-                        user_data.append(0)
-                        continue
-                elif date_from:
-                    month_filter = month_filter.filter(created_at__date__gte=date_from)
-                elif date_to:
-                    month_filter = month_filter.filter(created_at__date__lte=date_to)
-                
-                count = month_filter.count()
-                user_data.append(count)
-            
-            return JsonResponse({
-                'labels': months,
-                'datasets': [
-                    {
-                        'label': 'My Referrals',
-                        'data': user_data,
-                        'backgroundColor': '#4e73df',
-                        'borderColor': '#4e73df',
-                        'borderRadius': 10,
-                        'barThickness': 20,
-                    }
-                ]
-            })
-        else:
-            # Staff/admin: show data by facility
-            data = {}
-            for facility in facilities:
-                facility_data = []
-                for month_num in range(1, 13):
-                    month_filter = Referral.objects.filter(
-                        patient__facility=facility,
-                        created_at__year=year,
-                        created_at__month=month_num,
-                    )
-                    
-                    # Apply date range filter if provided
-                    if date_from and date_to:
-                        # Check if this month falls within the date range
-                        month_start = datetime(year, month_num, 1).date()
-                        # Get last day of month
-                        last_day = calendar.monthrange(year, month_num)[1]
-                        month_end = datetime(year, month_num, last_day).date()
-                        
-                        # Only include month if it overlaps with date range
-                        if month_end >= date_from and month_start <= date_to:
-                            month_filter = month_filter.filter(
-                                created_at__date__gte=date_from,
-                                created_at__date__lte=date_to
-                            )
-                        else:
-                            # Month doesn't overlap with date range, set count to 0
-                            facility_data.append(0)
-                            continue
-                    elif date_from:
-                        month_filter = month_filter.filter(created_at__date__gte=date_from)
-                    elif date_to:
-                        month_filter = month_filter.filter(created_at__date__lte=date_to)
-                    
-                    count = month_filter.count()
-                    facility_data.append(count)
-                data[facility.name] = facility_data
-
-            return JsonResponse({
-                'labels': months,
-                'datasets': [
-                    {
-                        'label': facility_name,
-                        'data': facility_data,
-                        'backgroundColor': f'#{hash(facility_name) % 0xFFFFFF:06x}',
-                        'borderRadius': 10,
-                        'barThickness': 20,
-                    }
-                    for facility_name, facility_data in data.items()
-                ]
-            })
+        data = {}
+        for facility_id, facility_name in Facility.objects.values_list('facility_id', 'name'):
+            data[facility_name] = counts.get(facility_id, [0] * len(periods))
 
-    else:  # yearly
-        years = [year - 3, year - 2, year - 1, year]
-        year_labels = [str(y) for y in years]
-
-        # For non-staff users, show a single dataset with their referrals
-        if not request.user.is_staff and not request.user.is_superuser:
-            user_data = []
-            for year_val in years:
-                year_filter = referrals_qs.filter(
-                    created_at__year=year_val,
-                )
-                
-                # Apply date range filter if provided
-                if date_from and date_to:
-                    # Check if this year overlaps with the date range
-                    year_start = datetime(year_val, 1, 1).date()
-                    year_end = datetime(year_val, 12, 31).date()
-                    
-                    # Only include year if it overlaps with date range
-                    if year_end >= date_from and year_start <= date_to:
-                        year_filter = year_filter.filter(
-                            created_at__date__gte=date_from,
-                            created_at__date__lte=date_to
-                        )
-                    else:
-                        # Year doesn't overlap with date range, set count to 0
-                        user_data.append(0)
-                        continue
-                elif date_from:
-                    year_filter = year_filter.filter(created_at__date__gte=date_from)
-                elif date_to:
-                    year_filter = year_filter.filter(created_at__date__lte=date_to)
-                
-                count = year_filter.count()
-                user_data.append(count)
-            
-            return JsonResponse({
-                'labels': year_labels,
-                'datasets': [
-                    {
-                        'label': 'My Referrals',
-                        'data': user_data,
-                        'backgroundColor': '#4e73df',
-                        'borderColor': '#4e73df',
-                        'borderRadius': 10,
-                        'barThickness': 20,
-                    }
-                ]
-            })
-        else:
-            # Staff/admin: show data by facility
-            data = {}
-            for facility in facilities:
-                facility_data = []
-                for year_val in years:
-                    year_filter = Referral.objects.filter(
-                        patient__facility=facility,
-                        created_at__year=year_val,
-                    )
-                    
-                    # Apply date range filter if provided
-                    if date_from and date_to:
-                        # Check if this year overlaps with the date range
-                        year_start = datetime(year_val, 1, 1).date()
-                        year_end = datetime(year_val, 12, 31).date()
-                        
-                        # Only include year if it overlaps with date range
-                        if year_end >= date_from and year_start <= date_to:
-                            year_filter = year_filter.filter(
-                                created_at__date__gte=date_from,
-                                created_at__date__lte=date_to
-                            )
-                        else:
-                            # Year doesn't overlap with date range, set count to 0
-                            facility_data.append(0)
-                            continue
-                    elif date_from:
-                        year_filter = year_filter.filter(created_at__date__gte=date_from)
-                    elif date_to:
-                        year_filter = year_filter.filter(created_at__date__lte=date_to)
-                    
-                    count = year_filter.count()
-                    facility_data.append(count)
-                data[facility.name] = facility_data
+        payload = {
+            'labels': labels,
+            'datasets': [
+                {
+                    'label': facility_name,
+                    'data': facility_data,
+                    'backgroundColor': f'#{hash(facility_name) % 0xFFFFFF:06x}',
+                    'borderRadius': 10,
+                    'barThickness': 20,
+                }
+                for facility_name, facility_data in data.items()
+            ]
+        }
 
-            return JsonResponse({
-                'labels': year_labels,
-                'datasets': [
-                    {
-                        'label': facility_name,
-                        'data': facility_data,
-                        'backgroundColor': f'#{hash(facility_name) % 0xFFFFFF:06x}',
-                        'borderRadius': 10,
-                        'barThickness': 20,
-                    }
-                    for facility_name, facility_data in data.items()
-                ]
-            })
+    cache.set(cache_key, payload, REFERRAL_STATS_CACHE_TIMEOUT)
+    return JsonResponse(payload)
 
 
 def get_barangay_performance(request):
@@ -612,10 +514,18 @@ def get_barangay_performance(request):
     year = request.GET.get('year', datetime.now().year)
     month = request.GET.get('month')
     
-    # Filter referrals by date
-    referrals = Referral.objects.filter(created_at__year=year)
+    # Referral counts per facility and status, read from the daily rollup
+    referral_filters = {'created_at__year': year}
     if month:
-        referrals = referrals.filter(created_at__month=month)
+        referral_filters['created_at__month'] = month
+    status_counts = defaultdict(Counter)
+    for row in (
+        referral_rollup(**referral_filters)
+        .values('facility_id', 'status')
+        .annotate(total=Sum('count'))
+        .order_by()
+    ):
+        status_counts[row['facility_id']][row['status']] += row['total']
     
     # Get facilities with their referral counts by status
     facilities = Facility.objects.all()
@@ -640,12 +550,12 @@ def get_barangay_performance(request):
     }
     
     for facility in facilities:
-        facility_referrals = referrals.filter(patient__facility=facility)
+        facility_counts = status_counts[facility.pk]
         
         # Count by status
-        completed = facility_referrals.filter(status='completed').count()
-        ongoing = facility_referrals.filter(status__in=['pending', 'in-progress']).count()
-        cancelled = facility_referrals.filter(status='cancelled').count()
+        completed = facility_counts['completed']
+        ongoing = facility_counts['pending'] + facility_counts['in-progress']
+        cancelled = facility_counts['cancelled']
         
         # Add to status overview
         status_data['labels'].append(facility.name)
@@ -789,6 +699,20 @@ def get_system_usage_data(request):
     default_login_colors = ['#4e73df', '#1cc88a', '#36b9cc', '#f6c23e', '#e74a3b', '#6f42c1', '#fd7e14', '#20c997']
     default_report_colors = ['#ff6347', '#ff4500', '#ff8c00', '#ffb6c1', '#e74a3b', '#6f42c1', '#fd7e14', '#20c997']
     
+    # Referrals and medical records per facility and month, read from the daily rollups
+    report_counts = Counter()
+    for rollup in (
+        referral_rollup(created_at__year=year, created_at__month__in=month_nums),
+        morbidity_rollup(diagnosed_date__year=year, diagnosed_date__month__in=month_nums),
+    ):
+        for row in (
+            rollup.annotate(month=ExtractMonth('day'))
+            .values('facility_id', 'month')
+            .annotate(total=Sum('count'))
+            .order_by()
+        ):
+            report_counts[(row['facility_id'], row['month'])] += row['total']
+    
     for idx, facility in enumerate(facilities):
         facility_name = facility.name
         login_color = login_colors.get(facility_name, default_login_colors[idx % len(default_login_colors)])
@@ -836,25 +760,7 @@ def get_system_usage_data(request):
         # Count accesses to report endpoints (system_usage_scorecard, morbidity_report, etc.)
         # Since we don't have a report log, we'll use referral and medical history creation as proxy
         # for report generation activity
-        report_data = []
-        for month_num in month_nums:
-            # Count referrals created (as proxy for referral reports)
-            referral_count = Referral.objects.filter(
-                patient__facility=facility,
-                created_at__year=year,
-                created_at__month=month_num
-            ).count()
-            
-            # Count medical histories created (as proxy for morbidity reports)
-            medical_count = Medical_History.objects.filter(
-                patient_id__facility=facility,
-                diagnosed_date__year=year,
-                diagnosed_date__month=month_num
-            ).count()
-            
-            # Reports generated = sum of referrals and medical records (as they generate reports)
-            report_count = referral_count + medical_count
-            report_data.append(report_count)
+        report_data = [report_counts[(facility.pk, month_num)] for month_num in month_nums]
         
         # Add login dataset
         data['datasets'].append({
@@ -896,24 +802,7 @@ def system_usage_scorecard_report(request):
     user_id = parse_int(request.GET.get('user_id'))
     
     # Get date_from and date_to parameters for direct date filtering
-    date_from_str = request.GET.get('date_from', '')
-    date_to_str = request.GET.get('date_to', '')
-    date_from = None
-    date_to = None
-    
-    if date_from_str:
-        try:
-            from datetime import datetime
-            date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
-    
-    if date_to_str:
-        try:
-            from datetime import datetime
-            date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
+    date_from, date_to = parse_date_window(request)
 
     # Get facilities for the user (handles BHW users)
     facilities_qs = get_user_facilities(request.user, user_id)
@@ -1046,118 +935,90 @@ def morbidity_report(request):
         month_to = month_to if 1 <= month_to <= 12 else None
     
     # Get date_from and date_to parameters for direct date filtering
-    date_from_str = request.GET.get('date_from', '')
-    date_to_str = request.GET.get('date_to', '')
-    date_from = None
-    date_to = None
-    
-    if date_from_str:
-        try:
-            from datetime import datetime
-            date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
-    
-    if date_to_str:
-        try:
-            from datetime import datetime
-            date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
+    date_from, date_to = parse_date_window(request)
     
     user_id = parse_int(request.GET.get('user_id'))
     facility_id = parse_int(request.GET.get('facility_id'))
 
     # Check if user is a doctor - if so, auto-filter by referrals examined by this doctor
     is_doctor = is_doctor_user(request.user)
+    history_filters = {}
     if is_doctor and not user_id:
-        # Get referral IDs for referrals examined by this doctor
-        doctor_referral_ids = Referral.objects.filter(
-            examined_by=request.user
-        ).values_list('referral_id', flat=True)
-        # Filter medical histories linked to those referrals
-        histories = Medical_History.objects.filter(
-            referral_id__in=doctor_referral_ids
-        )
-    else:
-        # Build base queryset
-        histories = Medical_History.objects.all()
+        # Medical histories linked to referrals examined by this doctor
+        history_filters['referral__examined_by'] = request.user
     
     # Priority: date_from/date_to > month_from/month_to > month > year
     if date_from and date_to:
-        histories = histories.filter(diagnosed_date__gte=date_from, diagnosed_date__lte=date_to)
+        history_filters.update(diagnosed_date__gte=date_from, diagnosed_date__lte=date_to)
     elif date_from:
-        histories = histories.filter(diagnosed_date__gte=date_from)
+        history_filters['diagnosed_date__gte'] = date_from
     elif date_to:
-        histories = histories.filter(diagnosed_date__lte=date_to)
+        history_filters['diagnosed_date__lte'] = date_to
     elif month_from and month_to:
-        histories = histories.filter(diagnosed_date__year=year, diagnosed_date__month__gte=month_from, diagnosed_date__month__lte=month_to)
+        history_filters.update(diagnosed_date__year=year, diagnosed_date__month__gte=month_from, diagnosed_date__month__lte=month_to)
     elif month:
-        histories = histories.filter(diagnosed_date__year=year, diagnosed_date__month=month)
+        history_filters.update(diagnosed_date__year=year, diagnosed_date__month=month)
     else:
-        histories = histories.filter(diagnosed_date__year=year)
+        history_filters['diagnosed_date__year'] = year
     
     # For BHW users: filter by facility instead of user_id
     # Check if requesting user is a BHW (not a doctor, not staff/superuser)
     is_bhw = False
     bhw_facility = None
     if not is_doctor and not request.user.is_staff and not request.user.is_superuser:
-        try:
-            bhw_profile = BHWRegistration.objects.select_related('facility').get(user=request.user)
-            if bhw_profile.facility:
-                is_bhw = True
-                bhw_facility = bhw_profile.facility
-        except BHWRegistration.DoesNotExist:
-            pass
+        bhw_facility_id = get_request_principal(request).bhw_facility_id
+        if bhw_facility_id:
+            is_bhw = True
+            bhw_facility = bhw_facility_id
     
     # Filter by facility_id if provided (explicit filter)
     if facility_id:
-        histories = histories.filter(patient_id__facility_id=facility_id)
+        history_filters['patient_id__facility_id'] = facility_id
     # For BHW users without explicit user_id: filter by their facility
     elif is_bhw and bhw_facility and not user_id:
-        histories = histories.filter(patient_id__facility=bhw_facility)
+        history_filters['patient_id__facility_id'] = bhw_facility
     # Filter by user_id if provided (for staff/superuser user-specific reports)
     # But if doctor and no explicit user_id param, we already filtered by examined_by referrals above
     elif user_id and not (is_doctor and not request.GET.get('user_id')):
-        histories = histories.filter(user_id=user_id)
+        history_filters['user_id'] = user_id
     
     # Filter to only include Medical_History records from completed referrals
     # Only show diagnoses from referrals that have been completed (status='completed')
     # Exclude records without a referral link (they're not part of the referral workflow)
-    histories = histories.filter(referral__status='completed')
-
-    # Normalize illnesses similar to API logic
-    disease_data = Disease.objects.values_list('name', 'icd_code', 'critical_level')
-    disease_name_map = {name.lower(): {'name': name, 'icd_code': icd_code, 'critical_level': level} 
-                        for name, icd_code, level in disease_data}
+    history_filters['referral__status'] = 'completed'
 
+    # Illnesses are normalized when saved (Medical_History.disease / illness_label),
+    # so case counts are grouped straight from the daily morbidity rollup, most
+    # recently diagnosed first
+    rollup = morbidity_rollup(**history_filters)
     normalized_counts = Counter()
     diagnosis_meta = {}
-    raw_entries = []
-
-    for history in histories.select_related('patient_id', 'patient_id__facility').order_by('-diagnosed_date'):
-        illness = (history.illness_name or '').strip()
-        illness_lc = illness.lower()
-        if illness_lc in ['cat bite', 'dog bite']:
-            normalized = 'possible rabies'
-        elif illness_lc == 'lbm':
-            normalized = 'gastrointestinal issue'
-        else:
-            normalized = illness_lc
-
-        disease_info = disease_name_map.get(normalized, {})
-        display_name = disease_info.get('name') or illness.title() or 'Unspecified'
-        icd_code = disease_info.get('icd_code', 'N/A')
-        critical_level = disease_info.get('critical_level', 'N/A')
-        diagnosis_meta.setdefault(display_name, {'icd_code': icd_code, 'critical_level': critical_level})
-        normalized_counts[display_name] += 1
+    for row in (
+        rollup.values('illness_label', 'disease__icd_code', 'disease__critical_level')
+        .annotate(total=Sum('count'), last_day=Max('day'))
+        .order_by('-last_day')
+    ):
+        display_name = row['illness_label'] or 'Unspecified'
+        diagnosis_meta.setdefault(display_name, {
+            'icd_code': row['disease__icd_code'] or 'N/A',
+            'critical_level': row['disease__critical_level'] or 'N/A',
+        })
+        normalized_counts[display_name] += row['total']
 
+    # Only the printed sample of entries needs the individual records
+    raw_entries = []
+    histories = (
+        Medical_History.objects.filter(**history_filters)
+        .select_related('patient_id', 'patient_id__facility')
+        .order_by('-diagnosed_date')[:50]  # limit for print readability
+    )
+    for history in histories:
         raw_entries.append({
             'patient_name': f"{history.patient_id.first_name} {history.patient_id.last_name}" if history.patient_id else '',
             'facility': history.patient_id.facility.name if history.patient_id and history.patient_id.facility else '',
             'diagnosed_date': history.diagnosed_date,
-            'illness_display': display_name,
-            'illness_raw': illness,
+            'illness_display': history.illness_label or 'Unspecified',
+            'illness_raw': (history.illness_name or '').strip(),
             'notes': history.notes,
             'advice': history.advice,
         })
@@ -1200,20 +1061,13 @@ def morbidity_report(request):
 
     # Build monthly trend data for chart table
     monthly_totals = defaultdict(lambda: Counter())
-    for diagnose in histories:
-        illness = (diagnose.illness_name or '').strip()
-        illness_lc = illness.lower()
-        if illness_lc in ['cat bite', 'dog bite']:
-            normalized = 'possible rabies'
-        elif illness_lc == 'lbm':
-            normalized = 'gastrointestinal issue'
-        else:
-            normalized = illness_lc
-
-        disease_info = disease_name_map.get(normalized, {})
-        display_name = disease_info.get('name') or illness.title() or 'Unspecified'
-        key = diagnose.diagnosed_date.strftime('%b')
-        monthly_totals[key][display_name] += 1
+    for row in (
+        rollup.annotate(month=ExtractMonth('day'))
+        .values('month', 'illness_label')
+        .annotate(total=Sum('count'))
+        .order_by()
+    ):
+        monthly_totals[calendar.month_abbr[row['month']]][row['illness_label'] or 'Unspecified'] += row['total']
 
     # Determine which months to show based on date range
     if date_from and date_to:
@@ -1280,7 +1134,7 @@ def morbidity_report(request):
         'total_cases': total_cases,
         'trend_table': trend_table,
         'month_labels': month_labels,
-        'raw_entries': raw_entries[:50],  # limit for print readability
+        'raw_entries': raw_entries,
         'diagnosis_meta': diagnosis_meta,
         'active_page': 'morbidity_report',
     }
@@ -1378,24 +1232,7 @@ def barangay_referral_performance_report(request):
         month_to = month_to if 1 <= month_to <= 12 else None
     
     # Get date_from and date_to parameters for direct date filtering
-    date_from_str = request.GET.get('date_from', '')
-    date_to_str = request.GET.get('date_to', '')
-    date_from = None
-    date_to = None
-    
-    if date_from_str:
-        try:
-            from datetime import datetime
-            date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
-    
-    if date_to_str:
-        try:
-            from datetime import datetime
-            date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
+    date_from, date_to = parse_date_window(request)
     
     user_id = parse_int(request.GET.get('user_id'))
 
@@ -1427,36 +1264,44 @@ def barangay_referral_performance_report(request):
     today = now.date()
     facilities_data = []
 
-    for facility in facilities:
-        # Build referral filters - priority: date_from/date_to > month_from/month_to > month > year
-        monthly_filters = {
-            'patient__facility': facility,
-        }
-        
-        if date_from and date_to:
-            monthly_filters['created_at__date__gte'] = date_from
-            monthly_filters['created_at__date__lte'] = date_to
-        elif date_from:
-            monthly_filters['created_at__date__gte'] = date_from
-        elif date_to:
-            monthly_filters['created_at__date__lte'] = date_to
-        elif month_from and month_to:
-            monthly_filters['created_at__year'] = year
-            monthly_filters['created_at__month__gte'] = month_from
-            monthly_filters['created_at__month__lte'] = month_to
-        elif month:
-            monthly_filters['created_at__year'] = year
-            monthly_filters['created_at__month'] = month
-        else:
-            monthly_filters['created_at__year'] = year
-        
-        # Filter by user_id if provided
-        if user_id:
-            monthly_filters['user_id'] = user_id
-
-        monthly_qs = Referral.objects.filter(**monthly_filters)
+    # Build referral filters - priority: date_from/date_to > month_from/month_to > month > year
+    monthly_filters = {
+        'patient__facility__in': facilities,
+    }
+    
+    if date_from and date_to:
+        monthly_filters['created_at__date__gte'] = date_from
+        monthly_filters['created_at__date__lte'] = date_to
+    elif date_from:
+        monthly_filters['created_at__date__gte'] = date_from
+    elif date_to:
+        monthly_filters['created_at__date__lte'] = date_to
+    elif month_from and month_to:
+        monthly_filters['created_at__year'] = year
+        monthly_filters['created_at__month__gte'] = month_from
+        monthly_filters['created_at__month__lte'] = month_to
+    elif month:
+        monthly_filters['created_at__year'] = year
+        monthly_filters['created_at__month'] = month
+    else:
+        monthly_filters['created_at__year'] = year
+    
+    # Filter by user_id if provided
+    if user_id:
+        monthly_filters['user_id'] = user_id
+
+    # Referral counts per facility and status, read from the daily rollup
+    status_counts = defaultdict(Counter)
+    for row in (
+        referral_rollup(**monthly_filters)
+        .values('facility_id', 'status')
+        .annotate(total=Sum('count'))
+        .order_by()
+    ):
+        status_counts[row['facility_id']][row['status']] += row['total']
 
-        monthly_counts = {status: monthly_qs.filter(status=status).count() for status in status_keys}
+    for facility in facilities:
+        monthly_counts = {status: status_counts[facility.pk][status] for status in status_keys}
         monthly_total = sum(monthly_counts.values())
 
         # Count follow-ups for this facility
@@ -1588,24 +1433,7 @@ def referral_registry_report(request):
         month_to = month_to if 1 <= month_to <= 12 else None
     
     # Get date_from and date_to parameters for direct date filtering
-    date_from_str = request.GET.get('date_from', '')
-    date_to_str = request.GET.get('date_to', '')
-    date_from = None
-    date_to = None
-    
-    if date_from_str:
-        try:
-            from datetime import datetime
-            date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
-    
-    if date_to_str:
-        try:
-            from datetime import datetime
-            date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
+    date_from, date_to = parse_date_window(request)
     
     facility_id = parse_int(request.GET.get('facility_id'))
     status_filter = request.GET.get('status') or ''
@@ -1737,7 +1565,6 @@ def get_disease_peak_predictions(request):
         JSON response with predictions for each month or aggregated range
     """
     from django.core.cache import cache
-    import hashlib
     
     month = request.GET.get('month', None)
     month_from = request.GET.get('month_from', None)
@@ -1756,7 +1583,7 @@ def get_disease_peak_predictions(request):
         cache_key_parts.append('all_months')
     if disease_filter:
         cache_key_parts.append(disease_filter)
-    cache_key = hashlib.md5('_'.join(cache_key_parts).encode()).hexdigest()
+    cache_key = forecast_cache_key(*cache_key_parts)
     
     # Check cache first
     cached_result = cache.get(cache_key)
@@ -1877,11 +1704,11 @@ def get_disease_peak_predictions(request):
             }
         }
         
-        cache.set(cache_key, aggregated_result, 3600)
+        cache.set(cache_key, aggregated_result, FORECAST_CACHE_TIMEOUT)
         return JsonResponse(aggregated_result)
     
-    # Cache predictions for 1 hour
-    cache.set(cache_key, result, 3600)  # 1 hour
+    # Keyed by the model version, so this only goes stale on retrain
+    cache.set(cache_key, result, FORECAST_CACHE_TIMEOUT)
     
     return JsonResponse(result)
 
@@ -1997,7 +1824,7 @@ def get_historical_disease_data(request):
     
     # Aggregate monthly by disease (aggregate ALL diseases first)
     df['MONTH_NAME'] = df['DATE'].dt.strftime('%B')
-    monthly_counts = df.groupby(['MONTH_NAME', 'ICD10 CODE']).size().reset_index(name='cases')
+    monthly_counts = df.groupby(['MONTH_NAME', 'ICD10 CODE'], observed=True).size().reset_index(name='cases')
     
     # Format results to match prediction format
     month_names = {
@@ -2106,7 +1933,6 @@ def train_barangay_disease_peak_model_api(request):
         JSON response with training status
     """
     from django.core.cache import cache
-    import hashlib
     import os
     
     use_db = request.GET.get('use_db', 'false').lower() == 'true'
@@ -2121,7 +1947,7 @@ def train_barangay_disease_peak_model_api(request):
     cache_key_parts = ['train_barangay_model', str(use_db)]
     if allowed_icd:
         cache_key_parts.append(','.join(sorted(allowed_icd)))
-    cache_key = hashlib.md5('_'.join(cache_key_parts).encode()).hexdigest()
+    cache_key = forecast_cache_key(*cache_key_parts)
     
     # Check if models exist on disk and are cached
     from analytics.ml_utils import get_ml_models_path
@@ -2150,31 +1976,27 @@ def train_barangay_disease_peak_model_api(request):
             "metadata_saved_to": metadata_path,
             "message": "Models already trained and saved. Use force_retrain=true to retrain."
         }
-        # Cache the result for 24 hours
-        cache.set(cache_key, result, 86400)  # 24 hours
+        # Cache the result for this model version
+        cache.set(cache_key, result, FORECAST_CACHE_TIMEOUT)
         return JsonResponse(result)
     
     # Train the model
+    # Keep the fit in this web worker; pre_train_forecast_models uses the process pool
     result = train_barangay_disease_peak_model(
         use_db=use_db,
-        allowed_icd=allowed_icd
+        allowed_icd=allowed_icd,
+        n_workers=getattr(settings, 'ML_WEB_TRAINING_WORKERS', 1)
     )
     
     if "error" in result:
         return JsonResponse(result, status=400)
     
-    # Cache the result for 24 hours
-    cache.set(cache_key, result, 86400)  # 24 hours
+    # The retrain moved every forecast key to a new model version; fill the new
+    # keys now so the next page load doesn't recompute
+    warm_forecast_caches(use_db=use_db)
     
-    # Invalidate prediction caches since models have been retrained
-    # Clear all barangay prediction caches
-    cache_keys_to_clear = [
-        'barangay_predictions',
-        'disease_peak_predictions'
-    ]
-    # Note: We can't easily clear all keys with a pattern in LocMemCache,
-    # but the cache will expire naturally. For production with Redis,
-    # you could use cache.delete_pattern('barangay_predictions*')
+    # Cache the result under the new version's key
+    cache.set(forecast_cache_key(*cache_key_parts), result, FORECAST_CACHE_TIMEOUT)
     
     return JsonResponse(result)
 
@@ -2194,7 +2016,6 @@ def get_barangay_disease_peak_predictions(request):
         JSON response with predictions per barangay per month
     """
     from django.core.cache import cache
-    import hashlib
     
     barangays_param = request.GET.get('barangays', None)
     use_db = request.GET.get('use_db', 'false').lower() == 'true'
@@ -2209,7 +2030,7 @@ def get_barangay_disease_peak_predictions(request):
         cache_key_parts.append(','.join(sorted(target_barangays)))
     else:
         cache_key_parts.append('all')
-    cache_key = hashlib.md5('_'.join(cache_key_parts).encode()).hexdigest()
+    cache_key = forecast_cache_key(*cache_key_parts)
     
     # Check cache first
     cached_result = cache.get(cache_key)
@@ -2228,8 +2049,8 @@ def get_barangay_disease_peak_predictions(request):
     if "error" in result:
         return JsonResponse(result, status=400)
     
-    # Cache predictions for 1 hour (predictions don't change unless model is retrained)
-    cache.set(cache_key, result, 3600)  # 1 hour
+    # Cache predictions for this model version (they don't change unless the model is retrained)
+    cache.set(cache_key, result, FORECAST_CACHE_TIMEOUT)
     
     return JsonResponse(result)
 
@@ -2257,14 +2078,14 @@ def get_barangay_heatmap_data(request):
             }
         }
     """
-    from facilities.models import Facility
+    from analytics.barangay_index import BarangayFacilityIndex
     from django.core.cache import cache
-    import hashlib
     
     use_db = request.GET.get('use_db', 'false').lower() == 'true'
+    facility_index = BarangayFacilityIndex.get()
     
-    # Create cache key
-    cache_key = hashlib.md5(f'barangay_heatmap_data_{use_db}'.encode()).hexdigest()
+    # Create cache key (a retrain or a Facility/Barangay change moves it to a new version)
+    cache_key = forecast_cache_key('barangay_heatmap_data', use_db, facility_index['version'])
     
     # Check cache first
     cached_result = cache.get(cache_key)
@@ -2280,29 +2101,11 @@ def get_barangay_heatmap_data(request):
     if "error" in barangay_predictions:
         return JsonResponse(barangay_predictions, status=400)
     
-    # Get all facilities
-    facilities = Facility.objects.all()
-    
     # Match barangay to facilities and combine
     results = {}
     for barangay_name, monthly_data in barangay_predictions.items():
-        # Find facilities matching this barangay
-        # Match if: barangay name is in facility name, or facility.barangay matches
-        matching_facilities = []
-        for facility in facilities:
-            facility_name_upper = (facility.name or '').upper()
-            facility_barangay_upper = (facility.barangay or '').upper()
-            barangay_upper = barangay_name.upper()
-            
-            # Match if barangay name appears in facility name or facility.barangay matches
-            if (barangay_upper in facility_name_upper or 
-                facility_barangay_upper == barangay_upper or
-                facility_name_upper == barangay_upper):
-                matching_facilities.append({
-                    'lat': float(facility.latitude),
-                    'lng': float(facility.longitude),
-                    'facility_name': facility.name
-                })
+        # Facilities whose name contains the barangay name or whose barangay is it
+        matching_facilities = BarangayFacilityIndex.coordinates(barangay_name, facility_index)
         
         if not matching_facilities:
             continue  # Skip if no matching facilities
@@ -2328,8 +2131,8 @@ def get_barangay_heatmap_data(request):
                 'coordinates': matching_facilities
             }
     
-    # Cache for 1 hour
-    cache.set(cache_key, results, 3600)
+    # Keyed by the model and facility index versions
+    cache.set(cache_key, results, FORECAST_CACHE_TIMEOUT)
     
     return JsonResponse(results)
 
@@ -2358,7 +2161,6 @@ def get_barangay_breakdown(request):
     """
     import pandas as pd
     from django.core.cache import cache
-    import hashlib
     
     year = int(request.GET.get('year', 2025))
     month = request.GET.get('month', 'January')
@@ -2373,7 +2175,7 @@ def get_barangay_breakdown(request):
     month_num = month_map.get(month, 1)
     
     # Create cache key
-    cache_key = hashlib.md5(f'barangay_breakdown_{year}_{month}_{disease}_{use_db}'.encode()).hexdigest()
+    cache_key = forecast_cache_key('barangay_breakdown', year, month, disease, use_db)
     cached_result = cache.get(cache_key)
     if cached_result:
         return JsonResponse(cached_result)
@@ -2415,7 +2217,7 @@ def get_barangay_breakdown(request):
         
         # Group by barangay
         if 'SITIO/BARANGAY' in df.columns:
-            barangay_counts = df.groupby('SITIO/BARANGAY').size().reset_index(name='cases')
+            barangay_counts = df.groupby('SITIO/BARANGAY', observed=True).size().reset_index(name='cases')
         else:
             return JsonResponse({
                 "total_cases": 0,
@@ -2497,8 +2299,8 @@ def get_barangay_breakdown(request):
         "disease": disease
     }
     
-    # Cache for 1 hour
-    cache.set(cache_key, result, 3600)
+    # Forecasts only change on retrain; historical counts follow new referrals
+    cache.set(cache_key, result, FORECAST_CACHE_TIMEOUT if year >= 2025 else 3600)
     
     return JsonResponse(result)
 
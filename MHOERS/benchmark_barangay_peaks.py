@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Benchmark the result assembly of predict_barangay_disease_peak_2025: the previous
+pandas version (re-filtering pred_df per barangay/month and iterrows) vs the
+argmax over the (barangay, disease, month) array (summarize_barangay_peaks).
+
+Uses a synthetic forecast of 50 barangays x 20 diseases, no database required.
+Fails if the two produce different results.
+
+    python benchmark_barangay_peaks.py
+"""
+import os
+import time
+
+import django
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MHOERS.settings')
+django.setup()
+
+import numpy as np
+import pandas as pd
+
+from analytics.ml_utils import summarize_barangay_peaks
+
+N_BARANGAYS = 50
+N_DISEASES = 20
+REPEATS = 5
+
+
+def synthetic_forecast(seed=42):
+    """Forecast cases with ties, negatives and ~10% of pairs without a model"""
+    rng = np.random.default_rng(seed)
+    forecast = rng.gamma(2.0, 4.0, size=(N_BARANGAYS, N_DISEASES, 12)) - 1.0
+    forecast[rng.random((N_BARANGAYS, N_DISEASES)) < 0.1] = np.nan
+    forecast[-1] = np.nan  # a barangay without any model
+    barangays = [f'BARANGAY {i:02d}' for i in range(N_BARANGAYS)]
+    diseases = [f'D{j:02d}.{j % 3}' for j in range(N_DISEASES)]
+    return barangays, diseases, forecast
+
+
+def legacy_summarize(barangays, diseases, forecast):
+    """The previous implementation, starting from the same forecast values"""
+    predictions = []
+    for i, barangay in enumerate(barangays):
+        for j, disease in enumerate(diseases):
+            if np.isnan(forecast[i, j, 0]):
+                continue
+            for m, p in zip(range(1, 13), forecast[i, j]):
+                predictions.append({
+                    'Barangay': barangay,
+                    'Disease': disease,
+                    'Year': 2025,
+                    'Month': m,
+                    'Predicted_Cases': max(0, int(round(p)))
+                })
+
+    pred_df = pd.DataFrame(predictions)
+    peak_disease = (
+        pred_df.sort_values(['Barangay', 'Month', 'Predicted_Cases'], ascending=[True, True, False])
+        .groupby(['Barangay', 'Month'])
+        .first()
+        .reset_index()
+    )
+
+    results = {}
+    for barangay in barangays:
+        results[barangay] = {}
+        barangay_preds = pred_df[pred_df['Barangay'] == barangay]
+        for month in range(1, 13):
+            month_data = barangay_preds[barangay_preds['Month'] == month]
+            peak = peak_disease[
+                (peak_disease['Barangay'] == barangay) &
+                (peak_disease['Month'] == month)
+            ]
+            all_diseases = {}
+            for _, row in month_data.iterrows():
+                all_diseases[str(row['Disease'])] = int(row['Predicted_Cases'])
+            if not peak.empty:
+                results[barangay][month] = {
+                    'peak_disease': str(peak.iloc[0]['Disease']),
+                    'peak_cases': int(peak.iloc[0]['Predicted_Cases']),
+                    'all_diseases': all_diseases
+                }
+            else:
+                results[barangay][month] = {
+                    'peak_disease': None,
+                    'peak_cases': 0,
+                    'all_diseases': all_diseases
+                }
+    return results
+
+
+def best_of(func, *args):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def main():
+    barangays, diseases, forecast = synthetic_forecast()
+    print(f"{N_BARANGAYS} barangays x {N_DISEASES} diseases x 12 months "
+          f"({int((~np.isnan(forecast[:, :, 0])).sum())} modelled pairs), best of {REPEATS}\n")
+
+    legacy, t_legacy = best_of(legacy_summarize, barangays, diseases, forecast)
+    print(f"  {'legacy (pandas filters + iterrows)':<38} {t_legacy * 1000:9.1f} ms")
+    vectorized, t_vectorized = best_of(summarize_barangay_peaks, barangays, diseases, forecast)
+    print(f"  {'summarize_barangay_peaks (argmax)':<38} {t_vectorized * 1000:9.1f} ms")
+
+    assert vectorized == legacy, "results differ from the legacy implementation"
+    print(f"\nResults identical. Speedup: {t_legacy / t_vectorized:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
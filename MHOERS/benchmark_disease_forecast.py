@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Benchmark the 2025 monthly disease forecast: legacy per-row loop vs the
+batched recursive forecaster (analytics.ml_utils.forecast_daily_cases).
+
+Uses the shipped disease_forecast_best_* artifacts, no database required.
+
+    python benchmark_disease_forecast.py
+"""
+import os
+import time
+
+import django
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MHOERS.settings')
+django.setup()
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from analytics.ml_utils import get_ml_models_path, forecast_daily_cases
+
+
+def load_artifacts():
+    models_dir = get_ml_models_path()
+    model = joblib.load(os.path.join(models_dir, 'disease_forecast_best_model.pkl'))
+    scaler = joblib.load(os.path.join(models_dir, 'disease_forecast_best_scaler.pkl'))
+    le = joblib.load(os.path.join(models_dir, 'disease_forecast_best_encoder.pkl'))
+    metadata = joblib.load(os.path.join(models_dir, 'disease_forecast_best_metadata.pkl'))
+    return model, scaler, le, metadata
+
+
+def monthly_totals(future_df):
+    """Same monthly aggregation/rounding as predict_disease_forecast_2025_monthly"""
+    monthly = (
+        future_df.groupby(['ICD10 CODE', future_df['DATE'].dt.to_period('M')])
+        ['predicted_cases'].sum().reset_index()
+    )
+    return {
+        (str(row['ICD10 CODE']), str(row['DATE'])): int(round(row['predicted_cases']))
+        for _, row in monthly.iterrows()
+    }
+
+
+def legacy_forecast(model, scaler, le, metadata, flush_every):
+    """
+    The previous implementation: iterrows over (disease, day), re-filtering the
+    growing history for every row. flush_every=100 is what shipped (predictions
+    reach the history in batches of 100 rows); flush_every=1 is the exact recursion.
+    """
+    features = metadata['features']
+    history_df = metadata['history_df'].copy()
+    diseases = history_df['ICD10 CODE'].unique()
+    future_dates = pd.date_range(start='2025-01-01', end='2025-12-31')
+    future_df = pd.DataFrame(
+        [(d, date) for d in diseases for date in future_dates],
+        columns=['ICD10 CODE', 'DATE']
+    )
+    future_df['ICD10_CODE_ENC'] = le.transform(future_df['ICD10 CODE'])
+
+    predictions = []
+    history = history_df.copy()
+    new_rows_list = []
+    for _, row in future_df.iterrows():
+        disease = row['ICD10_CODE_ENC']
+        disease_history = history[history['ICD10_CODE_ENC'] == disease].sort_values('DATE')
+
+        lag1 = disease_history['cases'].iloc[-1] if len(disease_history) >= 1 else 0
+        lag7 = disease_history['cases'].iloc[-7] if len(disease_history) >= 7 else 0
+        lag30 = disease_history['cases'].iloc[-30] if len(disease_history) >= 30 else 0
+        ma7 = disease_history['cases'].iloc[-7:].mean() if len(disease_history) >= 7 else lag1
+        ma30 = disease_history['cases'].iloc[-30:].mean() if len(disease_history) >= 30 else lag1
+
+        x_pred = pd.DataFrame([[disease, lag1, lag7, lag30, ma7, ma30]], columns=features)
+        if metadata['best_model_name'] == "Linear SVR":
+            pred = model.predict(scaler.transform(x_pred))[0]
+        else:
+            pred = model.predict(x_pred)[0]
+        predictions.append(max(0, pred))
+
+        new_rows_list.append({
+            'DATE': row['DATE'],
+            'ICD10_CODE_ENC': disease,
+            'cases': pred,
+            'ICD10 CODE': row['ICD10 CODE']
+        })
+        if len(new_rows_list) >= flush_every:
+            history = pd.concat([history, pd.DataFrame(new_rows_list)], ignore_index=True)
+            new_rows_list = []
+
+    future_df['predicted_cases'] = predictions
+    return monthly_totals(future_df)
+
+
+def batched_forecast(model, scaler, le, metadata):
+    history_df = metadata['history_df']
+    diseases = history_df['ICD10 CODE'].unique()
+    future_dates = pd.date_range(start='2025-01-01', end='2025-12-31')
+    daily = forecast_daily_cases(
+        model,
+        history_df,
+        le.transform(diseases),
+        len(future_dates),
+        metadata['features'],
+        scaler=scaler if metadata['best_model_name'] == "Linear SVR" else None
+    )
+    future_df = pd.DataFrame({
+        'ICD10 CODE': np.repeat(diseases, len(future_dates)),
+        'DATE': np.tile(future_dates, len(diseases)),
+        'predicted_cases': np.maximum(daily, 0).ravel(),
+    })
+    return monthly_totals(future_df)
+
+
+def timed(label, func, *args):
+    start_time = time.time()
+    result = func(*args)
+    elapsed = time.time() - start_time
+    print(f"{label:<40} {elapsed:8.2f}s")
+    return result, elapsed
+
+
+def count_mismatches(left, right):
+    return sum(1 for key in left if left[key] != right.get(key)) + len(set(right) - set(left))
+
+
+if __name__ == "__main__":
+    print("Disease Forecast Benchmark")
+    print("=" * 50)
+
+    artifacts = load_artifacts()
+    history_df = artifacts[3]['history_df']
+    print(f"History rows: {len(history_df)}, diseases: {history_df['ICD10 CODE'].nunique()}, "
+          f"model: {artifacts[3]['best_model_name']}\n")
+
+    batched, batched_time = timed("Batched recursive forecaster", batched_forecast, *artifacts)
+    exact, exact_time = timed("Legacy loop, per-row history update", legacy_forecast, *artifacts, 1)
+    shipped, shipped_time = timed("Legacy loop, 100-row history flush", legacy_forecast, *artifacts, 100)
+
+    print()
+    print(f"Speedup vs per-row loop:   {exact_time / batched_time:6.1f}x")
+    print(f"Speedup vs 100-row flush:  {shipped_time / batched_time:6.1f}x")
+    print(f"Monthly cells differing from per-row recursion: "
+          f"{count_mismatches(exact, batched)} / {len(exact)}")
+    print(f"Monthly cells where the 100-row flush diverged (stale lags): "
+          f"{count_mismatches(exact, shipped)} / {len(exact)}")
@@ -11,6 +11,7 @@ from asgiref.sync import async_to_sync
 from .models import Conversation, Message, MessageNotification
 from .forms import MessageForm
 from accounts.models import BHWRegistration
+from notifications.badges import invalidate_user_badges
 import json
 
 
@@ -95,6 +96,8 @@ def conversation_detail(request, conversation_id):
         user=request.user,
         conversation=conversation
     ).update(unread_count=0)
+    # .update() skips signals: refresh the navbar badge explicitly
+    invalidate_user_badges(request.user.id)
     
     # Get messages for this conversation (exclude deleted messages)
     messages_list = conversation.messages.filter(is_deleted=False).order_by('created_at')
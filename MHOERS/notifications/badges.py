@@ -0,0 +1,170 @@
+"""
+Navbar badge counters (notifications, pending users, active referrals, follow-ups,
+unread chat messages) computed with aggregate queries and cached per user.
+
+Per-user counters live for BADGE_CACHE_TIMEOUT seconds and are dropped early by
+notifications.signals: Notification/MessageNotification writes invalidate the
+affected user, Referral/Medical_History/FollowUpVisit writes bump a shared
+generation number (their counters depend on facility scope, not on one user),
+and registration profile writes drop the shared pending-users counters.
+"""
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q, Sum
+
+BADGE_CACHE_TIMEOUT = 30
+PENDING_USERS_CACHE_TIMEOUT = 60
+BADGE_GENERATION_KEY = 'badges_generation'
+PENDING_USERS_CACHE_KEY = 'badges_pending_users_v1'
+
+EMPTY_BADGES = {
+    'unread_count': 0,
+    'user_unread_count': 0,
+    'pending_users_count': 0,
+    'pending_bhw_count': 0,
+    'pending_doctors_count': 0,
+    'pending_nurses_count': 0,
+    'active_referrals_count': 0,
+    'followups_count': 0,
+    'unread_message_count': 0,
+}
+
+
+def _generation():
+    generation = cache.get(BADGE_GENERATION_KEY)
+    if generation is None:
+        generation = 1
+        cache.add(BADGE_GENERATION_KEY, generation, None)
+    return generation
+
+
+def _user_key(user_id, generation=None):
+    return f'badges_v1_{user_id}_{generation or _generation()}'
+
+
+def invalidate_user_badges(user_id):
+    if user_id:
+        cache.delete(_user_key(user_id))
+
+
+def invalidate_all_badges():
+    """Expire every user's counters at once (referral / follow-up writes)"""
+    try:
+        cache.incr(BADGE_GENERATION_KEY)
+    except ValueError:
+        cache.set(BADGE_GENERATION_KEY, 2, None)
+
+
+def invalidate_pending_users():
+    cache.delete(PENDING_USERS_CACHE_KEY)
+    invalidate_all_badges()
+
+
+def pending_users_counts():
+    """Pending BHW/Doctor/Nurse registrations, shared by all admins"""
+    counts = cache.get(PENDING_USERS_CACHE_KEY)
+    if counts is None:
+        from accounts.models import BHWRegistration, Doctors, Nurses
+
+        counts = {
+            'pending_bhw_count': BHWRegistration.objects.filter(status='PENDING_APPROVAL').count(),
+            'pending_doctors_count': Doctors.objects.filter(status='PENDING_APPROVAL').count(),
+            'pending_nurses_count': Nurses.objects.filter(status='PENDING_APPROVAL').count(),
+        }
+        counts['pending_users_count'] = (
+            counts['pending_bhw_count'] + counts['pending_doctors_count'] + counts['pending_nurses_count']
+        )
+        cache.set(PENDING_USERS_CACHE_KEY, counts, PENDING_USERS_CACHE_TIMEOUT)
+    return counts
+
+
+def doctor_notifications_filter():
+    """Doctors only see referral_sent notifications for referrals created by active, non-admin BHWs"""
+    from accounts.models import BHWRegistration
+
+    active_bhw = BHWRegistration.objects.filter(
+        status='ACTIVE', user_id=OuterRef('referral__user_id')
+    ).exclude(user__is_staff=True).exclude(user__is_superuser=True)
+    return Q(notification_type='referral_sent') & Q(Exists(active_bhw))
+
+
+def _unread_counts(user, principal, pending):
+    from .models import Notification
+
+    if principal.is_doctor:
+        unread_count = Notification.objects.filter(
+            doctor_notifications_filter(), recipient=user, is_read=False
+        ).count()
+        return unread_count, 0
+    if user.is_staff or user.is_superuser:
+        # Admins only receive account approval requests
+        return pending['pending_users_count'], 0
+    return 0, Notification.objects.filter(recipient=user, is_read=False).count()
+
+
+def _active_referrals_count(user, principal):
+    from referrals.models import Referral
+
+    referrals = Referral.objects.filter(status__in=['pending', 'in-progress'])
+    if user.is_staff or user.is_superuser:
+        return referrals.count()
+    facility_ids = principal.shared_facility_ids
+    if not facility_ids:
+        return 0
+    return referrals.filter(
+        Q(facility_id__in=facility_ids) | Q(patient__facility_id__in=facility_ids)
+    ).count()
+
+
+def _followups_count(user, principal):
+    """Follow-ups without a completed FollowUpVisit, in one COUNT query"""
+    from patients.models import Medical_History
+    from referrals.models import FollowUpVisit
+
+    followups = Medical_History.objects.filter(followup_date__isnull=False)
+    if not (user.is_staff or user.is_superuser) and not principal.is_doctor:
+        # Non-doctor users (BHW) only see their facilities' follow-ups
+        facility_ids = principal.shared_facility_ids
+        if not facility_ids:
+            return 0
+        followups = followups.filter(patient_id__facility_id__in=facility_ids)
+
+    completed_visit = FollowUpVisit.objects.filter(medical_history=OuterRef('pk'), status='completed')
+    return followups.exclude(Exists(completed_visit)).count()
+
+
+def _unread_message_count(user):
+    from chat.models import MessageNotification
+
+    return MessageNotification.objects.filter(user=user).aggregate(
+        total=Sum('unread_count')
+    )['total'] or 0
+
+
+def compute_badges(user, principal):
+    pending = pending_users_counts()
+    unread_count, user_unread_count = _unread_counts(user, principal, pending)
+    badges = dict(pending)
+    badges.update({
+        'unread_count': unread_count,
+        'user_unread_count': user_unread_count,
+        'active_referrals_count': _active_referrals_count(user, principal),
+        'followups_count': _followups_count(user, principal),
+        'unread_message_count': _unread_message_count(user),
+    })
+    return badges
+
+
+def get_badges(request):
+    """All navbar counters for request.user, from the per-user cache when fresh"""
+    from accounts.principal import get_request_principal
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return dict(EMPTY_BADGES)
+
+    key = _user_key(user.pk)
+    badges = cache.get(key)
+    if badges is None:
+        badges = compute_badges(user, get_request_principal(request))
+        cache.set(key, badges, BADGE_CACHE_TIMEOUT)
+    return badges
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 01:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('referral_sent', 'Referral Sent'), ('referral_completed', 'Referral Completed'), ('referral_accepted', 'Referral Accepted'), ('referral_rejected', 'Referral Rejected'), ('password_reset_request', 'Password Reset Request'), ('export_ready', 'Export Ready')], default='referral_sent', max_length=25),
+        ),
+    ]
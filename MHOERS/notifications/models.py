@@ -8,6 +8,7 @@ class Notification(models.Model):
         ('referral_accepted', 'Referral Accepted'),
         ('referral_rejected', 'Referral Rejected'),
         ('password_reset_request', 'Password Reset Request'),
+        ('export_ready', 'Export Ready'),
     ]
     
     notification_id = models.AutoField(primary_key=True)
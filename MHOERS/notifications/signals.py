@@ -0,0 +1,43 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from accounts.models import BHWRegistration, Doctors, Nurses
+from chat.models import MessageNotification
+from patients.models import Medical_History
+from referrals.models import Referral, FollowUpVisit
+
+from .badges import invalidate_user_badges, invalidate_all_badges, invalidate_pending_users
+from .models import Notification
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def _notification_changed(sender, instance, **kwargs):
+    invalidate_user_badges(instance.recipient_id)
+
+
+@receiver(post_save, sender=MessageNotification)
+@receiver(post_delete, sender=MessageNotification)
+def _message_notification_changed(sender, instance, **kwargs):
+    invalidate_user_badges(instance.user_id)
+
+
+@receiver(post_save, sender=Referral)
+@receiver(post_delete, sender=Referral)
+@receiver(post_save, sender=Medical_History)
+@receiver(post_delete, sender=Medical_History)
+@receiver(post_save, sender=FollowUpVisit)
+@receiver(post_delete, sender=FollowUpVisit)
+def _referral_data_changed(sender, **kwargs):
+    # Active referral / follow-up counts are facility-scoped: expire everyone's badges
+    invalidate_all_badges()
+
+
+@receiver(post_save, sender=BHWRegistration)
+@receiver(post_delete, sender=BHWRegistration)
+@receiver(post_save, sender=Doctors)
+@receiver(post_delete, sender=Doctors)
+@receiver(post_save, sender=Nurses)
+@receiver(post_delete, sender=Nurses)
+def _registration_changed(sender, **kwargs):
+    invalidate_pending_users()
@@ -1,3 +1,105 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from facilities.models import Facility
+from notifications.models import Notification
+from patients.models import Patient, Medical_History
+from referrals.models import Referral
+
+
+class BadgeCountsTestCase(TestCase):
+    """Tests for the cached navbar counters (notifications.badges)"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='badgeuser', password='testpass123')
+        self.facility = Facility.objects.create(name='Badge Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        self.facility.users.add(self.user)
+        self.patient = Patient.objects.create(
+            first_name='Ana', last_name='Cruz', p_address='Street', p_number='09123456789',
+            user=self.user, date_of_birth=date(1990, 1, 1), sex='Female', facility=self.facility
+        )
+        self.referral = Referral.objects.create(
+            facility=self.facility, user=self.user, patient=self.patient,
+            weight=Decimal('60.0'), height=Decimal('160.0'), bp_systolic=120, bp_diastolic=80,
+            pulse_rate=70, respiratory_rate=16, temperature=Decimal('37.0'), oxygen_saturation=98,
+            chief_complaint='-', symptoms='-', work_up_details='-', initial_diagnosis='-'
+        )
+        Medical_History.objects.create(
+            user_id=self.user, patient_id=self.patient, illness_name='Flu', notes='-', advice='-',
+            diagnosed_date=date.today(), followup_date=date.today() + timedelta(days=3)
+        )
+        self.client.force_login(self.user)
+
+    def test_endpoint_returns_counts_and_is_cached(self):
+        url = reverse('notifications:badge_counts')
+        badges = self.client.get(url).json()
+        self.assertEqual(badges['active_referrals_count'], 1)
+        self.assertEqual(badges['followups_count'], 1)
+        self.assertEqual(badges['user_unread_count'], 0)
+
+        # Second poll is served from the per-user cache
+        with self.assertNumQueries(2):  # session + user lookup only
+            self.client.get(url)
+
+    def test_invalidated_on_writes(self):
+        url = reverse('notifications:badge_counts')
+        self.client.get(url)
+
+        Notification.objects.create(recipient=self.user, title='t', message='m', notification_type='referral_completed')
+        self.assertEqual(self.client.get(url).json()['user_unread_count'], 1)
+
+        self.referral.status = 'completed'
+        self.referral.save()
+        self.assertEqual(self.client.get(url).json()['active_referrals_count'], 0)
+
+
+class NotificationsListTestCase(TestCase):
+    """Tests for the paginated notification inbox reading stored predictions"""
+
+    def setUp(self):
+        from analytics.models import ReferralPrediction
+
+        cache.clear()
+        self.user = User.objects.create_user(username='inboxuser', password='testpass123')
+        facility = Facility.objects.create(name='Inbox Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        patient = Patient.objects.create(
+            first_name='Ben', last_name='Reyes', p_address='Street', p_number='09123456789',
+            user=self.user, date_of_birth=date(1990, 1, 1), sex='Male', facility=facility
+        )
+        for i in range(30):
+            referral = Referral.objects.create(
+                facility=facility, user=self.user, patient=patient,
+                weight=Decimal('60.0'), height=Decimal('160.0'), bp_systolic=120, bp_diastolic=80,
+                pulse_rate=70, respiratory_rate=16, temperature=Decimal('37.0'), oxygen_saturation=98,
+                chief_complaint='-', symptoms='-', work_up_details='-', initial_diagnosis='-'
+            )
+            ReferralPrediction.objects.create(
+                referral=referral, icd_code='J06.9', predicted_minutes=15, feature_hash='-', model_version='-'
+            )
+            Notification.objects.create(
+                recipient=self.user, referral=referral, title=f'Done {i}', message='m',
+                notification_type='referral_completed'
+            )
+        self.client.force_login(self.user)
+
+    def test_inbox_is_paginated_and_uses_stored_predictions(self):
+        from unittest import mock
+
+        url = reverse('notifications:notification_list')
+        with mock.patch('analytics.prediction_store.refresh_referral_predictions') as refresh:
+            response = self.client.get(url)
+        refresh.assert_not_called()
+
+        page = response.context['notifications']
+        self.assertEqual(len(page), 25)
+        self.assertEqual(response.context['unread_count'], 30)
+        self.assertEqual(set(map(tuple, response.context['predictions'].values())), {('J06.9', 15)})
 
-# Create your tests here.
+        response = self.client.get(url, {'page': 2})
+        self.assertEqual(len(response.context['notifications']), 5)
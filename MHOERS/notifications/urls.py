@@ -4,6 +4,7 @@ app_name = 'notifications'
 
 urlpatterns = [
     path('check/', views.check_notifications, name='check_notifications'),
+    path('badges/', views.badge_counts, name='badge_counts'),
     path('all/', views.notifications_list, name='notification_list'),
     path('mark_notification_read/<int:notification_id>/', views.mark_notification_read, name='mark_notification_read'),
     path('mark_all_read/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
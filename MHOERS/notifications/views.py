@@ -2,33 +2,28 @@ from django.shortcuts import get_object_or_404, render, redirect
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from .models import Notification
+from .badges import get_badges, invalidate_user_badges
+from accounts.principal import get_principal
 from django.contrib.auth.models import Group
 from patients.models import Patient
 from referrals.models import Referral
-from analytics.ml_utils import predict_disease_for_referral, random_forest_regression_prediction_time
+from analytics.prediction_store import get_stored_predictions
 from analytics.models import Disease
 from django.db.models import Count, Q
+from django.core.paginator import Paginator
 from facilities.models import Facility
 
+NOTIFICATIONS_PER_PAGE = 25
+
 def is_doctor(user):
     """Check if user is a doctor"""
-    try:
-        from accounts.models import Doctors
-        doctor = Doctors.objects.get(user=user)
-        return doctor.status == 'ACTIVE'
-    except:
-        return False
+    return get_principal(user).is_doctor
 
 def is_bhw_user(user):
     """Check if user is a BHW (not staff/superuser)"""
     if user.is_staff or user.is_superuser:
         return False
-    try:
-        from accounts.models import BHWRegistration
-        bhw = BHWRegistration.objects.get(user=user)
-        return bhw.status == 'ACTIVE'
-    except:
-        return False
+    return get_principal(user).is_active_role('bhw')
 
 @login_required
 def check_notifications(request):
@@ -74,6 +69,12 @@ def check_notifications(request):
     
     return JsonResponse({'unseen_count': unread_count})
 
+
+@login_required
+def badge_counts(request):
+    """Navbar badge counters as JSON, so pages can poll badges without re-rendering"""
+    return JsonResponse(get_badges(request))
+
 @login_required
 def notifications_list(request):
     # Filter notifications based on user role
@@ -95,7 +96,7 @@ def notifications_list(request):
                 recipient=request.user,
                 notification_type='referral_sent',
                 referral__user_id__in=bhw_user_ids
-            ).select_related('referral__user').order_by('-created_at')
+            ).select_related('referral__user', 'referral__patient', 'referral__prediction').order_by('-created_at')
         else:
             notifications = Notification.objects.none()
         
@@ -114,28 +115,34 @@ def notifications_list(request):
         notifications = Notification.objects.filter(
             recipient=request.user,
             notification_type='referral_completed'
-        ).select_related('referral__user').order_by('-created_at')
+        ).select_related('referral__user', 'referral__patient', 'referral__prediction').order_by('-created_at')
         
         # Users don't see admin notifications
         admin_notif = None
         all_referrals = None
     
-    # Get predictions for notifications with referrals
+    # Only the current page is rendered and scored; stored predictions are read
+    # in the same query and missing ones are filled in one batch
+    page_obj = Paginator(notifications, NOTIFICATIONS_PER_PAGE).get_page(request.GET.get('page'))
+    page_referrals = [n.referral for n in page_obj if n.referral]
+    try:
+        stored = get_stored_predictions(page_referrals)
+    except Exception:
+        stored = {}
     predictions = {}
-    for notification in notifications:
+    for notification in page_obj:
         if notification.referral:
-            try:
-                disease_pred = predict_disease_for_referral(notification.referral.referral_id)
-                time_pred =random_forest_regression_prediction_time(notification.referral.referral_id)
-                predictions[notification.notification_id] = [disease_pred, time_pred] 
-            except Exception:
-                predictions[notification.notification_id] = ['No prediction available', 0]
+            disease_pred, time_pred = stored.get(
+                notification.referral.referral_id, ('No prediction available', 0)
+            )
+            predictions[notification.notification_id] = [disease_pred, time_pred]
     
     # Get unread count for the notification badge
     unread_count = notifications.filter(is_read=False).count()
     
     context = {
-        'notifications': notifications,
+        'notifications': page_obj,
+        'page_obj': page_obj,
         'admin_notif': admin_notif,
         'all_referrals': all_referrals,
         'predictions': predictions,
@@ -173,8 +180,7 @@ def get_notification_details(request, notification_id):
     prediction_data = None
     if notification.referral:
         try:
-            disease_pred = predict_disease_for_referral(notification.referral.referral_id)
-            time_pred =random_forest_regression_prediction_time(notification.referral.referral_id)
+            disease_pred, time_pred = get_stored_predictions([notification.referral])[notification.referral.referral_id]
             prediction_data = {
                 'disease': disease_pred,
                 'time': time_pred
@@ -275,5 +281,8 @@ def mark_all_notifications_read(request):
             notification_type=relevant_type,
         ).update(is_read=True)
 
+    # .update() skips signals: refresh the navbar badges explicitly
+    invalidate_user_badges(request.user.id)
+
     # Redirect back to notifications list
     return redirect('notifications:notification_list')
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-17 01:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('patients', '0003_smsreminderlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medical_history',
+            name='disease',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='medical_histories', to='analytics.disease'),
+        ),
+        migrations.AddField(
+            model_name='medical_history',
+            name='illness_label',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def backfill_illness_labels(apps, schema_editor):
+    """
+    Resolve disease / illness_label for the medical histories that existed before
+    the columns were added (same rules as analytics.illness.resolve_illness)
+    """
+    from analytics.illness import illness_key
+
+    db = schema_editor.connection.alias
+    Disease = apps.get_model('analytics', 'Disease')
+    Medical_History = apps.get_model('patients', 'Medical_History')
+
+    diseases = {name.lower(): (pk, name) for pk, name in Disease.objects.using(db).values_list('pk', 'name')}
+    names = Medical_History.objects.using(db).values_list('illness_name', flat=True).distinct().order_by()
+    for name in list(names):
+        disease_id, label = diseases.get(illness_key(name), (None, (name or '').strip().title() or 'Unspecified'))
+        Medical_History.objects.using(db).filter(illness_name=name).update(disease_id=disease_id, illness_label=label)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('patients', '0004_medical_history_illness_label'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_illness_labels, migrations.RunPython.noop),
+    ]
@@ -80,6 +80,9 @@ class Medical_History(models.Model):
     advice = models.TextField()
     followup_date = models.DateField(null=True, blank=True)
     referral = models.ForeignKey('referrals.Referral', on_delete=models.CASCADE, null=True, blank=True, related_name='medical_history')
+    # Normalized illness_name, set on save by analytics.signals (see analytics.illness)
+    disease = models.ForeignKey('analytics.Disease', on_delete=models.SET_NULL, null=True, blank=True, related_name='medical_histories')
+    illness_label = models.CharField(max_length=255, blank=True, default='', db_index=True)
     
     def __str__(self):
         return f"{self.illness_name} - {self.patient.first_name} {self.patient.last_name}"
@@ -421,20 +421,15 @@ def search_patients(request):
         if not request.user.is_staff:
             # Get the facility associated with the current user
             # First check if user is BHW and get facility from BHWRegistration
-            facility = None
-            try:
-                from accounts.models import BHWRegistration
-                bhw_profile = BHWRegistration.objects.get(user=request.user)
-                facility = bhw_profile.facility
-            except BHWRegistration.DoesNotExist:
+            principal = request.principal
+            if principal.is_bhw:
+                facility_id = principal.bhw_facility_id
+            else:
                 # If not BHW, check shared_facilities
-                try:
-                    facility = Facility.objects.get(users=request.user)
-                except Facility.DoesNotExist:
-                    pass
+                facility_id = principal.shared_facility_ids[0] if principal.shared_facility_ids else None
             
-            if facility:
-                qs = qs.filter(facility=facility)
+            if facility_id:
+                qs = qs.filter(facility_id=facility_id)
             else:
                 # If user has no facility, return empty results
                 qs = qs.none()
@@ -581,40 +576,20 @@ def get_medical_history_followups(request):
         ).select_related('patient_id', 'referral', 'referral__examined_by')
         
         # Check if user is a doctor
-        is_doctor = False
-        try:
-            from accounts.models import Doctors
-            doctor_profile = Doctors.objects.get(user=request.user)
-            if doctor_profile.status == 'ACTIVE':
-                is_doctor = True
-        except Doctors.DoesNotExist:
-            pass
+        principal = request.principal
+        is_doctor = principal.is_doctor
         
         # Doctors can see all follow-ups (no filter needed)
         # For non-doctor users (BHW), filter by facility
         if not request.user.is_staff and not is_doctor:
-            # For non-doctor users (BHW), filter by facility
-            facility = None
-            
-            # Check if user is BHW and get facility from BHWRegistration
-            try:
-                from accounts.models import BHWRegistration
-                bhw_profile = BHWRegistration.objects.select_related('facility').get(user=request.user)
-                if bhw_profile.facility:
-                    facility = bhw_profile.facility
-            except BHWRegistration.DoesNotExist:
-                pass
+            # BHW registration facility first, then shared_facilities (ManyToMany relationship)
+            facility_id = principal.bhw_facility_id
+            if not facility_id and principal.shared_facility_ids:
+                facility_id = principal.shared_facility_ids[0]
             
-            # If not BHW, check shared_facilities (ManyToMany relationship)
-            if not facility:
-                try:
-                    facility = Facility.objects.get(users=request.user)
-                except Facility.DoesNotExist:
-                    pass
-            
-            if facility:
+            if facility_id:
                 followups_query = followups_query.filter(
-                    patient_id__facility=facility
+                    patient_id__facility_id=facility_id
                 )
             else:
                 # If user has no facility, return empty queryset
@@ -0,0 +1,217 @@
+"""
+Streaming CSV export of referrals (export_referrals_csv).
+
+Rows are read with values_list(...).iterator(), so neither Referral instances nor
+the whole file are held in memory: the view streams the CSV as it is produced
+(gzip-compressed when the client accepts it), and the "prepare" mode writes it
+to a file under MEDIA_ROOT in a background thread and notifies the user when
+the file can be downloaded.
+"""
+import csv
+import logging
+import os
+import re
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_ROWS_PER_WRITE = 500
+EXPORTS_DIR = 'exports'
+EXPORT_FILENAME_RE = re.compile(r'[A-Za-z0-9_.-]+_[0-9a-f]{8}\.csv')
+
+
+def _iso(value):
+    return value.isoformat() if value else ''
+
+
+def _float(value):
+    return float(value) if value else ''
+
+
+def _blank(value):
+    return value or ''
+
+
+def _optional(value):
+    return value if value is not None else ''
+
+
+def _raw(value):
+    return value
+
+
+# (CSV header, Referral field read with values_list, formatter), in export order
+REFERRAL_EXPORT_COLUMNS = [
+    # Basic Information
+    ('referral_id', 'referral_id', _raw),
+    ('facility_name', 'facility__name', _blank),
+    ('username', 'user__username', _blank),
+    ('patient_name', None, None),  # patient__first_name + patient__last_name
+    ('created_at', 'created_at', _iso),
+    ('completed_at', 'completed_at', _iso),
+    ('status', 'status', _raw),
+    ('followup_date', 'followup_date', _iso),
+    # Referral Details
+    ('referral_type', 'referral_type', _blank),
+    ('chief_complaint', 'chief_complaint', _blank),
+    ('symptoms', 'symptoms', _blank),
+    ('work_up_details', 'work_up_details', _blank),
+    ('ICD_code', 'ICD_code', _blank),
+    ('initial_diagnosis', 'initial_diagnosis', _blank),
+    ('final_diagnosis', 'final_diagnosis', _blank),
+    ('cause', 'cause', _blank),
+    ('treatments', 'treatments', _blank),
+    ('remarks', 'remarks', _blank),
+    # Vital Signs
+    ('weight', 'weight', _float),
+    ('height', 'height', _float),
+    ('bp_systolic', 'bp_systolic', _raw),
+    ('bp_diastolic', 'bp_diastolic', _raw),
+    ('pulse_rate', 'pulse_rate', _raw),
+    ('respiratory_rate', 'respiratory_rate', _raw),
+    ('temperature', 'temperature', _float),
+    ('oxygen_saturation', 'oxygen_saturation', _raw),
+    # Lifestyle/Social History
+    ('is_smoker', 'is_smoker', _raw),
+    ('smoking_sticks_per_day', 'smoking_sticks_per_day', _blank),
+    ('is_alcoholic', 'is_alcoholic', _raw),
+    ('alcohol_bottles_per_year', 'alcohol_bottles_per_year', _blank),
+    ('family_planning', 'family_planning', _raw),
+    ('family_planning_type', 'family_planning_type', _blank),
+    # Menstrual History
+    ('menarche', 'menarche', _blank),
+    ('sexually_active', 'sexually_active', _optional),
+    ('number_of_partners', 'number_of_partners', _blank),
+    ('is_menopause', 'is_menopause', _optional),
+    ('menopause_age', 'menopause_age', _blank),
+    ('last_menstrual_period', 'last_menstrual_period', _iso),
+    ('period_duration', 'period_duration', _blank),
+    ('period_interval', 'period_interval', _blank),
+    ('pads_per_day', 'pads_per_day', _blank),
+    # Pregnancy History
+    ('is_pregnant', 'is_pregnant', _optional),
+    ('gravidity', 'gravidity', _blank),
+    ('parity', 'parity', _blank),
+    ('delivery_type', 'delivery_type', _blank),
+    ('full_term_births', 'full_term_births', _blank),
+    ('premature_births', 'premature_births', _blank),
+    ('abortions', 'abortions', _blank),
+    ('living_children', 'living_children', _blank),
+]
+
+EXPORT_HEADER = [header for header, _, _ in REFERRAL_EXPORT_COLUMNS]
+_EXPORT_FIELDS = [field for _, field, _ in REFERRAL_EXPORT_COLUMNS if field]
+_EXPORT_FORMATTERS = [formatter for _, field, formatter in REFERRAL_EXPORT_COLUMNS if field]
+_PATIENT_NAME_POSITION = EXPORT_HEADER.index('patient_name')
+
+
+def referral_export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the CSV header, then one list of cell values per referral (oldest first)"""
+    yield EXPORT_HEADER
+    values = (
+        queryset.order_by('created_at')
+        .values_list(*_EXPORT_FIELDS, 'patient__first_name', 'patient__last_name')
+        .iterator(chunk_size=chunk_size)
+    )
+    for record in values:
+        row = [format_value(value) for format_value, value in zip(_EXPORT_FORMATTERS, record)]
+        row.insert(_PATIENT_NAME_POSITION, f"{record[-2]} {record[-1]}")
+        yield row
+
+
+class _LineBuffer:
+    """File-like object whose write() returns the written text (for csv.writer)"""
+
+    def write(self, value):
+        return value
+
+
+def referral_export_chunks(queryset, rows_per_chunk=EXPORT_ROWS_PER_WRITE):
+    """Yield the CSV text in blocks of rows_per_chunk lines"""
+    writer = csv.writer(_LineBuffer())
+    lines = []
+    for row in referral_export_rows(queryset):
+        lines.append(writer.writerow(row))
+        if len(lines) >= rows_per_chunk:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def user_exports_dir(user_id):
+    """Directory under MEDIA_ROOT holding a user's prepared exports"""
+    return os.path.join(settings.MEDIA_ROOT, EXPORTS_DIR, str(user_id))
+
+
+def prepared_export_path(user_id, filename):
+    """Path of a user's prepared export, or None if filename is not one of ours"""
+    if not EXPORT_FILENAME_RE.fullmatch(filename or ''):
+        return None
+    return os.path.join(user_exports_dir(user_id), filename)
+
+
+def write_referrals_export(queryset, user_id, basename):
+    """Write the export to the user's exports directory; returns the file name"""
+    directory = user_exports_dir(user_id)
+    os.makedirs(directory, exist_ok=True)
+    filename = f"{basename}_{uuid.uuid4().hex[:8]}.csv"
+    path = os.path.join(directory, filename)
+    partial = f"{path}.part"
+    with open(partial, 'w', newline='', encoding='utf-8') as handle:
+        for chunk in referral_export_chunks(queryset):
+            handle.write(chunk)
+    os.replace(partial, path)
+    return filename
+
+
+def prepare_referrals_export(queryset, user, basename, download_url):
+    """Write the export file and notify the user with download_url(filename), or of the failure"""
+    from notifications.models import Notification
+
+    try:
+        filename = write_referrals_export(queryset, user.id, basename)
+    except Exception as e:
+        logger.exception(f"Referral export {basename} for user {user.id} failed: {e}")
+        Notification.objects.create(
+            recipient=user,
+            title='Referral export failed',
+            message=f"The referral export {basename} could not be prepared. Please try again.",
+            notification_type='export_ready',
+        )
+        return None
+    Notification.objects.create(
+        recipient=user,
+        title='Referral export ready',
+        message=f"Your referral export {filename} is ready: {download_url(filename)}",
+        notification_type='export_ready',
+    )
+    return filename
+
+
+def _prepare_in_background(*args):
+    try:
+        prepare_referrals_export(*args)
+    finally:
+        # The thread opened its own database connection
+        connection.close()
+
+
+def start_referrals_export(queryset, user, basename, download_url):
+    """
+    Prepare the export in a background thread; the user gets a Notification with
+    download_url(filename) when the file is ready
+    """
+    thread = threading.Thread(
+        target=_prepare_in_background,
+        args=(queryset, user, basename, download_url),
+        name=f"referral-export-{user.id}",
+        daemon=True,
+    )
+    thread.start()
+    return thread
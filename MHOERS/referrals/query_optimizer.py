@@ -1,8 +1,22 @@
-from django.db.models import Prefetch, Q, Count
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db.models import Prefetch, Q, Count, F, Window
+from django.db.models.functions import RowNumber
 from referrals.models import Referral
 from patients.models import Patient
 from facilities.models import Facility
 
+CURSOR_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MAX_REFERRAL_ID = 2 ** 31 - 1  # referral_id is an AutoField (32-bit integer column)
+
+
+def cursor_datetime(micros):
+    """created_at encoded in a keyset cursor, or None if out of datetime range"""
+    try:
+        return CURSOR_EPOCH + timedelta(microseconds=micros)
+    except OverflowError:
+        return None
+
+
 class ReferralQueryOptimizer:
     """Optimizes database queries for referral data"""
     
@@ -40,9 +54,172 @@ class ReferralQueryOptimizer:
         """Get all referrals with optimized queries"""
         return cls.get_optimized_referrals(['pending', 'in-progress', 'completed', 'rejected'])
     
+    @classmethod
+    def latest_medical_history(cls, referral_ids):
+        """
+        Latest Medical_History (by diagnosed_date) for each referral, in one query.
+        Returns {referral_id: Medical_History}; each row also carries history_count,
+        the number of Medical_History records linked to that referral.
+        """
+        from patients.models import Medical_History
+
+        referral_ids = list(referral_ids)
+        if not referral_ids:
+            return {}
+
+        histories = Medical_History.objects.filter(
+            referral_id__in=referral_ids
+        ).annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=[F('referral_id')],
+                order_by=[F('diagnosed_date').desc(), F('history_id').desc()]
+            ),
+            history_count=Window(Count('history_id'), partition_by=[F('referral_id')]),
+        ).filter(row_number=1)
+        return {history.referral_id: history for history in histories}
+
+    @classmethod
+    def attach_medical_history(cls, referrals):
+        """
+        Set latest_medical_history, medical_history_count, medical_history_notes and
+        medical_history_advice on each referral (empty notes/advice become None).
+        """
+        referrals = list(referrals)
+        latest = cls.latest_medical_history(r.referral_id for r in referrals)
+        for referral in referrals:
+            history = latest.get(referral.referral_id)
+            referral.latest_medical_history = history
+            referral.medical_history_count = history.history_count if history else 0
+            notes = history.notes if history else None
+            advice = history.advice if history else None
+            referral.medical_history_notes = notes if (notes and notes.strip()) else None
+            referral.medical_history_advice = advice if (advice and advice.strip()) else None
+        return referrals
+
     @classmethod
     def get_patients_with_referral_count(cls):
         """Get patients with referral count using optimized queries"""
         return Patient.objects.select_related('facility').annotate(
             referral_count=Count('referral')
         )
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated queryset. Iterable like a Paginator page; the
+    next page is requested with ``next_cursor`` instead of an OFFSET.
+    """
+
+    def __init__(self, object_list, has_next, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Base for the referral keyset paginators. A cursor is the last row's leading
+    integer keys (``CURSOR_KEYS``), created_at in microseconds since the epoch and
+    referral_id, joined with ``_``; subclasses order the queryset and build the
+    filter for the rows after a decoded cursor (``after``).
+    """
+
+    EPOCH = CURSOR_EPOCH
+    # (annotation name, min, max) of the integer keys that precede created_at
+    CURSOR_KEYS = ()
+
+    def __init__(self, queryset, per_page):
+        self.per_page = per_page
+        self.queryset = queryset
+
+    @staticmethod
+    def _get(row, name):
+        return row[name] if isinstance(row, dict) else getattr(row, name)
+
+    def encode_cursor(self, row):
+        delta = self._get(row, 'created_at') - self.EPOCH
+        micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+        keys = [self._get(row, name) for name, _, _ in self.CURSOR_KEYS]
+        return '_'.join(str(part) for part in [*keys, micros, self._get(row, 'referral_id')])
+
+    def decode_cursor(self, cursor):
+        """(*keys, created_at, referral_id), or None if the cursor is malformed or out of range"""
+        parts = str(cursor).split('_')
+        if len(parts) != len(self.CURSOR_KEYS) + 2:
+            return None
+        try:
+            *keys, micros, referral_id = (int(part) for part in parts)
+        except ValueError:
+            return None
+        created_at = cursor_datetime(micros)
+        if created_at is None or not 0 < referral_id <= MAX_REFERRAL_ID:
+            return None
+        if any(not low <= key <= high for key, (_, low, high) in zip(keys, self.CURSOR_KEYS)):
+            return None
+        return (*keys, created_at, referral_id)
+
+    def after(self, position):
+        """Q for the rows ordered after a decoded cursor"""
+        raise NotImplementedError
+
+    def get_page(self, cursor=None):
+        queryset = self.queryset
+        position = self.decode_cursor(cursor) if cursor else None
+        if position:
+            queryset = queryset.filter(self.after(position))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        next_cursor = self.encode_cursor(rows[-1]) if has_next else None
+        return KeysetPage(rows, has_next, next_cursor)
+
+
+class SeverityKeysetPaginator(KeysetPaginator):
+    """
+    Orders referrals by predicted severity (High -> Medium -> Low -> Unspecified),
+    then newest first, entirely in SQL, and pages with a (severity, created_at,
+    referral_id) cursor so every page is one bounded query.
+    """
+
+    CURSOR_KEYS = (('severity_order', 0, 3),)
+
+    def __init__(self, queryset, per_page=10):
+        from analytics.severity_index import SeverityIndex
+
+        super().__init__(queryset.annotate(
+            severity_order=SeverityIndex.order_expression('prediction__icd_code')
+        ).order_by('severity_order', '-created_at', '-referral_id'), per_page)
+
+    def after(self, position):
+        severity, created_at, referral_id = position
+        return (
+            Q(severity_order__gt=severity) |
+            Q(severity_order=severity, created_at__lt=created_at) |
+            Q(severity_order=severity, created_at=created_at, referral_id__lt=referral_id)
+        )
+
+
+class CreatedKeysetPaginator(KeysetPaginator):
+    """
+    Pages referrals newest first with a (created_at, referral_id) cursor, so every
+    page is one bounded query however deep the client pages. Works on model and
+    ``.values()`` querysets (the values must include created_at and referral_id).
+    """
+
+    def __init__(self, queryset, per_page=100):
+        super().__init__(queryset.order_by('-created_at', '-referral_id'), per_page)
+
+    def after(self, position):
+        created_at, referral_id = position
+        return Q(created_at__lt=created_at) | Q(created_at=created_at, referral_id__lt=referral_id)
@@ -1,3 +1,157 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from facilities.models import Facility
+from notifications.models import Notification
+from patients.models import Patient
+from referrals.exports import EXPORT_HEADER, prepare_referrals_export
+from referrals.models import Referral
+
+
+class ReferralCsvExportTestCase(TestCase):
+    """Tests for the streaming referral CSV export (referrals.exports)"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        patcher = mock.patch('analytics.prediction_store.refresh_referral_predictions')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_superuser(username='exporter', email='e@example.com', password='testpass123')
+        facility = Facility.objects.create(name='Export Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        patient = Patient.objects.create(
+            first_name='Mara', last_name='Santos', p_address='Street', p_number='09123456789',
+            user=self.user, date_of_birth=date(1991, 2, 2), sex='Female', facility=facility
+        )
+        for complaint, weight in [('cough, "dry"', Decimal('61.5')), ('fever', Decimal('0'))]:
+            Referral.objects.create(
+                facility=facility, user=self.user, patient=patient,
+                weight=weight, height=Decimal('160.0'), bp_systolic=120, bp_diastolic=80,
+                pulse_rate=70, respiratory_rate=16, temperature=Decimal('37.5'), oxygen_saturation=98,
+                chief_complaint=complaint, symptoms='fever', work_up_details='-', initial_diagnosis='-'
+            )
+        self.client.force_login(self.user)
+
+    def _rows(self, content):
+        return list(csv.reader(io.StringIO(content.decode('utf-8'))))
+
+    def test_streams_same_columns_and_values(self):
+        response = self.client.get(reverse('referrals:export_referrals_csv'))
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="referrals.csv"', response['Content-Disposition'])
+
+        rows = self._rows(b''.join(response.streaming_content))
+        self.assertEqual(rows[0], EXPORT_HEADER)
+        self.assertEqual(len(rows), 3)
+        first = dict(zip(rows[0], rows[1]))
+        self.assertEqual(first['facility_name'], 'Export Facility')
+        self.assertEqual(first['username'], 'exporter')
+        self.assertEqual(first['patient_name'], 'Mara Santos')
+        self.assertEqual(first['chief_complaint'], 'cough, "dry"')
+        self.assertEqual(first['weight'], '61.5')
+        self.assertEqual(first['is_smoker'], 'False')
+        self.assertEqual(first['sexually_active'], '')
+        self.assertEqual(dict(zip(rows[0], rows[2]))['weight'], '')
+
+    def test_gzip_when_accepted(self):
+        response = self.client.get(reverse('referrals:export_referrals_csv'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gzip.decompress(b''.join(response.streaming_content))
+        plain = self.client.get(reverse('referrals:export_referrals_csv'))
+        self.assertEqual(content, b''.join(plain.streaming_content))
+
+    def test_prepared_export_is_written_and_downloadable(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            with mock.patch('referrals.views.start_referrals_export') as start:
+                response = self.client.get(reverse('referrals:export_referrals_csv') + '?year=2099&prepare=1')
+            self.assertEqual(response.status_code, 302)
+            queryset, user, basename, download_url = start.call_args.args
+            self.assertEqual(basename, 'referrals_2099')
+
+            filename = prepare_referrals_export(Referral.objects.all(), user, basename, download_url)
+            notification = Notification.objects.get(recipient=self.user, notification_type='export_ready')
+            self.assertIn(download_url(filename), notification.message)
+
+            download = self.client.get(download_url(filename))
+            self.assertEqual(len(self._rows(b''.join(download.streaming_content))), 3)
+
+            other = User.objects.create_user(username='other', password='testpass123')
+            self.client.force_login(other)
+            self.assertEqual(self.client.get(download_url(filename)).status_code, 404)
+            self.assertEqual(self.client.get(reverse('referrals:download_referrals_export', args=['secret.csv'])).status_code, 404)
+
+
+class ApiReferralsTestCase(TestCase):
+    """Tests for the keyset-paginated referral JSON API (api_referrals)"""
+
+    def setUp(self):
+        patcher = mock.patch('analytics.prediction_store.refresh_referral_predictions')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(username='apiuser', password='testpass123')
+        facility = Facility.objects.create(name='Api Facility', assigned_bhw='BHW', latitude=0, longitude=0)
+        facility.users.add(self.user)
+        patient = Patient.objects.create(
+            first_name='Nilo', last_name='Garcia', p_address='Street', p_number='09123456789',
+            user=self.user, date_of_birth=date(1980, 8, 8), sex='Male', facility=facility
+        )
+        self.referrals = [
+            Referral.objects.create(
+                facility=facility, user=self.user, patient=patient,
+                weight=Decimal('70.0'), height=Decimal('170.0'), bp_systolic=120, bp_diastolic=80,
+                pulse_rate=70, respiratory_rate=16, temperature=Decimal('36.9'), oxygen_saturation=98,
+                chief_complaint=f'complaint {i}', symptoms='-', work_up_details='-', initial_diagnosis='-'
+            )
+            for i in range(5)
+        ]
+        # Two referrals share a timestamp: the cursor must still separate them
+        Referral.objects.filter(pk=self.referrals[2].pk).update(created_at=self.referrals[1].created_at)
+        self.client.force_login(self.user)
+
+    def _get(self, **params):
+        return self.client.get(reverse('referrals:api_referrals'), params)
+
+    def test_pages_cover_every_referral_once_newest_first(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            body = self._get(**params).json()
+            self.assertLessEqual(len(body['results']), 2)
+            seen.extend(row['referral_id'] for row in body['results'])
+            if not body['has_next']:
+                break
+            cursor = body['next_cursor']
+
+        expected = list(
+            Referral.objects.order_by('-created_at', '-referral_id').values_list('referral_id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_fields_projection_and_facility(self):
+        body = self._get(fields='referral_id,facility_name,patient').json()
+        self.assertEqual(len(body['results']), 5)
+        self.assertEqual(
+            body['results'][0],
+            {'referral_id': body['results'][0]['referral_id'], 'facility_name': 'Api Facility', 'patient': 'Nilo Garcia'},
+        )
+        self.assertEqual(self._get(fields='referral_id,password').status_code, 400)
+        self.assertEqual(self._get(cursor='not-a-cursor').status_code, 400)
+
+    def test_out_of_range_cursor_is_rejected(self):
+        for cursor in ['100000000000000000000_1', '0_100000000000000000000', '0_0']:
+            response = self._get(cursor=cursor)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': 'Invalid cursor'})
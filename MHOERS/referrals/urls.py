@@ -29,6 +29,7 @@ urlpatterns = [
     path('api/yearly-referral-counts-by-user/', views.yearly_referral_counts_by_user, name='yearly_referral_counts_by_user'),
     path('api/referrals/', views.api_referrals, name='api_referrals'),
     path('export/referrals.csv', views.export_referrals_csv, name='export_referrals_csv'),
+    path('export/download/<str:filename>', views.download_referrals_export, name='download_referrals_export'),
     
 ]
 
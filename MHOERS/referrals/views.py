@@ -3,6 +3,8 @@ from .forms import ReferralForm
 from .models import * 
 from datetime import datetime, timedelta
 import joblib
+import os
+import re
 from notifications.models import Notification
 from facilities.models import Facility
 from django.shortcuts import get_object_or_404, render, redirect
@@ -11,13 +13,18 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.cache import never_cache
 from patients.models import Patient, Medical_History
 from django.http import JsonResponse
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse, FileResponse, Http404
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.utils.text import compress_sequence
 from django.utils.text import slugify
 from django.core.paginator import Paginator
 from analytics.ml_utils import predict_disease_for_referral, random_forest_regression_train_model, random_forest_regression_prediction_time,  train_random_forest_model_classification, predict_time_to_cater_advanced, train_time_prediction_model_advanced, train_time_prediction_model_advanced_from_csv
 from analytics.model_manager import MLModelManager
-from analytics.batch_predictor import BatchPredictor
-from .query_optimizer import ReferralQueryOptimizer
+from analytics.prediction_store import get_stored_predictions, ensure_stored_predictions
+from .query_optimizer import ReferralQueryOptimizer, SeverityKeysetPaginator, CreatedKeysetPaginator
+from .exports import referral_export_chunks, start_referrals_export, prepared_export_path
 from django.db.models import Count, Q, OuterRef, Subquery
 from django.contrib.auth.models import Group, User
 from django.db.models.functions import TruncMonth
@@ -28,59 +35,22 @@ from accounts.models import Doctors
 from analytics.models import Disease
 
 
-def get_severity_order(referral_id, predictions_dict):
+def paginate_by_severity(queryset, request, prefix, per_page=10):
     """
-    Get severity order value for sorting (lower = higher priority).
-    Returns: 0=High, 1=Medium, 2=Low, 3=Unspecified
+    Severity-ordered page of a referral queryset (High -> Medium -> Low -> Unspecified,
+    newest first), ordered and limited in SQL. ``?<prefix>_after=<cursor>`` selects the
+    keyset page after a cursor; the legacy ``?<prefix>_page=<n>`` still works.
     """
-    if not referral_id or referral_id not in predictions_dict:
-        return 3  # Unspecified
-    
-    prediction = predictions_dict[referral_id]
-    disease_code = prediction[0] if isinstance(prediction, tuple) else prediction
-    
-    if not disease_code or (isinstance(disease_code, str) and ('No prediction' in disease_code or 'Unspecified' in disease_code)):
-        return 3  # Unspecified
-    
-    # Try to get Disease from database
-    try:
-        disease = Disease.objects.get(icd_code=str(disease_code).strip())
-        severity = disease.critical_level.lower()
-        if severity == 'high':
-            return 0
-        elif severity == 'medium':
-            return 1
-        elif severity == 'low':
-            return 2
-    except Disease.DoesNotExist:
-        # Try alternative formats
-        try:
-            alt_code = str(disease_code).strip().replace('.', '-')
-            if alt_code != str(disease_code).strip():
-                disease = Disease.objects.get(icd_code=alt_code)
-                severity = disease.critical_level.lower()
-                if severity == 'high':
-                    return 0
-                elif severity == 'medium':
-                    return 1
-                elif severity == 'low':
-                    return 2
-        except Disease.DoesNotExist:
-            try:
-                alt_code = str(disease_code).strip().replace('-', '.')
-                if alt_code != str(disease_code).strip():
-                    disease = Disease.objects.get(icd_code=alt_code)
-                    severity = disease.critical_level.lower()
-                    if severity == 'high':
-                        return 0
-                    elif severity == 'medium':
-                        return 1
-                    elif severity == 'low':
-                        return 2
-            except Disease.DoesNotExist:
-                pass
-    
-    return 3  # Unspecified
+    paginator = SeverityKeysetPaginator(queryset, per_page)
+    page_number = request.GET.get(f'{prefix}_page')
+    if page_number and not request.GET.get(f'{prefix}_after'):
+        return Paginator(paginator.queryset, per_page).get_page(page_number)
+    return paginator.get_page(request.GET.get(f'{prefix}_after'))
+
+
+def page_requested(request, prefix):
+    """Whether the request pages the ``prefix`` list, by page number or keyset cursor"""
+    return bool(request.GET.get(f'{prefix}_page') or request.GET.get(f'{prefix}_after'))
 
 
 @login_required
@@ -435,20 +405,12 @@ def create_referral(request):
 
                     # ✅ Automatically assign the facility
                     # Check both shared_facilities and BHWRegistration for facility assignment
-                    user_facility = request.user.shared_facilities.first()  # gets the first linked facility
-                    
-                    # If no facility from shared_facilities, check if user is BHW and get facility from BHWRegistration
-                    if not user_facility:
-                        try:
-                            from accounts.models import BHWRegistration
-                            bhw_profile = BHWRegistration.objects.select_related('facility').get(user=request.user)
-                            if bhw_profile.facility:
-                                user_facility = bhw_profile.facility
-                        except BHWRegistration.DoesNotExist:
-                            pass
+                    # First linked facility; if none, the BHW registration facility
+                    shared_facility_ids = request.principal.shared_facility_ids
+                    user_facility_id = shared_facility_ids[0] if shared_facility_ids else request.principal.bhw_facility_id
                     
-                    if user_facility:
-                        referral.facility = user_facility
+                    if user_facility_id:
+                        referral.facility_id = user_facility_id
                     else:
                         messages.error(request, "You are not assigned to any facility. Contact admin.")
                         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -648,13 +610,9 @@ def update_referral_status(request):
     referral.status = 'in-progress'
     
     # ✅ If user is a doctor, set them as the examiner
-    from accounts.models import Doctors
-    try:
-        doctor_profile = Doctors.objects.get(user=request.user)
-        if doctor_profile.status == 'ACTIVE':
-            referral.examined_by = request.user
-    except Doctors.DoesNotExist:
-        pass  # Not a doctor, keep existing examined_by or leave as None
+    # Not a doctor: keep existing examined_by or leave as None
+    if request.principal.is_doctor:
+        referral.examined_by = request.user
     
     referral.save()
 
@@ -689,12 +647,8 @@ def update_referral_status(request):
     from django.contrib import messages
     messages.success(request, 'Referral accepted successfully!')
     
-    try:
-        doctor_profile = Doctors.objects.get(user=request.user)
-        if doctor_profile.status == 'ACTIVE':
-            return redirect('doctor_dashboard')
-    except Doctors.DoesNotExist:
-        pass  # Not a doctor, redirect to patient list
+    if request.principal.is_doctor:
+        return redirect('doctor_dashboard')
     
     # Default redirect to patient list
     return redirect('referrals:patient_list')
@@ -950,22 +904,10 @@ def delete_referral(request):
 @login_required
 @never_cache
 def referral_list(request):
-    # Get user's assigned facilities - check both shared_facilities and BHWRegistration
-    user_facilities = list(request.user.shared_facilities.all())
-    
-    # Also check if user is a BHW and get facility from BHWRegistration
-    try:
-        from accounts.models import BHWRegistration
-        bhw_profile = BHWRegistration.objects.select_related('facility').get(user=request.user)
-        if bhw_profile.facility and bhw_profile.facility not in user_facilities:
-            user_facilities.append(bhw_profile.facility)
-    except BHWRegistration.DoesNotExist:
-        pass
-    
-    has_facilities = len(user_facilities) > 0
-    
+    # Get user's assigned facilities - both shared_facilities and BHWRegistration
     # Get facility IDs for filtering (empty list if no facilities)
-    facility_ids = [f.facility_id for f in user_facilities] if has_facilities else []
+    facility_ids = request.principal.facility_ids
+    has_facilities = len(facility_ids) > 0
     
     # Build query to include:
     # 1. Referrals from user's assigned facilities (facility or patient facility match)
@@ -983,25 +925,22 @@ def referral_list(request):
         combined_filter = user_created_filter
     
     # Filter pending referrals - always include user's own referrals
-    # Prefetch medical_history to get notes for Doctor Notes/Actions
     pending_qs = Referral.objects.filter(
         combined_filter,
         status='pending'
-    ).select_related('patient', 'patient__facility', 'patient__user').prefetch_related('medical_history').distinct().order_by('-created_at')
+    ).select_related('patient', 'patient__facility', 'patient__user', 'prediction').distinct().order_by('-created_at')
 
     # Filter active referrals (in-progress) - always include user's own referrals
-    # Prefetch medical_history to get notes for Doctor Notes/Actions
     active_qs = Referral.objects.filter(
         combined_filter,
         status='in-progress'
-    ).select_related('patient', 'patient__facility', 'patient__user').prefetch_related('medical_history').distinct().order_by('-created_at')
+    ).select_related('patient', 'patient__facility', 'patient__user', 'prediction').distinct().order_by('-created_at')
 
     # Filter referred/completed referrals - always include user's own referrals
-    # Prefetch medical_history to get notes for Doctor Notes/Actions
     referred_qs = Referral.objects.filter(
         combined_filter,
         status='completed'
-    ).select_related('patient', 'patient__facility', 'patient__user').prefetch_related('medical_history').distinct().order_by('-completed_at', '-created_at')
+    ).select_related('patient', 'patient__facility', 'patient__user', 'prediction').distinct().order_by('-completed_at', '-created_at')
     
     # Debug: Log query results for troubleshooting
     import logging
@@ -1081,14 +1020,7 @@ def referral_list(request):
     followups_count = 0
     
     # Check if user is a doctor
-    is_doctor = False
-    try:
-        from accounts.models import Doctors
-        doctor_profile = Doctors.objects.get(user=request.user)
-        if doctor_profile.status == 'ACTIVE':
-            is_doctor = True
-    except Doctors.DoesNotExist:
-        pass
+    is_doctor = request.principal.is_doctor
     
     if handled_patient_ids:
         followups_qs = medical_history_qs.filter(
@@ -1131,181 +1063,33 @@ def referral_list(request):
                 'advice': followup.advice,
             })
 
-    # Get predictions for all referrals before pagination to sort by severity
-    all_pending = list(pending_qs)
-    all_active = list(active_qs)
-    all_referred = list(referred_qs)
-    
-    all_referrals_for_prediction = all_pending + all_active + all_referred
-    predictions = BatchPredictor.predict_all_batch(all_referrals_for_prediction) if all_referrals_for_prediction else {}
-    
-    # Sort by severity: High (0) -> Medium (1) -> Low (2) -> Unspecified (3), then by created_at descending
-    def sort_key(referral):
-        severity_order = get_severity_order(referral.referral_id, predictions)
-        return (severity_order, -referral.created_at.timestamp() if referral.created_at else 0)
-    
-    all_pending.sort(key=sort_key)
-    all_active.sort(key=sort_key)
-    
-    # For referred, keep original sorting (by completed_at/created_at)
-    # but we can optionally sort by severity too if needed
-    
-    pending_page_number = request.GET.get('pending_page') or 1
-    active_page_number = request.GET.get('active_page') or 1
-    referred_page_number = request.GET.get('referred_page') or 1
+    # Severity ordering and pagination happen in SQL over the stored predictions;
+    # pages are fetched with a keyset cursor (?pending_after=...) or a page number.
+    ensure_stored_predictions(pending_qs)
+    ensure_stored_predictions(active_qs)
 
-    pending_page = Paginator(all_pending, 10).get_page(pending_page_number)
-    active_page = Paginator(all_active, 10).get_page(active_page_number)
-    referred_page = Paginator(referred_qs, 10).get_page(referred_page_number)
+    pending_page = paginate_by_severity(pending_qs, request, 'pending')
+    active_page = paginate_by_severity(active_qs, request, 'active')
+    referred_page = Paginator(referred_qs, 10).get_page(request.GET.get('referred_page') or 1)
 
-    # Add medical_history notes and advice to each referral for template access
-    # Use direct database queries with referral_id instead of referral object to ensure data is retrieved
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    for referral in pending_page.object_list:
-        # STEP 1: Get referral_id from referrals_referral table (Referral model)
-        referral_id_from_referrals = referral.referral_id
-        
-        # STEP 2: Query patients_medical_history table to find matching referral_id
-        # This compares: Medical_History.referral_id == Referral.referral_id
-        matching_medical_history = Medical_History.objects.filter(
-            referral_id=referral_id_from_referrals  # Compare with referral_id from referrals_referral
-        ).order_by('-diagnosed_date').first()
-        
-        # STEP 3: Verify if the comparison found a match (legit)
-        if matching_medical_history:
-            # STEP 3a: Get referral_id from patients_medical_history table to verify
-            referral_id_from_medical_history = matching_medical_history.referral_id if hasattr(matching_medical_history, 'referral_id') else (
-                matching_medical_history.referral.referral_id if matching_medical_history.referral else None
-            )
-            
-            # STEP 3b: Compare both referral_ids
-            if referral_id_from_medical_history == referral_id_from_referrals:
-                # STEP 4: Pull notes and advice from patients_medical_history
-                notes_from_db = matching_medical_history.notes
-                advice_from_db = matching_medical_history.advice
-                
-                # STEP 5: Populate the form (set on referral object for template)
-                referral.medical_history_notes = notes_from_db if (notes_from_db and notes_from_db.strip()) else None
-                referral.medical_history_advice = advice_from_db if (advice_from_db and advice_from_db.strip()) else None
-                
-                logger.debug(f"  ✅ Pending Referral {referral.referral_id}: Found and populated medical_history")
-            else:
-                referral.medical_history_notes = None
-                referral.medical_history_advice = None
-                logger.debug(f"  ❌ Pending Referral {referral.referral_id}: referral_id mismatch")
-        else:
-            referral.medical_history_notes = None
-            referral.medical_history_advice = None
-            logger.debug(f"  ❌ Pending Referral {referral.referral_id}: No medical_history found")
-    
-    for referral in active_page.object_list:
-        # STEP 1: Get referral_id from referrals_referral table (Referral model)
-        referral_id_from_referrals = referral.referral_id
-        
-        # STEP 2: Query patients_medical_history table to find matching referral_id
-        matching_medical_history = Medical_History.objects.filter(
-            referral_id=referral_id_from_referrals
-        ).order_by('-diagnosed_date').first()
-        
-        # STEP 3: Verify if the comparison found a match (legit)
-        if matching_medical_history:
-            referral_id_from_medical_history = matching_medical_history.referral_id if hasattr(matching_medical_history, 'referral_id') else (
-                matching_medical_history.referral.referral_id if matching_medical_history.referral else None
-            )
-            
-            if referral_id_from_medical_history == referral_id_from_referrals:
-                # STEP 4-5: Pull and populate
-                notes_from_db = matching_medical_history.notes
-                advice_from_db = matching_medical_history.advice
-                
-                referral.medical_history_notes = notes_from_db if (notes_from_db and notes_from_db.strip()) else None
-                referral.medical_history_advice = advice_from_db if (advice_from_db and advice_from_db.strip()) else None
-                
-                logger.debug(f"  ✅ Active Referral {referral.referral_id}: Found and populated medical_history")
-            else:
-                referral.medical_history_notes = None
-                referral.medical_history_advice = None
-        else:
-            referral.medical_history_notes = None
-            referral.medical_history_advice = None
-            logger.debug(f"  ❌ Active Referral {referral.referral_id}: No medical_history found")
-    
-    for referral in referred_page.object_list:
-        # STEP 1: Get referral_id from referrals_referral table (Referral model)
-        referral_id_from_referrals = referral.referral_id
-        print(f"🔍 STEP 1: Got referral_id from referrals_referral table: {referral_id_from_referrals}")
-        
-        # STEP 2: Query patients_medical_history table to find matching referral_id
-        # This compares: Medical_History.referral_id == Referral.referral_id
-        matching_medical_history = Medical_History.objects.filter(
-            referral_id=referral_id_from_referrals  # Compare with referral_id from referrals_referral
-        ).order_by('-diagnosed_date').first()
-        
-        # STEP 3: Verify if the comparison found a match (legit)
-        if matching_medical_history:
-            # STEP 3a: Get referral_id from patients_medical_history table to verify
-            referral_id_from_medical_history = matching_medical_history.referral_id if hasattr(matching_medical_history, 'referral_id') else (
-                matching_medical_history.referral.referral_id if matching_medical_history.referral else None
-            )
-            
-            # STEP 3b: Compare both referral_ids
-            if referral_id_from_medical_history == referral_id_from_referrals:
-                print(f"✅ STEP 3: Comparison LEGIT!")
-                print(f"   referrals_referral.referral_id = {referral_id_from_referrals}")
-                print(f"   patients_medical_history.referral_id = {referral_id_from_medical_history}")
-                print(f"   Match: ✅")
-                
-                # STEP 4: Pull notes and advice from patients_medical_history
-                notes_from_db = matching_medical_history.notes
-                advice_from_db = matching_medical_history.advice
-                
-                # STEP 5: Populate the form (set on referral object for template)
-                # Convert empty strings to None so template can properly check
-                referral.medical_history_notes = notes_from_db if (notes_from_db and notes_from_db.strip()) else None
-                referral.medical_history_advice = advice_from_db if (advice_from_db and advice_from_db.strip()) else None
-                
-                print(f"✅ STEP 4-5: Pulled and populated:")
-                print(f"   notes = '{referral.medical_history_notes[:100] if referral.medical_history_notes else None}...'")
-                print(f"   advice = '{referral.medical_history_advice[:100] if referral.medical_history_advice else None}...'")
-                
-                logger.debug(f"  ✅ Found medical_history: notes='{matching_medical_history.notes[:50] if matching_medical_history.notes else None}...', advice='{matching_medical_history.advice[:50] if matching_medical_history.advice else None}...'")
-            else:
-                print(f"❌ STEP 3: Comparison FAILED - IDs don't match!")
-                print(f"   referrals_referral.referral_id = {referral_id_from_referrals}")
-                print(f"   patients_medical_history.referral_id = {referral_id_from_medical_history}")
-                referral.medical_history_notes = None
-                referral.medical_history_advice = None
-        else:
-            # STEP 3: No match found in patients_medical_history
-            print(f"❌ STEP 3: No matching record found in patients_medical_history")
-            print(f"   Looking for referral_id = {referral_id_from_referrals}")
-            print(f"   But no Medical_History record has this referral_id")
-            
-            referral.medical_history_notes = None
-            referral.medical_history_advice = None
-            
-            # Debug: Show what referral_ids exist in patients_medical_history for this patient
-            all_medical_history_for_patient = Medical_History.objects.filter(patient_id=referral.patient)
-            print(f"   Debug: Patient {referral.patient.patients_id} has {all_medical_history_for_patient.count()} medical_history records:")
-            for mh in all_medical_history_for_patient[:5]:
-                mh_ref_id = mh.referral_id if hasattr(mh, 'referral_id') else (mh.referral.referral_id if mh.referral else 'NULL')
-                print(f"     - Medical_History {mh.history_id}: referral_id = {mh_ref_id}")
-            
-            logger.debug(f"  ❌ No medical_history found for referral {referral.referral_id}")
+    predictions = get_stored_predictions(
+        list(pending_page.object_list) + list(active_page.object_list) + list(referred_page.object_list)
+    )
 
-    # Predictions already generated above, no need to regenerate
+    # Attach the latest medical_history notes/advice for every referral on the pages (one query)
+    ReferralQueryOptimizer.attach_medical_history(
+        list(pending_page.object_list) + list(active_page.object_list) + list(referred_page.object_list)
+    )
 
     active_tab = request.GET.get('tab')
     if not active_tab:
-        if request.GET.get('referred_page'):
+        if page_requested(request, 'referred'):
             active_tab = 'tab3'
-        elif request.GET.get('active_page'):
+        elif page_requested(request, 'active'):
             active_tab = 'tab2'
-        elif request.GET.get('pending_page'):
+        elif page_requested(request, 'pending'):
             active_tab = 'tab1'
-        elif request.GET.get('patients_page'):
+        elif page_requested(request, 'patients'):
             active_tab = 'tab4'
         else:
             active_tab = 'tab1'
@@ -1337,33 +1121,23 @@ def admin_patient_list(request):
     from patients.models import Medical_History
     from referrals.models import FollowUpVisit
 
-    base_qs = Referral.objects.select_related('patient', 'patient__facility', 'user', 'examined_by').order_by('-created_at')
+    base_qs = Referral.objects.select_related('patient', 'patient__facility', 'user', 'examined_by', 'prediction').order_by('-created_at')
     pending_qs = base_qs.filter(status='pending')
     
     # For active referrals: if user is a doctor, only show referrals they accepted (examined_by = current user)
     # Staff/admin can see all active referrals
     active_qs = base_qs.filter(status='in-progress')
-    try:
-        from accounts.models import Doctors
-        doctor_profile = Doctors.objects.get(user=request.user)
-        if doctor_profile.status == 'ACTIVE' and not request.user.is_staff:
-            # Doctor view: only show referrals they accepted
-            active_qs = active_qs.filter(examined_by=request.user)
-    except Doctors.DoesNotExist:
-        pass  # Not a doctor, show all active referrals (for staff/admin)
+    if request.principal.is_doctor and not request.user.is_staff:
+        # Doctor view: only show referrals they accepted
+        active_qs = active_qs.filter(examined_by=request.user)
     
     # For referred (completed) referrals: if user is a doctor, only show referrals they examined (examined_by = current user)
     # Staff/admin can see all referred referrals
     # Sort by completed_at descending (latest first), then by created_at as fallback
     referred_qs = base_qs.filter(status='completed').order_by('-completed_at', '-created_at')
-    try:
-        from accounts.models import Doctors
-        doctor_profile = Doctors.objects.get(user=request.user)
-        if doctor_profile.status == 'ACTIVE' and not request.user.is_staff:
-            # Doctor view: only show referrals they examined
-            referred_qs = referred_qs.filter(examined_by=request.user)
-    except Doctors.DoesNotExist:
-        pass  # Not a doctor, show all referred referrals (for staff/admin)
+    if request.principal.is_doctor and not request.user.is_staff:
+        # Doctor view: only show referrals they examined
+        referred_qs = referred_qs.filter(examined_by=request.user)
 
     # Check view mode: 'assessment' (shows Active Referral + Referred) or 'patients' (shows All Patients only)
     view_mode = request.GET.get('mode', 'assessment')  # Default to 'assessment' for backward compatibility
@@ -1431,14 +1205,7 @@ def admin_patient_list(request):
     ).select_related('patient_id', 'patient_id__facility', 'user_id', 'referral', 'referral__examined_by').order_by('-followup_date')
     
     # Check if user is a doctor
-    is_doctor = False
-    try:
-        from accounts.models import Doctors
-        doctor_profile = Doctors.objects.get(user=request.user)
-        if doctor_profile.status == 'ACTIVE':
-            is_doctor = True
-    except Doctors.DoesNotExist:
-        pass
+    is_doctor = request.principal.is_doctor
     
     if not request.user.is_staff:
         # If user is a doctor, only show follow-ups where they set the follow-up date
@@ -1500,121 +1267,24 @@ def admin_patient_list(request):
     # Ensure it's always an integer for template display
     followups_count = int(followups_count) if followups_count else 0
 
-    # Get predictions for all referrals before pagination to sort by severity
-    all_pending = list(pending_qs)
-    all_active = list(active_qs)
-    all_referred = list(referred_qs)
-    
-    all_referrals_for_prediction = all_pending + all_active + all_referred
-    predictions = BatchPredictor.predict_all_batch(all_referrals_for_prediction) if all_referrals_for_prediction else {}
-    
-    # Sort by severity: High (0) -> Medium (1) -> Low (2) -> Unspecified (3), then by created_at descending
-    def sort_key(referral):
-        severity_order = get_severity_order(referral.referral_id, predictions)
-        return (severity_order, -referral.created_at.timestamp() if referral.created_at else 0)
-    
-    all_pending.sort(key=sort_key)
-    all_active.sort(key=sort_key)
-    
-    pending_page = Paginator(all_pending, 10).get_page(request.GET.get('pending_page') or 1)
-    active_page = Paginator(all_active, 10).get_page(request.GET.get('active_page') or 1)
+    # Severity ordering and pagination happen in SQL over the stored predictions;
+    # pages are fetched with a keyset cursor (?pending_after=...) or a page number.
+    ensure_stored_predictions(pending_qs)
+    ensure_stored_predictions(active_qs)
+
+    pending_page = paginate_by_severity(pending_qs, request, 'pending')
+    active_page = paginate_by_severity(active_qs, request, 'active')
     referred_page = Paginator(referred_qs, 10).get_page(request.GET.get('referred_page') or 1)
     patients_page = Paginator(patients_qs, 10).get_page(request.GET.get('patients_page') or 1)
 
-    # Add medical_history notes and advice to each referral for template access
-    # Use direct database queries with referral_id instead of referral object to ensure data is retrieved
-    import logging
-    logger = logging.getLogger(__name__)
-
-    for referral in pending_page.object_list:
-        # STEP 1: Get referral_id from referrals_referral table (Referral model)
-        referral_id_from_referrals = referral.referral_id
-        
-        # STEP 2: Query patients_medical_history table to find matching referral_id
-        matching_medical_history = Medical_History.objects.filter(
-            referral_id=referral_id_from_referrals
-        ).order_by('-diagnosed_date').first()
-        
-        # STEP 3: Verify if the comparison found a match (legit)
-        if matching_medical_history:
-            referral_id_from_medical_history = matching_medical_history.referral_id if hasattr(matching_medical_history, 'referral_id') else (
-                matching_medical_history.referral.referral_id if matching_medical_history.referral else None
-            )
-            
-            if referral_id_from_medical_history == referral_id_from_referrals:
-                # STEP 4-5: Pull and populate
-                notes_from_db = matching_medical_history.notes
-                advice_from_db = matching_medical_history.advice
-                
-                referral.medical_history_notes = notes_from_db if (notes_from_db and notes_from_db.strip()) else None
-                referral.medical_history_advice = advice_from_db if (advice_from_db and advice_from_db.strip()) else None
-            else:
-                referral.medical_history_notes = None
-                referral.medical_history_advice = None
-        else:
-            referral.medical_history_notes = None
-            referral.medical_history_advice = None
-
-    for referral in active_page.object_list:
-        # STEP 1: Get referral_id from referrals_referral table (Referral model)
-        referral_id_from_referrals = referral.referral_id
-        
-        # STEP 2: Query patients_medical_history table to find matching referral_id
-        matching_medical_history = Medical_History.objects.filter(
-            referral_id=referral_id_from_referrals
-        ).order_by('-diagnosed_date').first()
-        
-        # STEP 3: Verify if the comparison found a match (legit)
-        if matching_medical_history:
-            referral_id_from_medical_history = matching_medical_history.referral_id if hasattr(matching_medical_history, 'referral_id') else (
-                matching_medical_history.referral.referral_id if matching_medical_history.referral else None
-            )
-            
-            if referral_id_from_medical_history == referral_id_from_referrals:
-                # STEP 4-5: Pull and populate
-                notes_from_db = matching_medical_history.notes
-                advice_from_db = matching_medical_history.advice
-                
-                referral.medical_history_notes = notes_from_db if (notes_from_db and notes_from_db.strip()) else None
-                referral.medical_history_advice = advice_from_db if (advice_from_db and advice_from_db.strip()) else None
-            else:
-                referral.medical_history_notes = None
-                referral.medical_history_advice = None
-        else:
-            referral.medical_history_notes = None
-            referral.medical_history_advice = None
-
-    for referral in referred_page.object_list:
-        # STEP 1: Get referral_id from referrals_referral table (Referral model)
-        referral_id_from_referrals = referral.referral_id
-        
-        # STEP 2: Query patients_medical_history table to find matching referral_id
-        matching_medical_history = Medical_History.objects.filter(
-            referral_id=referral_id_from_referrals
-        ).order_by('-diagnosed_date').first()
-        
-        # STEP 3: Verify if the comparison found a match (legit)
-        if matching_medical_history:
-            referral_id_from_medical_history = matching_medical_history.referral_id if hasattr(matching_medical_history, 'referral_id') else (
-                matching_medical_history.referral.referral_id if matching_medical_history.referral else None
-            )
-            
-            if referral_id_from_medical_history == referral_id_from_referrals:
-                # STEP 4: Pull notes and advice from patients_medical_history
-                notes_from_db = matching_medical_history.notes
-                advice_from_db = matching_medical_history.advice
-                
-                # STEP 5: Populate the form (set on referral object for template)
-                referral.medical_history_notes = notes_from_db if (notes_from_db and notes_from_db.strip()) else None
-                referral.medical_history_advice = advice_from_db if (advice_from_db and advice_from_db.strip()) else None
-            else:
-                referral.medical_history_notes = None
-                referral.medical_history_advice = None
-        else:
-            referral.medical_history_notes = None
-            referral.medical_history_advice = None
+    predictions = get_stored_predictions(
+        list(pending_page.object_list) + list(active_page.object_list) + list(referred_page.object_list)
+    )
 
-    # Predictions already generated above, no need to regenerate
+    # Attach the latest medical_history notes/advice for every referral on the pages (one query)
+    ReferralQueryOptimizer.attach_medical_history(
+        list(pending_page.object_list) + list(active_page.object_list) + list(referred_page.object_list)
+    )
 
     # Get all doctors for dropdown (will filter in template to only show those with users)
     doctors = Doctors.objects.all().order_by('last_name', 'first_name')
@@ -1627,21 +1297,21 @@ def admin_patient_list(request):
     if not active_tab:
         if view_mode == 'patients':
             # For patients mode, default to All Patients tab (tab3)
-            if request.GET.get('patients_page'):
+            if page_requested(request, 'patients'):
                 active_tab = 'tab3'
-            elif request.GET.get('medical_history_page'):
+            elif page_requested(request, 'medical_history'):
                 active_tab = 'tab4'
-            elif request.GET.get('followups_page'):
+            elif page_requested(request, 'followups'):
                 active_tab = 'tab5'
             else:
                 active_tab = 'tab3'  # Default to All Patients
         else:
             # For assessment mode, default to Pending tab (tab1)
-            if request.GET.get('referred_page'):
+            if page_requested(request, 'referred'):
                 active_tab = 'tab3'
-            elif request.GET.get('active_page'):
+            elif page_requested(request, 'active'):
                 active_tab = 'tab2'
-            elif request.GET.get('pending_page'):
+            elif page_requested(request, 'pending'):
                 active_tab = 'tab1'
             else:
                 active_tab = 'tab1'  # Default to Pending
@@ -1699,10 +1369,7 @@ def get_referral_details(request, referral_id):
             return JsonResponse({'success': False, 'error': f'Referral {referral_id} not found'}, status=404)
         
         # Get related medical history if exists
-        from patients.models import Medical_History
-        medical_history = Medical_History.objects.filter(
-            referral_id=referral_id
-        ).order_by('-diagnosed_date').first()
+        medical_history = ReferralQueryOptimizer.latest_medical_history([referral.referral_id]).get(referral.referral_id)
         if medical_history:
             print(f"✅ Found medical history: {medical_history.illness_name}")
         else:
@@ -1835,6 +1502,11 @@ def get_patient_referral_history(request, patient_id):
         ).select_related('medical_history', 'user').order_by('-visit_date')
         print(f"Found {followup_visits.count()} follow-up visits for patient {patient_id} recorded by user {request.user.username}")
         
+        # Latest directly-linked history per referral in one query; the date-based
+        # fallback scans the (already date-ordered) history list in memory
+        linked_histories = ReferralQueryOptimizer.latest_medical_history(referral_ids)
+        all_medical_history_list = list(all_medical_history)
+
         # Convert to list of dictionaries for JSON response
         referral_list = []
         for referral in referrals:
@@ -1861,15 +1533,15 @@ def get_patient_referral_history(request, patient_id):
             
             # Find the most relevant medical history for THIS specific referral
             # Get medical history that is directly linked to this referral
-            relevant_medical_history = Medical_History.objects.filter(
-                referral=referral
-            ).first()
+            relevant_medical_history = linked_histories.get(referral.referral_id)
             
             # If no direct link, fall back to date-based matching
             if not relevant_medical_history:
-                relevant_medical_history = all_medical_history.filter(
-                    diagnosed_date__lte=referral.created_at.date()
-                ).first()
+                referral_date = referral.created_at.date()
+                relevant_medical_history = next(
+                    (mh for mh in all_medical_history_list if mh.diagnosed_date <= referral_date),
+                    None
+                )
             
             # Add medical history data if available
             if relevant_medical_history:
@@ -2071,9 +1743,14 @@ def export_referrals_csv(request):
       - month: int (1-12)
       - facility_id: int (maps to Facility.user_id for referrals.user)
       - user_id: int (referrals.user id)
+      - prepare: 1 to build the file in the background and notify the user when
+        it can be downloaded, instead of streaming it now
+
+    The CSV is streamed row by row (gzip-compressed when the client accepts it),
+    see referrals.exports.
     """
-    # Base queryset - include facility for CSV export
-    qs = Referral.objects.select_related('user', 'patient', 'facility').all()
+    # Base queryset - the export reads only the columns it writes (values_list)
+    qs = Referral.objects.all()
 
     # Filters from query params
     year = request.GET.get('year')
@@ -2122,9 +1799,6 @@ def export_referrals_csv(request):
     if user_id and user_id.isdigit():
         qs = qs.filter(user_id=int(user_id))
 
-    # Prepare CSV response
-    response = HttpResponse(content_type='text/csv')
-
     # Build a friendly filename based on filters
     friendly_suffix = None
     if facility_id and facility_id.isdigit():
@@ -2174,104 +1848,73 @@ def export_referrals_csv(request):
 
     parts = ["referrals", friendly_suffix, date_suffix]
     filename = '_'.join([p for p in parts if p]) or 'referrals'
+
+    if request.GET.get('prepare') == '1':
+        start_referrals_export(
+            qs, request.user, filename,
+            lambda name: reverse('referrals:download_referrals_export', args=[name]),
+        )
+        messages.info(request, "Your referral export is being prepared. You will be notified when it is ready to download.")
+        back = request.META.get('HTTP_REFERER')
+        if back and url_has_allowed_host_and_scheme(back, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+            return redirect(back)
+        return redirect('home')
+
+    chunks = (chunk.encode('utf-8') for chunk in referral_export_chunks(qs))
+    if re.search(r'\bgzip\b', request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        response = StreamingHttpResponse(compress_sequence(chunks), content_type='text/csv; charset=utf-8')
+        response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+    else:
+        response = StreamingHttpResponse(chunks, content_type='text/csv; charset=utf-8')
     response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
 
-    import csv
-    writer = csv.writer(response)
-    # Header - All fields from Referral model
-    writer.writerow([
-        # Basic Information
-        'referral_id', 'facility_name', 'username',
-        'patient_name', 'created_at', 'completed_at', 'status', 'followup_date',
-        # Referral Details
-        'referral_type', 'chief_complaint', 'symptoms', 'work_up_details', 'ICD_code',
-        'initial_diagnosis', 'final_diagnosis', 'cause', 'treatments', 'remarks',
-        # Vital Signs
-        'weight', 'height', 'bp_systolic', 'bp_diastolic', 'pulse_rate',
-        'respiratory_rate', 'temperature', 'oxygen_saturation',
-        # Lifestyle/Social History
-        'is_smoker', 'smoking_sticks_per_day', 'is_alcoholic', 'alcohol_bottles_per_year',
-        'family_planning', 'family_planning_type',
-        # Menstrual History
-        'menarche', 'sexually_active', 'number_of_partners', 'is_menopause', 'menopause_age',
-        'last_menstrual_period', 'period_duration', 'period_interval', 'pads_per_day',
-        # Pregnancy History
-        'is_pregnant', 'gravidity', 'parity', 'delivery_type', 'full_term_births',
-        'premature_births', 'abortions', 'living_children'
-    ])
-
-    # Rows
-    for r in qs.order_by('created_at'):
-        patient_name = f"{r.patient.first_name} {r.patient.last_name}" if hasattr(r.patient, 'first_name') else str(r.patient_id)
-        facility_name = r.facility.name if r.facility else ''
-        
-        writer.writerow([
-            # Basic Information
-            r.referral_id,
-            facility_name,
-            r.user.username if r.user_id else '',
-            patient_name,
-            r.created_at.isoformat() if r.created_at else '',
-            r.completed_at.isoformat() if r.completed_at else '',
-            r.status,
-            r.followup_date.isoformat() if r.followup_date else '',
-            # Referral Details
-            r.referral_type or '',
-            r.chief_complaint or '',
-            r.symptoms or '',
-            r.work_up_details or '',
-            r.ICD_code or '',
-            r.initial_diagnosis or '',
-            r.final_diagnosis or '',
-            r.cause or '',
-            r.treatments or '',
-            r.remarks or '',
-            # Vital Signs
-            float(r.weight) if r.weight else '',
-            float(r.height) if r.height else '',
-            r.bp_systolic,
-            r.bp_diastolic,
-            r.pulse_rate,
-            r.respiratory_rate,
-            float(r.temperature) if r.temperature else '',
-            r.oxygen_saturation,
-            # Lifestyle/Social History
-            r.is_smoker,
-            r.smoking_sticks_per_day or '',
-            r.is_alcoholic,
-            r.alcohol_bottles_per_year or '',
-            r.family_planning,
-            r.family_planning_type or '',
-            # Menstrual History
-            r.menarche or '',
-            r.sexually_active if r.sexually_active is not None else '',
-            r.number_of_partners or '',
-            r.is_menopause if r.is_menopause is not None else '',
-            r.menopause_age or '',
-            r.last_menstrual_period.isoformat() if r.last_menstrual_period else '',
-            r.period_duration or '',
-            r.period_interval or '',
-            r.pads_per_day or '',
-            # Pregnancy History
-            r.is_pregnant if r.is_pregnant is not None else '',
-            r.gravidity or '',
-            r.parity or '',
-            r.delivery_type or '',
-            r.full_term_births or '',
-            r.premature_births or '',
-            r.abortions or '',
-            r.living_children or '',
-        ])
 
-    return response
+@login_required
+def download_referrals_export(request, filename):
+    """Download a file prepared by export_referrals_csv(prepare=1) for the current user"""
+    path = prepared_export_path(request.user.id, filename)
+    if not path or not os.path.exists(path):
+        raise Http404("Export not found")
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type='text/csv')
+
+
+API_REFERRALS_PAGE_SIZE = 100
+API_REFERRALS_MAX_PAGE_SIZE = 1000
+
+# API field -> (columns read with .values(), value from the row), in response order
+API_REFERRAL_FIELDS = {
+    'referral_id': (['referral_id'], lambda row: row['referral_id']),
+    'created_at': (['created_at'], lambda row: row['created_at'].isoformat()),
+    'status': (['status'], lambda row: row['status']),
+    'user_id': (['user_id'], lambda row: row['user_id']),
+    'username': (['user__username'], lambda row: row['user__username'] or ''),
+    'facility_name': (['facility_name'], lambda row: row['facility_name'] or ''),
+    'patient_id': (['patient_id'], lambda row: row['patient_id']),
+    'patient': (
+        ['patient__first_name', 'patient__last_name'],
+        lambda row: f"{row['patient__first_name'] or ''} {row['patient__last_name'] or ''}".strip(),
+    ),
+    'chief_complaint': (['chief_complaint'], lambda row: row['chief_complaint']),
+    'initial_diagnosis': (['initial_diagnosis'], lambda row: row['initial_diagnosis']),
+}
 
 
 @login_required
 @never_cache
 def api_referrals(request):
     """Return referrals as JSON filtered by optional year, month, and user_id.
+
+    Query params (besides the filters):
+      - fields: comma-separated subset of API_REFERRAL_FIELDS (default: all)
+      - limit: page size (default API_REFERRALS_PAGE_SIZE, at most API_REFERRALS_MAX_PAGE_SIZE)
+      - cursor: ``next_cursor`` of the previous page
+
+    Pages are newest first and keyset-paginated on (created_at, referral_id); each
+    page is one query reading only the selected columns.
     """
-    qs = Referral.objects.select_related('user', 'patient').all()
+    qs = Referral.objects.all()
     year = request.GET.get('year')
     month = request.GET.get('month')
     user_id = request.GET.get('user_id')
@@ -2283,29 +1926,40 @@ def api_referrals(request):
     if user_id and user_id.isdigit():
         qs = qs.filter(user_id=int(user_id))
 
-    # Build facility name map for users present in queryset
-    user_ids = list(qs.values_list('user_id', flat=True).distinct())
-    facility_map = {}
-    for facility in Facility.objects.filter(users__in=user_ids):
-        for user in facility.users.all():
-            if user.id in user_ids:
-                facility_map[user.id] = facility.name
-
-    data = []
-    for r in qs.order_by('-created_at'):
-        data.append({
-            'referral_id': r.referral_id,
-            'created_at': r.created_at.isoformat(),
-            'status': r.status,
-            'user_id': r.user_id,
-            'username': r.user.username if r.user_id else '',
-            'facility_name': facility_map.get(r.user_id, ''),
-            'patient_id': r.patient_id,
-            'patient': f"{getattr(r.patient, 'first_name', '')} {getattr(r.patient, 'last_name', '')}".strip(),
-            'chief_complaint': r.chief_complaint,
-            'initial_diagnosis': r.initial_diagnosis,
-        })
-    return JsonResponse({'results': data})
+    requested = request.GET.get('fields')
+    fields = [name.strip() for name in requested.split(',') if name.strip()] if requested else list(API_REFERRAL_FIELDS)
+    unknown = [name for name in fields if name not in API_REFERRAL_FIELDS]
+    if unknown:
+        return JsonResponse({'error': f"Unknown field(s): {', '.join(unknown)}"}, status=400)
+
+    limit = request.GET.get('limit', '')
+    per_page = min(int(limit), API_REFERRALS_MAX_PAGE_SIZE) if limit.isdigit() and int(limit) > 0 else API_REFERRALS_PAGE_SIZE
+
+    if 'facility_name' in fields:
+        # Facility of the referring user, resolved in the same query (last by name, as before)
+        qs = qs.annotate(facility_name=Subquery(
+            Facility.objects.filter(users=OuterRef('user_id')).order_by('-name').values('name')[:1]
+        ))
+    columns = {'created_at', 'referral_id'}
+    for name in fields:
+        columns.update(API_REFERRAL_FIELDS[name][0])
+
+    paginator = CreatedKeysetPaginator(qs.values(*sorted(columns)), per_page)
+    cursor = request.GET.get('cursor')
+    if cursor and paginator.decode_cursor(cursor) is None:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    page = paginator.get_page(cursor)
+
+    data = [
+        {name: API_REFERRAL_FIELDS[name][1](row) for name in fields}
+        for row in page
+    ]
+    return JsonResponse({
+        'results': data,
+        'has_next': page.has_next(),
+        'next_cursor': page.next_cursor,
+    })
+
 
 @login_required
 def train_time_model_from_csv(request):